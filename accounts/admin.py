@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User
+from django.db.models import Count, Sum
 from orders.models import Order
 
 # Register your models here.
@@ -14,7 +15,7 @@ class OrderInline(admin.TabularInline):
     max_num = 0  # Don't allow adding orders from user admin
     
     def get_total_cost(self, obj):
-        return f"£{obj.get_total_cost()}"
+        return f"£{obj.total_cost}"
     get_total_cost.short_description = 'Total Cost'
 
 
@@ -28,15 +29,22 @@ class CustomUserAdmin(BaseUserAdmin):
     
     inlines = [OrderInline]
     
+    def get_queryset(self, request):
+        """Order count and spend from the stored order totals, in the list query"""
+        return super().get_queryset(request).annotate(
+            order_count=Count('orders'),
+            total_spent=Sum('orders__total_cost', default=0),
+        )
+    
     def get_order_count(self, obj):
-        count = obj.orders.count()
-        return count
+        return obj.order_count
     get_order_count.short_description = 'Total Orders'
+    get_order_count.admin_order_field = 'order_count'
     
     def get_total_spent(self, obj):
-        total = sum(order.get_total_cost() for order in obj.orders.all())
-        return f"£{total:.2f}"
+        return f"£{obj.total_spent:.2f}"
     get_total_spent.short_description = 'Total Spent'
+    get_total_spent.admin_order_field = 'total_spent'
 
 
 # Unregister the default User admin and register our custom one
@@ -38,5 +38,6 @@ def profile(request):
 
 @login_required
 def order_history(request):
-    orders = Order.objects.filter(user=request.user).order_by('-created')
+    # Totals are stored on Order; the item tables come from one prefetch.
+    orders = Order.objects.filter(user=request.user).order_by('-created').prefetch_related('items__product')
     return render(request, 'accounts/order_history.html', {'orders': orders})
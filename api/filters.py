@@ -0,0 +1,28 @@
+"""
+API Filters
+DRF filter backends for the product endpoints.
+"""
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.settings import api_settings
+
+from products.search import get_search_backend
+
+
+class ProductSearchFilter(BaseFilterBackend):
+    """
+    `?search=` backed by the product search index instead of icontains
+    scans. Results are ordered by relevance unless `?ordering=` is given,
+    so this backend must run after OrderingFilter.
+    """
+    search_param = api_settings.SEARCH_PARAM
+    ordering_param = api_settings.ORDERING_PARAM
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        ordering = queryset.query.order_by
+        results = get_search_backend().search(queryset, query)
+        if request.query_params.get(self.ordering_param):
+            results = results.order_by(*ordering)
+        return results
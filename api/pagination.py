@@ -0,0 +1,214 @@
+"""
+API Pagination
+Keyset (cursor) pagination over indexed, stable orderings, with the
+page-number mode kept as the default response shape.
+
+Clients opt into keyset mode by sending `?cursor=` (empty for the first
+page) and then following the opaque `next`/`previous` links. Keyset pages
+seek straight to the last row seen, so page 1000 costs the same as page 1
+and no COUNT(*) is run.
+"""
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Seek-method pagination on a composite ordering such as ('name', 'id').
+
+    The last field must be unique (normally 'id') so every row has a
+    distinct position. Views may set `cursor_ordering` to override the
+    default ordering; an `?ordering=` field from OrderingFilter is honoured
+    with 'id' appended as the tie-breaker.
+    """
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    ordering = ('-created', '-id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, view)
+        position, reverse = self.decode_cursor(request, queryset.model)
+
+        ordering = [self._flip(field) for field in self.ordering] if reverse else list(self.ordering)
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self._seek_filter(ordering, position))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        self.page = rows
+        self.has_next = has_more if not reverse else position is not None
+        self.has_previous = position is not None if not reverse else has_more
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_ordering(self, request, view):
+        ordering_param = api_settings.ORDERING_PARAM
+        requested = request.query_params.get(ordering_param, '').split(',')[0].strip()
+        allowed = getattr(view, 'ordering_fields', None) or []
+        if requested and requested.lstrip('-') in allowed:
+            tie_breaker = '-id' if requested.startswith('-') else 'id'
+            return (requested, tie_breaker)
+        return tuple(getattr(view, 'cursor_ordering', None) or self.ordering)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self._position(self.page[-1]), reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return replace_query_param(self.base_url, self.cursor_query_param, '')
+        return self.encode_cursor(self._position(self.page[0]), reverse=True)
+
+    # Cursor encoding ------------------------------------------------------
+
+    def encode_cursor(self, position, reverse):
+        payload = json.dumps({'p': position, 'r': int(reverse)}, default=_json_default)
+        token = base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request, model):
+        """
+        (position, reverse) from the request's cursor, each position value
+        converted to its ordering field's type; NotFound if it is malformed.
+        """
+        token = request.query_params.get(self.cursor_query_param, '')
+        if not token:
+            return None, False
+        try:
+            padded = token + '=' * (-len(token) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+            position = payload['p']
+            if not isinstance(position, list) or len(position) != len(self.ordering):
+                raise ValueError(position)
+            position = [
+                _field(model, field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, position)
+            ]
+            # Orderings are over non-null columns; NULL would match no row.
+            if None in position:
+                raise ValueError(position)
+            return position, bool(payload.get('r'))
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    # Keyset helpers -------------------------------------------------------
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    def _position(self, obj):
+        return [_attr(obj, field.lstrip('-')) for field in self.ordering]
+
+    @staticmethod
+    def _seek_filter(ordering, position):
+        """
+        Rows strictly after `position` in `ordering`:
+        (a > x) OR (a = x AND b > y) OR ... with > / < per direction.
+        The redundant leading `a >= x` gives the planner an index range.
+        """
+        condition = Q()
+        equal = Q()
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        first = ordering[0]
+        bound = 'lte' if first.startswith('-') else 'gte'
+        return Q(**{f'{first.lstrip("-")}__{bound}': position[0]}) & condition
+
+
+class KeysetOrPageNumberPagination(BasePagination):
+    """
+    Default API paginator: page-number mode (`?page=N`, with `count`)
+    unless the request carries `?cursor=`, which switches to keyset mode.
+    """
+    keyset_class = KeysetPagination
+    page_number_class = PageNumberPagination
+    paginator = None
+
+    @property
+    def display_page_controls(self):
+        return getattr(self.paginator, 'display_page_controls', False)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.keyset_class.cursor_query_param in request.query_params:
+            self.paginator = self.keyset_class()
+        else:
+            self.paginator = self.page_number_class()
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.page_number_class().get_paginated_response_schema(schema)
+
+    def to_html(self):
+        return self.paginator.to_html()
+
+    def get_results(self, data):
+        return self.paginator.get_results(data)
+
+
+def _field(model, path):
+    """The model field at the end of a `__` path such as 'category__name'."""
+    *relations, name = path.split('__')
+    for relation in relations:
+        model = model._meta.get_field(relation).related_model
+    return model._meta.get_field(name)
+
+
+def _attr(obj, path):
+    for part in path.split('__'):
+        obj = getattr(obj, part)
+    if hasattr(obj, 'pk'):
+        obj = obj.pk
+    return obj
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f'Cannot encode {type(value).__name__} in a cursor')
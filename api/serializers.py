@@ -1,11 +1,14 @@
 """
 API Serializers
 DRF serializers for all REST API endpoints: categories, products, reviews,
-cart operations, orders, and user authentication/profile.
+cart operations, orders, sales reports, and user authentication/profile.
 """
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from cart.cart import MAX_QUANTITY
+from products.images import build_srcset
 from products.models import Category, Product, ProductReview
+from products.reports import PERIODS
 from orders.models import Order, OrderItem
 
 
@@ -17,15 +20,27 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'slug', 'product_count']
 
 
-class ProductListSerializer(serializers.ModelSerializer):
+class ImageSrcsetMixin:
+    """`image_srcset`: srcset strings for the generated image variants."""
+
+    def get_image_srcset(self, obj):
+        request = self.context.get('request')
+        return {
+            'default': build_srcset(obj.image, request=request),
+            'webp': build_srcset(obj.image, 'webp', request=request),
+        }
+
+
+class ProductListSerializer(ImageSrcsetMixin, serializers.ModelSerializer):
     category = serializers.StringRelatedField()
+    image_srcset = serializers.SerializerMethodField()
     average_rating = serializers.SerializerMethodField()
     rating_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
         fields = [
-            'id', 'name', 'slug', 'image', 'price',
+            'id', 'name', 'slug', 'image', 'image_srcset', 'price',
             'category', 'available', 'average_rating', 'rating_count',
         ]
 
@@ -48,16 +63,17 @@ class ReviewSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'user', 'verified_purchase', 'created']
 
 
-class ProductDetailSerializer(serializers.ModelSerializer):
+class ProductDetailSerializer(ImageSrcsetMixin, serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
     reviews = ReviewSerializer(many=True, read_only=True)
+    image_srcset = serializers.SerializerMethodField()
     average_rating = serializers.SerializerMethodField()
     rating_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
         fields = [
-            'id', 'name', 'slug', 'image', 'description',
+            'id', 'name', 'slug', 'image', 'image_srcset', 'description',
             'price', 'stock', 'available', 'category',
             'average_rating', 'rating_count', 'reviews',
             'created', 'updated',
@@ -84,9 +100,46 @@ class CartSerializer(serializers.Serializer):
     total_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
 
 
+class PriceChangeSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, required=False)
+    cost_price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, required=False)
+
+    def validate(self, attrs):
+        if 'price' not in attrs and 'cost_price' not in attrs:
+            raise serializers.ValidationError('Provide price and/or cost_price.')
+        return attrs
+
+
+class BulkPriceUpdateSerializer(serializers.Serializer):
+    changes = PriceChangeSerializer(many=True, allow_empty=False)
+    reason = serializers.CharField(required=False, allow_blank=True, default='Price updated (bulk)')
+
+
+class SalesReportQuerySerializer(serializers.Serializer):
+    period = serializers.ChoiceField(choices=PERIODS, default='day')
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    category = serializers.IntegerField(required=False)
+    product = serializers.IntegerField(required=False)
+
+    def validate(self, attrs):
+        if 'start' in attrs and 'end' in attrs and attrs['start'] > attrs['end']:
+            raise serializers.ValidationError('start must not be after end.')
+        return attrs
+
+
+class SalesReportRowSerializer(serializers.Serializer):
+    period = serializers.DateField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+    cost = serializers.DecimalField(max_digits=14, decimal_places=2)
+    units = serializers.IntegerField()
+    sales = serializers.IntegerField()
+
+
 class CartAddSerializer(serializers.Serializer):
     product_id = serializers.IntegerField()
-    quantity = serializers.IntegerField(min_value=1, max_value=20, default=1)
+    quantity = serializers.IntegerField(min_value=1, max_value=MAX_QUANTITY, default=1)
     update_quantity = serializers.BooleanField(default=False)
 
 
@@ -105,7 +158,6 @@ class OrderItemSerializer(serializers.ModelSerializer):
 
 class OrderListSerializer(serializers.ModelSerializer):
     total_cost = serializers.SerializerMethodField()
-    item_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Order
@@ -118,9 +170,6 @@ class OrderListSerializer(serializers.ModelSerializer):
     def get_total_cost(self, obj):
         return str(obj.get_total_cost())
 
-    def get_item_count(self, obj):
-        return obj.items.count()
-
 
 class OrderDetailSerializer(serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
@@ -321,10 +321,12 @@ class OrderCreateAPITest(TestCase):
     def test_create_order_insufficient_stock_rejected(self):
         low = Product.objects.create(
             category=self.cat, name='Rare Item', slug='rare-item',
-            price=Decimal('5.00'), stock=1, available=True, is_online=True,
+            price=Decimal('5.00'), stock=5, available=True, is_online=True,
         )
         self.client.force_authenticate(user=self.user)
         self.client.post('/api/cart/add/', {'product_id': low.id, 'quantity': 5})
+        # The held units are sold off before checkout (e.g. by an admin edit).
+        Product.objects.filter(pk=low.pk).update(stock=1)
         response = self.client.post('/api/orders/create/', self.order_data)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn('detail', response.data)
@@ -332,10 +334,12 @@ class OrderCreateAPITest(TestCase):
     def test_create_order_insufficient_stock_no_order_created(self):
         low = Product.objects.create(
             category=self.cat, name='Rare Item', slug='rare-item',
-            price=Decimal('5.00'), stock=1, available=True, is_online=True,
+            price=Decimal('5.00'), stock=5, available=True, is_online=True,
         )
         self.client.force_authenticate(user=self.user)
         self.client.post('/api/cart/add/', {'product_id': low.id, 'quantity': 5})
+        # The held units are sold off before checkout (e.g. by an admin edit).
+        Product.objects.filter(pk=low.pk).update(stock=1)
         self.client.post('/api/orders/create/', self.order_data)
         # Transaction rolled back: no order, no order items, stock unchanged.
         self.assertEqual(Order.objects.count(), 0)
@@ -346,10 +350,12 @@ class OrderCreateAPITest(TestCase):
     def test_create_order_insufficient_stock_keeps_cart(self):
         low = Product.objects.create(
             category=self.cat, name='Rare Item', slug='rare-item',
-            price=Decimal('5.00'), stock=1, available=True, is_online=True,
+            price=Decimal('5.00'), stock=5, available=True, is_online=True,
         )
         self.client.force_authenticate(user=self.user)
         self.client.post('/api/cart/add/', {'product_id': low.id, 'quantity': 5})
+        # The held units are sold off before checkout (e.g. by an admin edit).
+        Product.objects.filter(pk=low.pk).update(stock=1)
         self.client.post('/api/orders/create/', self.order_data)
         cart = self.client.get('/api/cart/')
         self.assertEqual(cart.data['total_items'], 5)
@@ -0,0 +1,117 @@
+"""
+API Pagination Tests
+Tests for keyset (?cursor=) pagination on products, reviews and orders,
+alongside the default page-number mode.
+"""
+import base64
+import json
+from decimal import Decimal
+from django.test import TestCase
+from django.contrib.auth.models import User
+from rest_framework.test import APIClient
+from rest_framework import status
+from products.models import Category, Product, ProductReview
+from orders.models import Order
+
+
+class KeysetPaginationAPITest(TestCase):
+    """Tests for GET /api/products/?cursor=..."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.cat = Category.objects.create(name='Tools', slug='tools')
+        # Duplicate names make the (name, id) tie-breaker matter.
+        for i in range(45):
+            Product.objects.create(
+                category=self.cat, name=f'Tool {i // 2:02d}', slug=f'tool-{i}',
+                price=Decimal(i + 1), stock=5, available=True, is_online=True,
+            )
+
+    def _walk(self, url):
+        ids = []
+        pages = 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(p['id'] for p in response.data['results'])
+            url = response.data['next']
+            pages += 1
+        return ids, pages
+
+    def test_cursor_mode_has_no_count(self):
+        response = self.client.get('/api/products/?cursor=')
+        self.assertNotIn('count', response.data)
+        self.assertEqual(len(response.data['results']), 20)
+        self.assertIsNone(response.data['previous'])
+
+    def test_cursor_walk_matches_page_number_order(self):
+        ids, pages = self._walk('/api/products/?cursor=')
+        expected = list(Product.objects.order_by('name', 'id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages, 3)
+
+    def test_previous_link_returns_prior_page(self):
+        first = self.client.get('/api/products/?cursor=')
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(
+            [p['id'] for p in back.data['results']],
+            [p['id'] for p in first.data['results']],
+        )
+
+    def test_cursor_respects_ordering_param(self):
+        ids, _ = self._walk('/api/products/?cursor=&ordering=-price')
+        expected = list(Product.objects.order_by('-price', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_invalid_cursor_404(self):
+        response = self.client.get('/api/products/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cursor_values_of_the_wrong_type_404(self):
+        for position in (['x', 'abc'], ['x', None], ['x', [1]]):
+            token = base64.urlsafe_b64encode(json.dumps({'p': position}).encode()).decode().rstrip('=')
+            response = self.client.get(f'/api/products/?cursor={token}')
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, position)
+
+    def test_page_number_mode_still_default(self):
+        response = self.client.get('/api/products/?page=2')
+        self.assertEqual(response.data['count'], 45)
+
+
+class KeysetReviewAndOrderAPITest(TestCase):
+    """Tests for keyset pagination on reviews and orders."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.cat = Category.objects.create(name='Tools', slug='tools')
+        self.product = Product.objects.create(
+            category=self.cat, name='Drill', slug='drill',
+            price=Decimal('89.99'), stock=10, available=True, is_online=True,
+        )
+        self.user = User.objects.create_user(username='buyer', password='pass123')
+
+    def test_review_cursor_walk_newest_first(self):
+        for i in range(25):
+            reviewer = User.objects.create_user(username=f'r{i}', password='pass123')
+            ProductReview.objects.create(product=self.product, user=reviewer, rating=5, comment=f'#{i}')
+        url = f'/api/products/{self.product.id}/reviews/?cursor='
+        first = self.client.get(url)
+        second = self.client.get(first.data['next'])
+        comments = [r['comment'] for r in first.data['results'] + second.data['results']]
+        self.assertEqual(comments, [f'#{i}' for i in range(24, -1, -1)])
+        self.assertIsNone(second.data['next'])
+
+    def test_order_cursor_walk_is_user_scoped(self):
+        other = User.objects.create_user(username='other', password='pass123')
+        for owner in [self.user] * 22 + [other] * 3:
+            Order.objects.create(
+                user=owner, first_name='A', last_name='B', email='a@example.com',
+                address='1 St', postal_code='AB1', city='London',
+            )
+        self.client.force_authenticate(self.user)
+        first = self.client.get('/api/orders/?cursor=')
+        second = self.client.get(first.data['next'])
+        ids = [o['id'] for o in first.data['results'] + second.data['results']]
+        expected = list(Order.objects.filter(user=self.user).order_by('-created', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
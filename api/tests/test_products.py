@@ -327,3 +327,103 @@ class ProductListExtraAPITest(TestCase):
     def test_post_not_allowed_on_list(self):
         response = self.client.post('/api/products/', {'name': 'X'})
         self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+class ProductPriceUpdateAPITest(TestCase):
+    """Tests for POST /api/products/prices/"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.staff = User.objects.create_user(username='staff', password='pass123', is_staff=True)
+        self.cat = Category.objects.create(name='Tools', slug='tools')
+        self.hammer = Product.objects.create(
+            category=self.cat, name='Hammer', slug='hammer',
+            cost_price=Decimal('8.00'), price=Decimal('19.99'), stock=10,
+        )
+        self.saw = Product.objects.create(
+            category=self.cat, name='Saw', slug='saw',
+            cost_price=Decimal('12.00'), price=Decimal('29.99'), stock=5,
+        )
+
+    def test_requires_staff(self):
+        customer = User.objects.create_user(username='customer', password='pass123')
+        self.client.force_authenticate(user=customer)
+        response = self.client.post('/api/products/prices/', {'changes': [{'id': self.hammer.id, 'price': '1.00'}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_updates_prices_and_history(self):
+        self.client.force_authenticate(user=self.staff)
+        response = self.client.post('/api/products/prices/', {
+            'changes': [
+                {'id': self.hammer.id, 'price': '21.99'},
+                {'id': self.saw.id, 'price': '29.99', 'cost_price': '12.00'},
+            ],
+            'reason': 'Spring pricing',
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'updated': [self.hammer.id], 'unchanged': 1})
+        self.hammer.refresh_from_db()
+        self.assertEqual(self.hammer.price, Decimal('21.99'))
+        latest = self.hammer.price_history.first()
+        self.assertEqual((latest.selling_price, latest.reason, latest.changed_by), (Decimal('21.99'), 'Spring pricing', self.staff))
+        self.assertEqual(self.saw.price_history.count(), 1)
+
+    def test_unknown_product_404(self):
+        self.client.force_authenticate(user=self.staff)
+        response = self.client.post('/api/products/prices/', {'changes': [{'id': 999999, 'price': '1.00'}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(Product.objects.get(pk=self.hammer.pk).price, Decimal('19.99'))
+
+    def test_change_requires_a_price(self):
+        self.client.force_authenticate(user=self.staff)
+        response = self.client.post('/api/products/prices/', {'changes': [{'id': self.hammer.id}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class CatalogConditionalAPITest(TestCase):
+    """Catalog endpoints answer conditional GETs from the catalog version."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.cat = Category.objects.create(name='Tools', slug='tools')
+        self.product = Product.objects.create(
+            category=self.cat, name='Hammer', slug='hammer',
+            price=Decimal('19.99'), stock=10, available=True, is_online=True,
+        )
+        self.urls = ['/api/categories/', '/api/products/', f'/api/products/{self.product.id}/']
+
+    def test_matching_etag_returns_304_after_one_lookup(self):
+        for url in self.urls:
+            first = self.client.get(url)
+            self.assertEqual(first.status_code, status.HTTP_200_OK)
+            self.assertTrue(first['ETag'].startswith('"'))
+            self.assertIn('Last-Modified', first)
+            with self.assertNumQueries(1):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(response.content, b'')
+            self.assertEqual(response['ETag'], first['ETag'])
+
+    def test_etags_differ_per_url_and_format(self):
+        etags = {self.client.get(url)['ETag'] for url in self.urls + ['/api/products/?ordering=price']}
+        etags.add(self.client.get('/api/products/', HTTP_ACCEPT='text/html')['ETag'])
+        self.assertEqual(len(etags), len(self.urls) + 2)
+
+    def test_catalog_changes_invalidate(self):
+        url = f'/api/products/{self.product.id}/'
+        etag = self.client.get(url)['ETag']
+        self.product.price = Decimal('24.99')
+        self.product.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['price'], '24.99')
+        category_etag = self.client.get('/api/categories/')['ETag']
+        Category.objects.create(name='Garden', slug='garden')
+        self.assertEqual(
+            self.client.get('/api/categories/', HTTP_IF_NONE_MATCH=category_etag).status_code, status.HTTP_200_OK,
+        )
+
+    def test_missing_product_is_not_conditional(self):
+        response = self.client.get('/api/products/999999/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertNotIn('ETag', response)
@@ -0,0 +1,83 @@
+"""
+API Report Tests
+Tests for the staff-only sales report at /api/reports/sales/: day/week/month
+buckets, date range and category/product filters, and permissions.
+"""
+from datetime import timedelta
+from decimal import Decimal
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework import status
+from products.models import Category, Product, Sale
+from products.reports import rebuild_rollups
+
+
+class SalesReportAPITest(TestCase):
+    """Tests for GET /api/reports/sales/"""
+
+    url = '/api/reports/sales/'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.staff = User.objects.create_user(username='staff', password='pass1234', is_staff=True)
+        self.tools = Category.objects.create(name='Tools', slug='tools')
+        self.garden = Category.objects.create(name='Garden', slug='garden')
+        self.drill = Product.objects.create(
+            category=self.tools, name='Drill', slug='drill',
+            cost_price=Decimal('6.00'), price=Decimal('10.00'), stock=50,
+        )
+        self.hose = Product.objects.create(
+            category=self.garden, name='Hose', slug='hose',
+            cost_price=Decimal('2.00'), price=Decimal('4.00'), stock=50,
+        )
+        self.today = timezone.localdate()
+        self._sale(self.drill, 2)
+        self._sale(self.hose, 3)
+        self._sale(self.drill, 1, days_ago=20)
+        rebuild_rollups()
+
+    def _sale(self, product, quantity, days_ago=0):
+        sale = Sale.objects.create(category=product.category, item=product, sold_price=product.price, quantity=quantity)
+        Sale.objects.filter(pk=sale.pk).update(date=sale.date - timedelta(days=days_ago))
+
+    def test_requires_staff(self):
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+        customer = User.objects.create_user(username='customer', password='pass1234')
+        self.client.force_authenticate(customer)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_daily_report_defaults_to_last_30_days(self):
+        self.client.force_authenticate(self.staff)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['period'], 'day')
+        self.assertEqual(response.data['end'], self.today)
+        self.assertEqual(response.data['totals'], {'revenue': '42.00', 'cost': '24.00', 'units': 6, 'sales': 3})
+        self.assertEqual(len(response.data['results']), 2)
+        latest = response.data['results'][-1]
+        self.assertEqual(latest['period'], self.today.isoformat())
+        self.assertEqual(latest['revenue'], '32.00')
+
+    def test_filters_and_range(self):
+        self.client.force_authenticate(self.staff)
+        response = self.client.get(self.url, {'category': self.garden.pk})
+        self.assertEqual(response.data['totals']['revenue'], '12.00')
+        response = self.client.get(self.url, {'product': self.drill.pk, 'start': self.today.isoformat()})
+        self.assertEqual(response.data['totals']['units'], 2)
+
+    def test_week_and_month_buckets(self):
+        self.client.force_authenticate(self.staff)
+        for period in ('week', 'month'):
+            response = self.client.get(self.url, {'period': period})
+            self.assertEqual(response.data['totals']['revenue'], '42.00')
+            start = response.data['results'][0]['period']
+            if period == 'month':
+                self.assertTrue(start.endswith('-01'))
+
+    def test_invalid_parameters(self):
+        self.client.force_authenticate(self.staff)
+        self.assertEqual(self.client.get(self.url, {'period': 'hour'}).status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(self.url, {'start': '2026-02-01', 'end': '2026-01-01'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -1,7 +1,7 @@
 """
 API URL Configuration
 Routes for all REST API endpoints under /api/: categories, products,
-reviews, cart, orders, and authentication.
+reviews, cart, orders, sales reports, and authentication.
 """
 from django.urls import path
 from . import views
@@ -12,7 +12,9 @@ urlpatterns = [
     # Products
     path('categories/', views.CategoryListView.as_view(), name='category-list'),
     path('products/', views.ProductListView.as_view(), name='product-list'),
+    path('products/prices/', views.product_prices_update, name='product-prices-update'),
     path('products/<int:id>/', views.ProductDetailView.as_view(), name='product-detail'),
+    path('products/<int:id>/related/', views.ProductRelatedView.as_view(), name='product-related'),
 
     # Reviews
     path('products/<int:product_id>/reviews/', views.ProductReviewListView.as_view(), name='product-review-list'),
@@ -29,6 +31,9 @@ urlpatterns = [
     path('orders/<int:id>/', views.OrderDetailView.as_view(), name='order-detail'),
     path('orders/create/', views.OrderCreateView.as_view(), name='order-create'),
 
+    # Reports
+    path('reports/sales/', views.sales_report_view, name='sales-report'),
+
     # Auth
     path('auth/register/', views.register, name='auth-register'),
     path('auth/login/', views.login, name='auth-login'),
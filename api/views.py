@@ -1,25 +1,36 @@
 """
 API Views
 DRF views for categories, products, reviews, session-based cart,
-orders, and token authentication (register, login, profile).
+orders, sales reports, and token authentication (register, login, profile).
+The category and product endpoints answer conditional GETs from the
+catalog version (see CatalogConditionalMixin).
 """
+from datetime import timedelta
 from decimal import Decimal
 
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
-from django.db import transaction
-from django.db.models import Count, F, Q
+from django.db.models import Count, Q
+from django.utils.cache import patch_vary_headers
+from django.utils import timezone
 from rest_framework import generics, permissions, status
 from rest_framework.authtoken.models import Token
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.filters import SearchFilter, OrderingFilter
-
-from products.models import Category, Product, ProductReview
-from orders.models import Order, OrderItem
-from cart.cart import Cart
-
+from rest_framework.filters import OrderingFilter
+
+from products.models import CatalogVersion, Category, Product, ProductReview
+from products.pagecache import catalog_etag, not_modified, set_validators
+from products.pricing import bulk_update_prices
+from products.related import get_top_n
+from products.reports import sales_report
+from orders.checkout import InsufficientStock, ProductUnavailable, place_order
+from orders.models import Order
+from cart.cart import Cart, merge_guest_cart
+from cart.holds import StockUnavailable
+
+from .filters import ProductSearchFilter
 from .serializers import (
     CategorySerializer,
     ProductListSerializer,
@@ -28,6 +39,9 @@ from .serializers import (
     CartSerializer,
     CartItemSerializer,
     CartAddSerializer,
+    BulkPriceUpdateSerializer,
+    SalesReportQuerySerializer,
+    SalesReportRowSerializer,
     OrderListSerializer,
     OrderDetailSerializer,
     OrderCreateSerializer,
@@ -40,7 +54,27 @@ from .serializers import (
 # Products
 # ---------------------------------------------------------------------------
 
-class CategoryListView(generics.ListAPIView):
+class CatalogConditionalMixin:
+    """
+    Strong ETag and Last-Modified from CatalogVersion, checked before the
+    view runs: a matching If-None-Match or If-Modified-Since gets a 304
+    after one primary-key lookup, with no catalog query or serialization.
+    """
+
+    def get(self, request, *args, **kwargs):
+        version, changed = CatalogVersion.current()
+        # Accept picks the renderer (JSON or the browsable API).
+        etag = catalog_etag(request, version, changed, request.META.get('HTTP_ACCEPT', ''))
+        response = not_modified(request, etag, changed)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            set_validators(response, etag, changed)
+        patch_vary_headers(response, ('Accept',))
+        return response
+
+
+class CategoryListView(CatalogConditionalMixin, generics.ListAPIView):
     serializer_class = CategorySerializer
 
     def get_queryset(self):
@@ -52,28 +86,80 @@ class CategoryListView(generics.ListAPIView):
         ).order_by('name')
 
 
-class ProductListView(generics.ListAPIView):
+class ProductListView(CatalogConditionalMixin, generics.ListAPIView):
     serializer_class = ProductListSerializer
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    # ProductSearchFilter runs last so relevance ordering wins unless
+    # the client asks for ?ordering= explicitly.
+    filter_backends = [DjangoFilterBackend, OrderingFilter, ProductSearchFilter]
     filterset_fields = ['category__slug', 'available']
-    search_fields = ['name', 'description']
     ordering_fields = ['name', 'price', 'created']
     ordering = ['name']
+    cursor_ordering = ('name', 'id')
 
     def get_queryset(self):
         return Product.objects.filter(
             available=True, is_online=True
-        ).select_related('category')
+        ).select_related('category', 'rating_summary')
 
 
-class ProductDetailView(generics.RetrieveAPIView):
+class ProductDetailView(CatalogConditionalMixin, generics.RetrieveAPIView):
     serializer_class = ProductDetailSerializer
     lookup_field = 'id'
 
     def get_queryset(self):
         return Product.objects.filter(
             available=True, is_online=True
-        ).select_related('category').prefetch_related('reviews__user')
+        ).select_related('category', 'rating_summary').prefetch_related('reviews__user')
+
+
+class ProductRelatedView(generics.ListAPIView):
+    """Products frequently bought together with this one (?limit=, default 8)."""
+    serializer_class = ProductListSerializer
+    pagination_class = None
+    default_limit = 8
+
+    def get_queryset(self):
+        product = generics.get_object_or_404(
+            Product, id=self.kwargs['id'], available=True, is_online=True,
+        )
+        try:
+            limit = int(self.request.query_params.get('limit', self.default_limit))
+        except ValueError:
+            limit = self.default_limit
+        limit = max(1, min(limit, get_top_n()))
+        return product.get_related_products(limit).select_related('rating_summary')
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAdminUser])
+def product_prices_update(request):
+    """
+    Reprice many products at once (staff only):
+    {"changes": [{"id": 1, "price": "9.99", "cost_price": "4.00"}, ...], "reason": "..."}
+    """
+    serializer = BulkPriceUpdateSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    changes = {change['id']: change for change in serializer.validated_data['changes']}
+    products = Product.objects.in_bulk(list(changes))
+    missing = sorted(set(changes) - set(products))
+    if missing:
+        return Response(
+            {'detail': f'Products not found: {", ".join(map(str, missing))}.'},
+            status=status.HTTP_404_NOT_FOUND,
+        )
+    for product_id, change in changes.items():
+        product = products[product_id]
+        product.price = change.get('price', product.price)
+        product.cost_price = change.get('cost_price', product.cost_price)
+    changed = bulk_update_prices(
+        products.values(),
+        changed_by=request.user,
+        reason=serializer.validated_data['reason'],
+    )
+    return Response({
+        'updated': sorted(product.id for product in changed),
+        'unchanged': len(products) - len(changed),
+    })
 
 
 # ---------------------------------------------------------------------------
@@ -82,6 +168,8 @@ class ProductDetailView(generics.RetrieveAPIView):
 
 class ProductReviewListView(generics.ListAPIView):
     serializer_class = ReviewSerializer
+    # Seeks on the (product, -created) index.
+    cursor_ordering = ('-created', '-id')
 
     def get_queryset(self):
         return ProductReview.objects.filter(
@@ -110,7 +198,7 @@ class ProductReviewCreateView(generics.CreateAPIView):
 
 @api_view(['GET'])
 def cart_detail(request):
-    cart = Cart(request)
+    cart = Cart.for_request(request)
     items = []
     for item in cart:
         items.append({
@@ -144,8 +232,14 @@ def cart_add(request):
             {'detail': 'Product not found.'},
             status=status.HTTP_404_NOT_FOUND,
         )
-    cart = Cart(request)
-    cart.add(product=product, quantity=quantity, update_quantity=update)
+    cart = Cart.for_request(request)
+    try:
+        cart.add(product=product, quantity=quantity, update_quantity=update)
+    except StockUnavailable as exc:
+        return Response(
+            {'detail': f'Only {exc.available} of "{product.name}" available.', 'available': exc.available},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
     return Response({'detail': 'Product added to cart.'}, status=status.HTTP_200_OK)
 
 
@@ -158,14 +252,14 @@ def cart_remove(request, product_id):
             {'detail': 'Product not found.'},
             status=status.HTTP_404_NOT_FOUND,
         )
-    cart = Cart(request)
+    cart = Cart.for_request(request)
     cart.remove(product)
     return Response({'detail': 'Product removed from cart.'}, status=status.HTTP_200_OK)
 
 
 @api_view(['POST'])
 def cart_clear(request):
-    cart = Cart(request)
+    cart = Cart.for_request(request)
     cart.clear()
     return Response({'detail': 'Cart cleared.'}, status=status.HTTP_200_OK)
 
@@ -174,22 +268,15 @@ def cart_clear(request):
 # Orders
 # ---------------------------------------------------------------------------
 
-class _InsufficientStock(Exception):
-    """Raised when a cart item's quantity exceeds available product stock."""
-
-    def __init__(self, product_name):
-        self.product_name = product_name
-        super().__init__(product_name)
-
-
 class OrderListView(generics.ListAPIView):
     serializer_class = OrderListSerializer
     permission_classes = [permissions.IsAuthenticated]
+    # Seeks on the (user, -created) index.
+    cursor_ordering = ('-created', '-id')
 
     def get_queryset(self):
-        return Order.objects.filter(
-            user=self.request.user
-        ).prefetch_related('items')
+        # total_cost / item_count are stored on Order: no item reads.
+        return Order.objects.filter(user=self.request.user)
 
 
 class OrderDetailView(generics.RetrieveAPIView):
@@ -208,7 +295,7 @@ class OrderCreateView(generics.CreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def create(self, request, *args, **kwargs):
-        cart = Cart(request)
+        cart = Cart.for_request(request)
         if len(cart) == 0:
             return Response(
                 {'detail': 'Cart is empty.'},
@@ -217,37 +304,22 @@ class OrderCreateView(generics.CreateAPIView):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         try:
-            with transaction.atomic():
-                # Lock the product rows to prevent overselling under concurrency.
-                product_ids = [item['product'].id for item in cart]
-                locked = {
-                    p.id: p for p in
-                    Product.objects.select_for_update().filter(id__in=product_ids)
-                }
-                # Validate stock before creating the order.
-                for item in cart:
-                    product = locked.get(item['product'].id)
-                    if product is None or product.stock < item['quantity']:
-                        raise _InsufficientStock(item['product'].name)
-
-                order = serializer.save(user=request.user)
-                for item in cart:
-                    product = locked[item['product'].id]
-                    OrderItem.objects.create(
-                        order=order,
-                        product=product,
-                        price=item['price'],
-                        quantity=item['quantity'],
-                    )
-                    # Atomic decrement at the database level.
-                    Product.objects.filter(id=product.id).update(
-                        stock=F('stock') - item['quantity']
-                    )
-        except _InsufficientStock as exc:
+            order = place_order(Order(user=request.user, **serializer.validated_data), cart)
+        except InsufficientStock as exc:
             return Response(
                 {'detail': f'Insufficient stock for "{exc.product_name}".'},
                 status=status.HTTP_400_BAD_REQUEST,
             )
+        except ProductUnavailable as exc:
+            cart.discard(exc.product_ids)
+            return Response(
+                {
+                    'detail': 'Some products in your cart are no longer available '
+                              'and have been removed from it.',
+                    'removed': exc.product_ids,
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
         cart.clear()
         return Response(
             OrderDetailSerializer(order).data,
@@ -255,6 +327,52 @@ class OrderCreateView(generics.CreateAPIView):
         )
 
 
+# ---------------------------------------------------------------------------
+# Reports
+# ---------------------------------------------------------------------------
+# Days covered by a sales report when no start date is given.
+SALES_REPORT_DEFAULT_DAYS = {'day': 30, 'week': 7 * 12, 'month': 365}
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def sales_report_view(request):
+    """
+    Sales per day, week or month from the daily rollups (staff only):
+    ?period=week&start=2026-01-01&end=2026-03-31&category=3&product=12
+    """
+    serializer = SalesReportQuerySerializer(data=request.query_params)
+    serializer.is_valid(raise_exception=True)
+    params = serializer.validated_data
+    end = params.get('end') or timezone.localdate()
+    start = params.get('start') or end - timedelta(days=SALES_REPORT_DEFAULT_DAYS[params['period']] - 1)
+    rows = sales_report(
+        period=params['period'],
+        start=start,
+        end=end,
+        category=params.get('category'),
+        product=params.get('product'),
+    )
+    totals = {
+        'revenue': sum((row['revenue'] for row in rows), Decimal('0')),
+        'cost': sum((row['cost'] for row in rows), Decimal('0')),
+        'units': sum(row['units'] for row in rows),
+        'sales': sum(row['sales'] for row in rows),
+    }
+    return Response({
+        'period': params['period'],
+        'start': start,
+        'end': end,
+        'results': SalesReportRowSerializer(rows, many=True).data,
+        'totals': {
+            'revenue': f"{totals['revenue']:.2f}",
+            'cost': f"{totals['cost']:.2f}",
+            'units': totals['units'],
+            'sales': totals['sales'],
+        },
+    })
+
+
 # ---------------------------------------------------------------------------
 # Auth
 # ---------------------------------------------------------------------------
@@ -265,6 +383,7 @@ def register(request):
     serializer.is_valid(raise_exception=True)
     user = serializer.save()
     token, _ = Token.objects.get_or_create(user=user)
+    merge_guest_cart(request, user)
     return Response(
         {'token': token.key, 'user': UserProfileSerializer(user).data},
         status=status.HTTP_201_CREATED,
@@ -287,6 +406,8 @@ def login(request):
             status=status.HTTP_401_UNAUTHORIZED,
         )
     token, _ = Token.objects.get_or_create(user=user)
+    # Token logins skip django.contrib.auth.login(), so merge the guest cart here.
+    merge_guest_cart(request, user)
     return Response({'token': token.key, 'user': UserProfileSerializer(user).data})
 
 
@@ -0,0 +1,6 @@
+"""
+Benchmarks
+Standalone performance scripts, run from the project root with
+`python -m benchmarks.<name>`. Each one seeds a throwaway, freshly
+migrated SQLite database and never touches db.sqlite3.
+"""
@@ -0,0 +1,140 @@
+"""
+Benchmark: guest cart merge at login
+Times merging a guest cart into a user's cart (half of whose products the
+user already has) at growing cart sizes: the per-line path (Cart.add for
+each guest line: a product fetch, a hold and an upsert per line) against
+cart.cart.merge_carts (one read of each cart, one product query, one bulk
+upsert). Also reports the latency of a whole login request, which runs
+the merge from the user_logged_in signal.
+
+    python -m benchmarks.bench_cart_merge [--lines 10 50 200 1000]
+"""
+import argparse
+import time
+from decimal import Decimal
+from importlib import import_module
+
+from benchmarks.common import print_table, scratch_database, setup_django
+
+setup_django()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import Client, override_settings  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from django.urls import reverse  # noqa: E402
+from cart.cart import MAX_QUANTITY, Cart, merge_carts, user_cart_key  # noqa: E402
+from cart.holds import HOLD_SESSION_KEY, new_hold_key  # noqa: E402
+from cart.stores import get_cart_store  # noqa: E402
+from products.models import Category, Product  # noqa: E402
+
+PASSWORD = 'bench-pass-123'
+
+
+class FakeRequest:
+    def __init__(self, user):
+        self.session = import_module(settings.SESSION_ENGINE).SessionStore()
+        self.user = user
+
+
+def seed(count):
+    category = Category.objects.create(name='Bench', slug='bench')
+    Product.objects.bulk_create(
+        Product(
+            category=category, name=f'Product {i}', slug=f'product-{i}',
+            price=Decimal('9.99'), stock=1_000_000, available=True, is_online=True,
+        )
+        for i in range(count)
+    )
+    return list(Product.objects.order_by('id'))
+
+
+def prepare(user, products):
+    """A fresh guest cart of `products`; the user's cart holds every other one."""
+    store = get_cart_store()
+    store.clear(user_cart_key(user))
+    store.set_lines(user_cart_key(user), {
+        str(product.id): {'quantity': 3, 'price': product.price} for product in products[::2]
+    })
+    guest_key = new_hold_key()
+    store.set_lines(guest_key, {
+        str(product.id): {'quantity': 2, 'price': product.price} for product in products
+    })
+    return guest_key
+
+
+def per_line_merge(guest_key, user):
+    """Replay each guest line into the user's cart through Cart.add."""
+    store = get_cart_store()
+    cart = Cart(FakeRequest(user))
+    for product_id, line in store.load(guest_key).items():
+        product = Product.objects.get(id=product_id, available=True)
+        current = cart.cart.get(product_id, {}).get('quantity', 0)
+        cart.add(product, quantity=min(current + line['quantity'], MAX_QUANTITY), update_quantity=True)
+    store.clear(guest_key)
+
+
+def batched_merge(guest_key, user):
+    merge_carts(guest_key, user_cart_key(user))
+
+
+def measure(merge, user, products, repeat):
+    """(median ms, queries) of `repeat` merges of a fresh guest cart."""
+    samples, queries = [], 0
+    for _ in range(repeat):
+        guest_key = prepare(user, products)
+        # the log is a bounded deque; a full one would hide new queries
+        connection.queries_log.clear()
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            merge(guest_key, user)
+            samples.append((time.perf_counter() - start) * 1000)
+        queries = len(captured)
+    samples.sort()
+    return samples[len(samples) // 2], queries
+
+
+def measure_login(user, products, repeat):
+    """Median ms of a login POST carrying a guest cart of `products`."""
+    samples = []
+    for _ in range(repeat):
+        client = Client()
+        session = client.session
+        session[HOLD_SESSION_KEY] = prepare(user, products)
+        session.save()
+        start = time.perf_counter()
+        client.post(reverse('accounts:login'), {'username': user.username, 'password': PASSWORD})
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--lines', type=int, nargs='+', default=[10, 50, 200, 1000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    # A fast hasher keeps password checking from drowning out the merge.
+    with scratch_database(), override_settings(
+        PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], ALLOWED_HOSTS=['*'],
+    ):
+        products = seed(max(args.lines))
+        user = User.objects.create_user(username='bench', password=PASSWORD)
+        rows = []
+        for lines in args.lines:
+            per_line_ms, per_line_queries = measure(per_line_merge, user, products[:lines], args.repeat)
+            batched_ms, batched_queries = measure(batched_merge, user, products[:lines], args.repeat)
+            login_ms = measure_login(user, products[:lines], args.repeat)
+            rows.append((
+                lines, f'{per_line_ms:.1f}', per_line_queries, f'{batched_ms:.1f}', batched_queries,
+                f'{per_line_ms / batched_ms:.1f}x', f'{login_ms:.1f}',
+            ))
+
+    print(f'Guest cart merge by cart size (median of {args.repeat})')
+    print_table(['lines', 'per-line ms', 'queries', 'batched ms', 'queries', 'speedup', 'login ms'], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Benchmark: checkout write path
+Compares the time and query count of the checkout transaction at growing
+cart sizes: the previous per-line path (cart re-read per pass, one INSERT
+and one stock UPDATE per line) against orders.checkout.place_order
+(one stock SELECT, one conditional CASE/WHEN stock UPDATE, one bulk INSERT).
+
+    python -m benchmarks.bench_checkout [--lines 1 5 10 30 100]
+"""
+import argparse
+import time
+from decimal import Decimal
+from importlib import import_module
+
+from benchmarks.common import print_table, scratch_database, setup_django
+
+setup_django()
+
+from django.conf import settings  # noqa: E402
+from django.db import connection, transaction  # noqa: E402
+from django.db.models import F  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from cart.cart import Cart  # noqa: E402
+from orders.checkout import place_order  # noqa: E402
+from orders.models import Order, OrderItem  # noqa: E402
+from products.models import Category, Product  # noqa: E402
+
+
+class FakeRequest:
+    def __init__(self):
+        self.session = import_module(settings.SESSION_ENGINE).SessionStore()
+
+
+def seed(count):
+    category = Category.objects.create(name='Bench', slug='bench')
+    Product.objects.bulk_create(
+        Product(
+            category=category, name=f'Product {i}', slug=f'product-{i}',
+            price=Decimal('9.99'), stock=1_000_000, available=True, is_online=True,
+        )
+        for i in range(count)
+    )
+    return list(Product.objects.order_by('id'))
+
+
+def make_order():
+    return Order(
+        first_name='Bench', last_name='Buyer', email='bench@example.com',
+        address='1 Bench Street', postal_code='B1 1AA', city='Benchton',
+    )
+
+
+def make_cart(products, quantity=2):
+    cart = Cart(FakeRequest())
+    for product in products:
+        cart.add(product, quantity=quantity)
+    return cart
+
+
+def legacy_checkout(order, cart):
+    """The per-line write path place_order replaced."""
+    with transaction.atomic():
+        product_ids = [item['product'].id for item in cart]
+        locked = {p.id: p for p in Product.objects.select_for_update().filter(id__in=product_ids)}
+        for item in cart:
+            product = locked.get(item['product'].id)
+            if product is None or product.stock < item['quantity']:
+                raise ValueError(item['product'].name)
+        order.save()
+        for item in cart:
+            product = locked[item['product'].id]
+            OrderItem.objects.create(order=order, product=product, price=item['price'], quantity=item['quantity'])
+            Product.objects.filter(id=product.id).update(stock=F('stock') - item['quantity'])
+
+
+def measure(checkout, products, repeat):
+    """(median ms, queries) of `repeat` checkouts of a fresh cart."""
+    samples, queries = [], 0
+    for _ in range(repeat):
+        cart = make_cart(products)
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            checkout(make_order(), cart)
+            samples.append((time.perf_counter() - start) * 1000)
+        queries = len(captured)
+    samples.sort()
+    return samples[len(samples) // 2], queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--lines', type=int, nargs='+', default=[1, 5, 10, 30, 100])
+    parser.add_argument('--repeat', type=int, default=7)
+    args = parser.parse_args()
+
+    with scratch_database():
+        products = seed(max(args.lines))
+        rows = []
+        for lines in args.lines:
+            legacy_ms, legacy_queries = measure(legacy_checkout, products[:lines], args.repeat)
+            batched_ms, batched_queries = measure(place_order, products[:lines], args.repeat)
+            rows.append((
+                lines, f'{legacy_ms:.1f}', legacy_queries, f'{batched_ms:.1f}', batched_queries,
+                f'{legacy_ms / batched_ms:.1f}x',
+            ))
+
+    print(f'Checkout transaction by cart size (median of {args.repeat})')
+    print_table(['lines', 'per-line ms', 'queries', 'batched ms', 'queries', 'speedup'], rows)
+
+
+if __name__ == '__main__':
+    main()
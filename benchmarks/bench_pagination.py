@@ -0,0 +1,77 @@
+"""
+Benchmark: API pagination modes
+Compares /api/products/ latency at increasing page depths in page-number
+mode (COUNT(*) + OFFSET scan) and keyset mode (?cursor=, index seek).
+
+    python -m benchmarks.bench_pagination [--products 25000] [--pages 1 10 100 1000]
+"""
+import argparse
+from decimal import Decimal
+
+from benchmarks.common import median_ms, print_table, scratch_database, setup_django
+
+setup_django()
+
+from django.test import Client  # noqa: E402
+from api.pagination import KeysetPagination  # noqa: E402
+from products.models import Category, Product  # noqa: E402
+
+
+def seed(count):
+    category = Category.objects.create(name='Bench', slug='bench')
+    Product.objects.bulk_create(
+        (
+            Product(
+                category=category, name=f'Product {i % 5000:05d}', slug=f'product-{i}',
+                price=Decimal('9.99'), stock=10, available=True, is_online=True,
+            )
+            for i in range(count)
+        ),
+        batch_size=2000,
+    )
+
+
+def keyset_url(page, page_size):
+    """Build the cursor a client would hold after walking to `page`."""
+    url = '/api/products/'
+    if page == 1:
+        return f'{url}?cursor='
+    last = (
+        Product.objects.filter(available=True, is_online=True)
+        .order_by('name', 'id')
+        .values_list('name', 'id')[(page - 1) * page_size - 1]
+    )
+    paginator = KeysetPagination()
+    paginator.base_url = url
+    return paginator.encode_cursor(list(last), reverse=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--products', type=int, default=25000)
+    parser.add_argument('--pages', type=int, nargs='+', default=[1, 10, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    page_size = KeysetPagination.page_size
+
+    with scratch_database():
+        seed(args.products)
+        client = Client()
+        rows = []
+        for page in args.pages:
+            if (page - 1) * page_size >= args.products:
+                continue
+            offset_url = f'/api/products/?page={page}'
+            cursor_url = keyset_url(page, page_size)
+            assert client.get(offset_url).status_code == 200
+            assert client.get(cursor_url).status_code == 200
+            offset_ms = median_ms(lambda: client.get(offset_url), args.repeat)
+            cursor_ms = median_ms(lambda: client.get(cursor_url), args.repeat)
+            rows.append((page, f'{offset_ms:.1f}', f'{cursor_ms:.1f}', f'{offset_ms / cursor_ms:.1f}x'))
+
+    print(f'/api/products/ with {args.products} products, {page_size} per page (median of {args.repeat})')
+    print_table(['page', 'page-number ms', 'keyset ms', 'speedup'], rows)
+
+
+if __name__ == '__main__':
+    main()
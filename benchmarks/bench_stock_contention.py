@@ -0,0 +1,104 @@
+"""
+Benchmark: concurrent checkouts on one hot SKU
+Runs many checkouts from parallel threads (one database connection each)
+against a single product with limited stock and checks the invariants of
+the optimistic stock reservation in orders.checkout: nothing oversold,
+stock + units sold == starting stock, and every rejected checkout wrote
+nothing. Each checkout adds the product to a fresh cart first, so a
+sold-out product is usually turned away by its stock hold (see
+cart.holds) before checkout runs. Reports throughput per thread count.
+
+    python -m benchmarks.bench_stock_contention [--threads 1 2 4 8] [--stock 200]
+"""
+import argparse
+import threading
+import time
+from decimal import Decimal
+
+from benchmarks.bench_checkout import make_cart, make_order
+from benchmarks.common import print_table, scratch_database, setup_django
+
+setup_django()
+
+from django.db import OperationalError, connection  # noqa: E402
+from django.db.models import Sum  # noqa: E402
+from cart.holds import StockUnavailable  # noqa: E402
+from cart.models import StockHold  # noqa: E402
+from orders.checkout import InsufficientStock, place_order  # noqa: E402
+from orders.models import Order, OrderItem  # noqa: E402
+from products.models import Category, Product  # noqa: E402
+
+
+def run(product, threads, attempts_per_thread, stock):
+    Order.objects.all().delete()
+    StockHold.objects.all().delete()
+    Product.objects.filter(pk=product.pk).update(stock=stock)
+    results = {'placed': 0, 'sold_out': 0, 'locked': 0}
+    lock = threading.Lock()
+    start_line = threading.Barrier(threads)
+
+    def worker():
+        start_line.wait()
+        try:
+            for _ in range(attempts_per_thread):
+                cart = None
+                try:
+                    cart = make_cart([product], quantity=1)
+                    place_order(make_order(), cart)
+                    outcome = 'placed'
+                except (StockUnavailable, InsufficientStock):
+                    outcome = 'sold_out'
+                except OperationalError:
+                    outcome = 'locked'
+                    if cart is not None:
+                        # Free the failed cart's hold for the other threads.
+                        cart.clear()
+                with lock:
+                    results[outcome] += 1
+        finally:
+            connection.close()
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    final_stock = Product.objects.get(pk=product.pk).stock
+    sold = OrderItem.objects.aggregate(units=Sum('quantity', default=0))['units']
+    assert final_stock >= 0, 'stock went negative'
+    assert sold + final_stock == stock, f'oversold: {sold} sold + {final_stock} left != {stock}'
+    assert results['placed'] == Order.objects.count() == sold, 'rejected checkout left rows behind'
+    return results, final_stock, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--checkouts', type=int, default=400, help='Checkouts per run, split across threads')
+    parser.add_argument('--stock', type=int, default=200, help='Starting stock of the hot SKU')
+    args = parser.parse_args()
+
+    with scratch_database():
+        category = Category.objects.create(name='Bench', slug='bench')
+        product = Product.objects.create(
+            category=category, name='Hot SKU', slug='hot-sku',
+            price=Decimal('9.99'), stock=args.stock, available=True, is_online=True,
+        )
+        rows = []
+        for threads in args.threads:
+            results, final_stock, elapsed = run(product, threads, args.checkouts // threads, args.stock)
+            total = sum(results.values())
+            rows.append((
+                threads, total, results['placed'], results['sold_out'], results['locked'],
+                final_stock, f'{total / elapsed:.0f}',
+            ))
+
+    print(f'{args.checkouts} checkouts of 1 unit against stock {args.stock} (invariants checked per run)')
+    print_table(['threads', 'checkouts', 'placed', 'sold out', 'locked', 'stock left', 'checkouts/s'], rows)
+
+
+if __name__ == '__main__':
+    main()
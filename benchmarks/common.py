@@ -0,0 +1,59 @@
+"""
+Benchmark Helpers
+Django bootstrap, a scratch database context manager, and timing helpers
+shared by the benchmarks/ scripts.
+"""
+import os
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+
+import django
+
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'xyz_store.settings')
+    django.setup()
+
+
+@contextmanager
+def scratch_database():
+    """
+    Create a migrated on-disk test database for the duration of the block
+    and drop it afterwards. On-disk (not :memory:) so timings include real
+    SQLite I/O and several connections can share it.
+    """
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    handle, path = tempfile.mkstemp(prefix='xyzshop-bench-', suffix='.sqlite3')
+    os.close(handle)
+    connection.settings_dict['TEST'] = {**connection.settings_dict.get('TEST', {}), 'NAME': path}
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield path
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def median_ms(fn, repeat=5):
+    """Run fn `repeat` times and return the median wall time in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def print_table(headers, rows):
+    widths = [max(len(str(value)) for value in column) for column in zip(headers, *rows)]
+    line = '  '.join(f'{{:>{w}}}' for w in widths)
+    print(line.format(*headers))
+    print(line.format(*('-' * w for w in widths)))
+    for row in rows:
+        print(line.format(*row))
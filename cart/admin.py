@@ -1,7 +1,26 @@
 """
 Cart Admin
-No models to register — the cart is session-based with no database tables.
+Read-only admin for StockHold, the time-limited stock reservations that
+carts place, and CartLine, the cart lines kept by the database cart store.
 """
 from django.contrib import admin
+from .models import CartLine, StockHold
 
 # Register your models here.
+
+@admin.register(StockHold)
+class StockHoldAdmin(admin.ModelAdmin):
+    list_display = ['product', 'quantity', 'cart_key', 'expires']
+    list_select_related = ['product']
+    search_fields = ['product__name', 'cart_key']
+    ordering = ['expires']
+    readonly_fields = ['cart_key', 'product', 'quantity', 'expires']
+
+
+@admin.register(CartLine)
+class CartLineAdmin(admin.ModelAdmin):
+    list_display = ['product', 'quantity', 'price', 'cart_key', 'touched']
+    list_select_related = ['product']
+    search_fields = ['product__name', 'cart_key']
+    ordering = ['-touched']
+    readonly_fields = ['cart_key', 'product', 'quantity', 'price', 'touched']
@@ -1,5 +1,6 @@
 """
 Cart App Configuration
+Connects the cart signal handlers on app ready.
 """
 from django.apps import AppConfig
 
@@ -7,3 +8,6 @@ from django.apps import AppConfig
 class CartConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'cart'
+    
+    def ready(self):
+        import cart.signals  # noqa
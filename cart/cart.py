@@ -1,41 +1,215 @@
 """
 Cart Class
-Session-based shopping cart stored in request.session[CART_SESSION_ID].
-Provides add, remove, iterate, length, total price, and clear operations.
+Shopping cart whose lines live in the configured cart store (see
+stores.py), keyed by a cart token kept in the session. Provides add,
+remove, iterate, length, total price, and clear operations; adding or
+removing a product writes that one line, and the session is written only
+when the token is first issued. Adding a product places a time-limited
+stock hold for the line (see holds.py).
+
+A logged-in user's cart is keyed by their account rather than the session,
+so it follows them across devices; at login merge_guest_cart() folds the
+guest cart into it with one product query and bulk upserts of its lines
+and stock holds.
+
+Cart.for_request() shares one Cart per request between the views and the
+context processor. Its product rows are loaded once, with only the columns
+the cart pages show, and reused by every iteration; with
+CART_PRODUCT_CACHE_TIMEOUT set they come from the cache instead, so cart
+pages render without reading the Product table.
 """
 from decimal import Decimal
 from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
 from products.models import Product
+from .holds import HOLD_SESSION_KEY, held_units, hold_stock, new_hold_key, release_holds, set_holds
+from .stores import get_cart_store
+
+# Product columns the cart pages use.
+SNAPSHOT_FIELDS = ('id', 'name', 'slug', 'price', 'image', 'stock')
+SNAPSHOT_CACHE_KEY = 'cart:product:{}'
+
+# Most units of one product a cart line holds (the add form and
+# CartAddSerializer offer 1-20).
+MAX_QUANTITY = 20
+
+USER_CART_KEY = 'user-{}'
+
+
+def get_snapshot_timeout():
+    """Seconds product snapshots stay cached; 0 (the default) disables the cache."""
+    return getattr(settings, 'CART_PRODUCT_CACHE_TIMEOUT', 0)
+
+
+def load_products(product_ids):
+    """
+    {product_id: Product} holding only SNAPSHOT_FIELDS: cached snapshots
+    when the cache is enabled, one query for the rest.
+    """
+    product_ids = [int(product_id) for product_id in product_ids]
+    timeout = get_snapshot_timeout()
+    products = {}
+    if timeout:
+        cached = cache.get_many([SNAPSHOT_CACHE_KEY.format(product_id) for product_id in product_ids])
+        for data in cached.values():
+            product = Product(**data)
+            product._state.adding = False
+            products[product.id] = product
+    missing = [product_id for product_id in product_ids if product_id not in products]
+    if missing:
+        loaded = Product.objects.filter(id__in=missing).only(*SNAPSHOT_FIELDS).order_by()
+        fresh = {product.id: product for product in loaded}
+        products.update(fresh)
+        if timeout and fresh:
+            cache.set_many(
+                {
+                    SNAPSHOT_CACHE_KEY.format(product.id): {
+                        'id': product.id, 'name': product.name, 'slug': product.slug,
+                        'price': product.price, 'image': product.image.name, 'stock': product.stock,
+                    }
+                    for product in fresh.values()
+                },
+                timeout,
+            )
+    return products
+
+
+def forget_products(product_ids):
+    """Drop cached snapshots, e.g. when the products change."""
+    cache.delete_many([SNAPSHOT_CACHE_KEY.format(product_id) for product_id in product_ids])
+
+
+def user_cart_key(user):
+    """The cart token of `user`'s cart."""
+    return USER_CART_KEY.format(user.pk)
+
+
+def merge_carts(guest_key, user_key):
+    """
+    Fold the cart `guest_key` into `user_key`: one read of each cart, one
+    query for what is left to sell of the guest's products, then one bulk
+    upsert of the lines and one of their holds. Quantities are summed and,
+    like Cart.add, limited to MAX_QUANTITY and to the stock available once
+    the guest's holds are dropped; lines already in the user's cart keep
+    their price and are never reduced, and unavailable products are
+    skipped. Returns the number of lines merged.
+    """
+    store = get_cart_store()
+    guest = store.load(guest_key)
+    if not guest:
+        return 0
+    owned = store.load(user_key)
+    with transaction.atomic():
+        # Written first, as in hold_stock(): the guest's stock is the user's to take.
+        release_holds(guest_key)
+        available = dict(
+            Product.objects.select_for_update()
+            .filter(id__in=[int(product_id) for product_id in guest], available=True)
+            .annotate(available_quantity=F('stock') - held_units(exclude_key=user_key))
+            .values_list('id', 'available_quantity')
+        )
+        lines = {}
+        for product_id, line in guest.items():
+            if int(product_id) not in available:
+                continue
+            current = owned.get(product_id, {}).get('quantity', 0)
+            quantity = min(current + line['quantity'], MAX_QUANTITY, available[int(product_id)])
+            if quantity > current:
+                lines[product_id] = {'quantity': quantity, 'price': line['price']}
+        store.set_lines(user_key, lines)
+        set_holds(user_key, {int(product_id): line['quantity'] for product_id, line in lines.items()})
+        store.clear(guest_key)
+    return len(lines)
+
+
+def merge_guest_cart(request, user):
+    """At login: merge the session's guest cart into `user`'s cart and forget its token."""
+    request = getattr(request, '_request', request)
+    guest_key = request.session.pop(HOLD_SESSION_KEY, None)
+    if guest_key:
+        merge_carts(guest_key, user_cart_key(user))
+    # a cart built earlier in the request belongs to the guest
+    request.__dict__.pop('_cart', None)
 
 
 class Cart:
     def __init__(self, request):
         """
-        Initialize the cart.
+        Initialize the cart. Nothing is read from the store (or written to
+        the session) until the cart is used.
         """
         self.session = request.session
-        cart = self.session.get(settings.CART_SESSION_ID)
-        if not cart:
-            # save an empty cart in the session
-            cart = self.session[settings.CART_SESSION_ID] = {}
-        self.cart = cart
+        user = getattr(request, 'user', None)
+        self._user_key = user_cart_key(user) if user is not None and user.is_authenticated else None
+        self.store = get_cart_store()
+        # Lines from the store, loaded on first use (see the `cart` property).
+        self._cart = None
+        # Materialized lines, built on first iteration (see _lines()).
+        self._items = None
+        if settings.CART_SESSION_ID in self.session:
+            self._import_session_cart()
+
+    @classmethod
+    def for_request(cls, request):
+        """The request's cart, created once and shared by views and templates."""
+        # DRF wraps the HttpRequest the context processor sees.
+        request = getattr(request, '_request', request)
+        cart = getattr(request, '_cart', None)
+        if cart is None:
+            cart = request._cart = cls(request)
+        return cart
+
+    @property
+    def hold_key(self):
+        """
+        The cart token: keys its lines and stock holds. The user's key when
+        logged in, otherwise from the session (None until something is added).
+        """
+        return self._user_key or self.session.get(HOLD_SESSION_KEY)
+
+    token = hold_key
+
+    @property
+    def cart(self):
+        """The lines, {product_id: {'quantity', 'price'}}, read from the store once."""
+        if self._cart is None:
+            self._cart = self.store.load(self.token) if self.token else {}
+        return self._cart
+
+    def _ensure_token(self):
+        if self.token is None:
+            self.session[HOLD_SESSION_KEY] = new_hold_key()
+        return self.token
+
+    def _import_session_cart(self):
+        """Move a cart saved in the session by earlier releases into the store."""
+        legacy = self.session.pop(settings.CART_SESSION_ID) or {}
+        if legacy:
+            token = self._ensure_token()
+            for product_id, line in legacy.items():
+                self.store.set_line(token, int(product_id), line['quantity'], Decimal(line['price']))
 
     def add(self, product, quantity=1, update_quantity=False):
         """
         Add a product to the cart or update its quantity.
+        Holds the line's stock first; raises holds.StockUnavailable (and
+        leaves the cart unchanged) if not enough is available to sell.
         """
         product_id = str(product.id)
-        if product_id not in self.cart:
-            self.cart[product_id] = {'quantity': 0, 'price': str(product.price)}
-        if update_quantity:
-            self.cart[product_id]['quantity'] = quantity
-        else:
-            self.cart[product_id]['quantity'] += quantity
+        current = self.cart.get(product_id, {}).get('quantity', 0)
+        new_quantity = quantity if update_quantity else current + quantity
+        token = self._ensure_token()
+        hold_stock(token, product, new_quantity)
+        line = self.cart.setdefault(product_id, {'quantity': 0, 'price': product.price})
+        line['quantity'] = new_quantity
+        self.store.set_line(token, product.id, new_quantity, line['price'])
         self.save()
 
     def save(self):
-        # mark the session as "modified" to make sure it gets saved
-        self.session.modified = True
+        # the lines changed; materialize them again on the next iteration
+        self._items = None
 
     def remove(self, product):
         """
@@ -44,22 +218,46 @@ class Cart:
         product_id = str(product.id)
         if product_id in self.cart:
             del self.cart[product_id]
+            self.store.remove_line(self.token, product.id)
+            self.save()
+            release_holds(self.token, [product.id])
+
+    def discard(self, product_ids):
+        """
+        Remove the lines of `product_ids`, such as products deleted since
+        they were added.
+        """
+        product_ids = [product_id for product_id in product_ids if str(product_id) in self.cart]
+        for product_id in product_ids:
+            del self.cart[str(product_id)]
+            self.store.remove_line(self.token, product_id)
+        if product_ids:
             self.save()
+            release_holds(self.token, product_ids)
+
+    def _lines(self):
+        """
+        The cart lines with their products, loaded on first use and then
+        reused. Built from copies, so nothing added to a line (such as the
+        update form in cart_detail) leaks into the stored lines.
+        """
+        if self._items is None:
+            products = load_products(self.cart)
+            items = []
+            for product_id, line in self.cart.items():
+                item = {'quantity': line['quantity'], 'price': Decimal(line['price'])}
+                if int(product_id) in products:
+                    item['product'] = products[int(product_id)]
+                item['total_price'] = item['price'] * item['quantity']
+                items.append(item)
+            self._items = items
+        return self._items
 
     def __iter__(self):
         """
-        Iterate over the items in the cart and get the products from the database.
+        Iterate over the items in the cart with their products.
         """
-        product_ids = self.cart.keys()
-        # get the product objects and add them to the cart
-        products = Product.objects.filter(id__in=product_ids)
-        cart = self.cart.copy()
-        for product in products:
-            cart[str(product.id)]['product'] = product
-        for item in cart.values():
-            item['price'] = Decimal(item['price'])
-            item['total_price'] = item['price'] * item['quantity']
-            yield item
+        return iter(self._lines())
 
     def __len__(self):
         """
@@ -68,9 +266,13 @@ class Cart:
         return sum(item['quantity'] for item in self.cart.values())
 
     def get_total_price(self):
+        # From the stored line prices: needs no product rows.
         return sum(Decimal(item['price']) * item['quantity'] for item in self.cart.values())
 
     def clear(self):
-        # remove cart from session
-        del self.session[settings.CART_SESSION_ID]
+        self._cart = {}
         self.save()
+        if self.token:
+            self.store.clear(self.token)
+            # release any stock the cart still holds (none left after checkout)
+            release_holds(self.token)
@@ -1,9 +1,13 @@
 """
 Cart Context Processor
-Makes the Cart instance available as {{ cart }} in all templates.
+Makes the request's Cart (shared with the views, see Cart.for_request)
+available as {{ cart }} in all templates. The cart is built only if a
+template uses it, so pages without it (the cached catalog pages, whose
+badge is filled in from cart:cart_summary) never touch the session.
 """
+from django.utils.functional import SimpleLazyObject
 from .cart import Cart
 
 
 def cart(request):
-    return {'cart': Cart(request)}
+    return {'cart': SimpleLazyObject(lambda: Cart.for_request(request))}
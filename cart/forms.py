@@ -4,8 +4,9 @@ CartAddProductForm for adding products with quantity (1-20) and
 an update flag to replace vs. increment the quantity.
 """
 from django import forms
+from .cart import MAX_QUANTITY
 
-PRODUCT_QUANTITY_CHOICES = [(i, str(i)) for i in range(1, 21)]
+PRODUCT_QUANTITY_CHOICES = [(i, str(i)) for i in range(1, MAX_QUANTITY + 1)]
 
 
 class CartAddProductForm(forms.Form):
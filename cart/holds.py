@@ -0,0 +1,138 @@
+"""
+Stock Holds
+Time-limited stock reservations for carts. Adding a product to the cart
+holds the line's quantity until CART_HOLD_SECONDS after the cart's last
+add or update, which renews all of its holds; the quantity available to
+sell is stock minus live holds, so shoppers learn a product is gone when
+they add it rather than at checkout. Checkout turns the cart's holds
+into order items and the expire_stock_holds command deletes expired
+holds in batches.
+
+Placing a hold writes the hold row first and checks availability after,
+in one transaction: on SQLite the write takes the database write lock,
+and elsewhere the product row lock serializes concurrent holds.
+"""
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from products.models import Product
+from .models import StockHold
+
+# How long a cart holds stock after its last change (15 minutes).
+DEFAULT_HOLD_SECONDS = 15 * 60
+
+# Session key of the cart token, which keys the cart's lines (see
+# stores.py) and its holds; it survives login, unlike the session key itself.
+HOLD_SESSION_KEY = 'cart_hold_key'
+
+
+class StockUnavailable(Exception):
+    """Raised when a hold asks for more units than are available to sell."""
+
+    def __init__(self, product, available):
+        self.product = product
+        self.available = max(available, 0)
+        super().__init__(f'{product.name}: only {self.available} available')
+
+
+def get_hold_seconds():
+    return getattr(settings, 'CART_HOLD_SECONDS', DEFAULT_HOLD_SECONDS)
+
+
+def new_hold_key():
+    return uuid.uuid4().hex
+
+
+def held_units(exclude_key=None):
+    """
+    Expression for the units of the outer product held by live holds
+    (other than `exclude_key`'s), for use in annotate(), filter() or update().
+    """
+    holds = StockHold.objects.filter(product=OuterRef('pk'), expires__gt=timezone.now())
+    if exclude_key:
+        holds = holds.exclude(cart_key=exclude_key)
+    total = holds.order_by().values('product').annotate(units=Sum('quantity')).values('units')
+    return Coalesce(Subquery(total, output_field=IntegerField()), Value(0))
+
+
+def available_to_sell(product_ids, exclude_key=None):
+    """{product_id: stock minus live holds}, in one query."""
+    rows = Product.objects.filter(id__in=list(product_ids)).annotate(
+        available_quantity=F('stock') - held_units(exclude_key)
+    ).values_list('id', 'available_quantity')
+    return dict(rows)
+
+
+def hold_stock(cart_key, product, quantity):
+    """
+    Set `cart_key`'s hold on `product` to `quantity` units and renew all of
+    the cart's holds, in one UPDATE, to expire CART_HOLD_SECONDS from now.
+    Raises StockUnavailable (leaving the holds unchanged) if that many
+    units are not available.
+    """
+    expires = timezone.now() + timedelta(seconds=get_hold_seconds())
+    with transaction.atomic():
+        renewed = StockHold.objects.filter(cart_key=cart_key).update(
+            quantity=Case(
+                When(product=product, then=Value(quantity)), default=F('quantity'), output_field=IntegerField(),
+            ),
+            expires=expires,
+        )
+        # Insert the hold if the UPDATE missed it; when it renewed others
+        # this one may exist already, hence ON CONFLICT DO NOTHING.
+        StockHold.objects.bulk_create(
+            [StockHold(cart_key=cart_key, product=product, quantity=quantity, expires=expires)],
+            ignore_conflicts=bool(renewed),
+        )
+        available = (
+            Product.objects.select_for_update().filter(pk=product.pk)
+            .annotate(available_quantity=F('stock') - held_units(exclude_key=cart_key))
+            .values_list('available_quantity', flat=True).first()
+        )
+        if available is None or available < quantity:
+            raise StockUnavailable(product, available or 0)
+
+
+def release_holds(cart_key, product_ids=None):
+    """Drop `cart_key`'s holds (on the given products, or all of them)."""
+    holds = StockHold.objects.filter(cart_key=cart_key)
+    if product_ids is not None:
+        holds = holds.filter(product_id__in=list(product_ids))
+    return holds.delete()[0]
+
+
+def set_holds(cart_key, quantities):
+    """
+    Set `cart_key`'s holds to {product_id: quantity} in one upsert, expiring
+    CART_HOLD_SECONDS from now. Unlike hold_stock() nothing is checked: the
+    caller clamps the quantities to available_to_sell() in the same
+    transaction.
+    """
+    expires = timezone.now() + timedelta(seconds=get_hold_seconds())
+    # INSERT ... ON CONFLICT (cart_key, product_id) DO UPDATE
+    StockHold.objects.bulk_create(
+        [
+            StockHold(cart_key=cart_key, product_id=product_id, quantity=quantity, expires=expires)
+            for product_id, quantity in quantities.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['cart_key', 'product'],
+        update_fields=['quantity', 'expires'],
+    )
+
+
+def expire_holds(batch_size=1000):
+    """Delete expired holds, `batch_size` rows per DELETE. Returns the number deleted."""
+    now = timezone.now()
+    deleted = 0
+    while True:
+        batch = list(StockHold.objects.filter(expires__lte=now).values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            return deleted
+        deleted += StockHold.objects.filter(pk__in=batch).delete()[0]
@@ -0,0 +1,32 @@
+# Generated by Django 6.0.7 on 2026-10-17 19:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('products', '0013_salesdailyrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockHold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cart_key', models.CharField(max_length=32)),
+                ('quantity', models.PositiveIntegerField()),
+                ('expires', models.DateTimeField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_holds', to='products.product')),
+            ],
+            options={
+                'verbose_name': 'Stock Hold',
+                'verbose_name_plural': 'Stock Holds',
+                'indexes': [models.Index(fields=['product', 'expires'], name='cart_stockh_product_93fa87_idx'), models.Index(fields=['expires'], name='cart_stockh_expires_c55bfe_idx')],
+                'unique_together': {('cart_key', 'product')},
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 6.0.7 on 2026-10-17 20:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0001_initial'),
+        ('products', '0014_inventory_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CartLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cart_key', models.CharField(max_length=32)),
+                ('quantity', models.PositiveIntegerField()),
+                ('price', models.DecimalField(decimal_places=2, help_text='Unit price when first added', max_digits=10)),
+                ('touched', models.DateTimeField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cart_lines', to='products.product')),
+            ],
+            options={
+                'verbose_name': 'Cart Line',
+                'verbose_name_plural': 'Cart Lines',
+                'indexes': [models.Index(fields=['touched'], name='cart_cartli_touched_9eca8f_idx')],
+                'unique_together': {('cart_key', 'product')},
+            },
+        ),
+    ]
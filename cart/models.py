@@ -1,7 +1,59 @@
 """
 Cart Models
-No models — the cart is session-based (see cart.py).
+CartLine stores the lines of carts kept by the database cart store (see
+stores.py), keyed by the cart token. StockHold records the time-limited
+stock reservations a cart places on the products in it (see holds.py).
 """
 from django.db import models
+from products.models import Product
 
 # Create your models here.
+
+class CartLine(models.Model):
+    """
+    One product line of a cart. Adding to the cart is a single-row upsert
+    on (cart_key, product); `touched` is refreshed on writes (and at most
+    daily on reads) and indexed so the expire_carts sweeper finds
+    abandoned lines without a full scan.
+    """
+    cart_key = models.CharField(max_length=32)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='cart_lines')
+    quantity = models.PositiveIntegerField()
+    price = models.DecimalField(max_digits=10, decimal_places=2, help_text='Unit price when first added')
+    touched = models.DateTimeField()
+    
+    class Meta:
+        unique_together = ('cart_key', 'product')
+        indexes = [
+            models.Index(fields=['touched']),
+        ]
+        verbose_name = 'Cart Line'
+        verbose_name_plural = 'Cart Lines'
+    
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} in cart {self.cart_key}"
+
+
+class StockHold(models.Model):
+    """
+    Units of a product held for one cart until `expires`. Live holds are
+    subtracted from stock to give the quantity available to sell; the
+    (product, expires) index keeps that per-product sum an index range
+    scan however many carts hold stock.
+    """
+    cart_key = models.CharField(max_length=32)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_holds')
+    quantity = models.PositiveIntegerField()
+    expires = models.DateTimeField()
+    
+    class Meta:
+        unique_together = ('cart_key', 'product')
+        indexes = [
+            models.Index(fields=['product', 'expires']),
+            models.Index(fields=['expires']),
+        ]
+        verbose_name = 'Stock Hold'
+        verbose_name_plural = 'Stock Holds'
+    
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} for cart {self.cart_key} until {self.expires:%H:%M}"
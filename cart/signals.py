@@ -0,0 +1,27 @@
+"""
+Cart Signals
+Drops a product's cached cart snapshot (see cart.load_products) when the
+product is saved or deleted, so cart pages do not wait for the cache
+timeout to show a new name, price or image. Merges the guest cart into
+the user's cart when they log in.
+"""
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from products.models import Product
+from .cart import forget_products, get_snapshot_timeout, merge_guest_cart
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def forget_product_snapshot(sender, instance, **kwargs):
+    """Invalidate the cached snapshot of a changed product"""
+    if get_snapshot_timeout():
+        forget_products([instance.pk])
+
+
+@receiver(user_logged_in)
+def merge_cart_on_login(sender, request, user, **kwargs):
+    """Carry the guest cart over to the account that just logged in"""
+    if request is not None and hasattr(request, 'session'):
+        merge_guest_cart(request, user)
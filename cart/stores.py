@@ -0,0 +1,180 @@
+"""
+Cart Stores
+Pluggable storage for cart lines, chosen by settings.CART_STORE and keyed
+by the cart token (see Cart.token). DatabaseCartStore keeps one CartLine
+row per product line: adding to the cart is a single-row upsert and
+removing a line a single-row DELETE, instead of a rewrite of the whole
+signed session blob, and abandoned lines are swept in batches through
+the `touched` index. MemoryCartStore is a per-process LRU of carts for
+tests and development.
+"""
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import CartLine
+
+DEFAULT_CART_STORE = 'cart.stores.DatabaseCartStore'
+
+# Lines untouched for this long are removed by expire_carts (30 days).
+DEFAULT_CART_TTL = 30 * 24 * 60 * 60
+
+# Reading a cart refreshes its `touched` at most this often, so carts in
+# use are not swept while browsing costs no writes.
+TOUCH_INTERVAL = timedelta(days=1)
+
+
+def get_cart_ttl():
+    return getattr(settings, 'CART_TTL', DEFAULT_CART_TTL)
+
+
+class BaseCartStore:
+    """
+    Interface for cart stores. load() returns the lines as
+    {product_id (str): {'quantity': int, 'price': Decimal}}, the shape
+    Cart.cart has always had.
+    """
+
+    def load(self, cart_key):
+        raise NotImplementedError
+
+    def set_line(self, cart_key, product_id, quantity, price):
+        """Insert a line, or set its quantity (keeping the price it was added at)."""
+        raise NotImplementedError
+
+    def set_lines(self, cart_key, lines):
+        """set_line() for each of `lines`, {product_id: {'quantity', 'price'}}."""
+        for product_id, line in lines.items():
+            self.set_line(cart_key, product_id, line['quantity'], line['price'])
+
+    def remove_line(self, cart_key, product_id):
+        raise NotImplementedError
+
+    def clear(self, cart_key):
+        raise NotImplementedError
+
+    def expire(self, before, batch_size=1000):
+        """Drop lines untouched since `before`. Returns the number removed."""
+        return 0
+
+
+class DatabaseCartStore(BaseCartStore):
+    """CartLine rows, one per (cart token, product)."""
+
+    def load(self, cart_key):
+        rows = list(
+            CartLine.objects.filter(cart_key=cart_key).order_by('id')
+            .values_list('product_id', 'quantity', 'price', 'touched')
+        )
+        now = timezone.now()
+        if rows and min(row[3] for row in rows) < now - TOUCH_INTERVAL:
+            CartLine.objects.filter(cart_key=cart_key).update(touched=now)
+        return {
+            str(product_id): {'quantity': quantity, 'price': price}
+            for product_id, quantity, price, _touched in rows
+        }
+
+    def set_line(self, cart_key, product_id, quantity, price):
+        self.set_lines(cart_key, {product_id: {'quantity': quantity, 'price': price}})
+
+    def set_lines(self, cart_key, lines, batch_size=500):
+        # INSERT ... ON CONFLICT (cart_key, product_id) DO UPDATE
+        now = timezone.now()
+        CartLine.objects.bulk_create(
+            [
+                CartLine(cart_key=cart_key, product_id=int(product_id), quantity=line['quantity'],
+                         price=line['price'], touched=now)
+                for product_id, line in lines.items()
+            ],
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['cart_key', 'product'],
+            update_fields=['quantity', 'touched'],
+        )
+
+    def remove_line(self, cart_key, product_id):
+        CartLine.objects.filter(cart_key=cart_key, product_id=product_id).delete()
+
+    def clear(self, cart_key):
+        CartLine.objects.filter(cart_key=cart_key).delete()
+
+    def expire(self, before, batch_size=1000):
+        deleted = 0
+        while True:
+            batch = list(CartLine.objects.filter(touched__lt=before).values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                return deleted
+            deleted += CartLine.objects.filter(pk__in=batch).delete()[0]
+
+
+class MemoryCartStore(BaseCartStore):
+    """
+    Carts in a process-local LRU: the least recently used cart is dropped
+    once `max_carts` are held. Not shared between worker processes.
+    """
+
+    def __init__(self, max_carts=10000):
+        self.max_carts = max_carts
+        self._carts = OrderedDict()  # cart_key -> (touched, lines)
+        self._lock = threading.Lock()
+
+    def load(self, cart_key):
+        with self._lock:
+            entry = self._carts.get(cart_key)
+            if entry is None:
+                return {}
+            self._carts.move_to_end(cart_key)
+            return {product_id: dict(line) for product_id, line in entry[1].items()}
+
+    def set_line(self, cart_key, product_id, quantity, price):
+        with self._lock:
+            _touched, lines = self._carts.pop(cart_key, (None, {}))
+            line = lines.setdefault(str(product_id), {'quantity': 0, 'price': price})
+            line['quantity'] = quantity
+            self._carts[cart_key] = (timezone.now(), lines)
+            while len(self._carts) > self.max_carts:
+                self._carts.popitem(last=False)
+
+    def remove_line(self, cart_key, product_id):
+        with self._lock:
+            entry = self._carts.get(cart_key)
+            if entry is not None:
+                entry[1].pop(str(product_id), None)
+
+    def clear(self, cart_key):
+        with self._lock:
+            self._carts.pop(cart_key, None)
+
+    def expire(self, before, batch_size=1000):
+        with self._lock:
+            stale = [cart_key for cart_key, (touched, _lines) in self._carts.items() if touched < before]
+            deleted = 0
+            for cart_key in stale:
+                deleted += len(self._carts.pop(cart_key)[1])
+            return deleted
+
+
+@lru_cache(maxsize=None)
+def get_cart_store():
+    """Return the configured cart store instance."""
+    path = getattr(settings, 'CART_STORE', DEFAULT_CART_STORE)
+    return import_string(path)()
+
+
+@receiver(setting_changed)
+def reset_cart_store(setting, **kwargs):
+    if setting == 'CART_STORE':
+        get_cart_store.cache_clear()
+
+
+def expire_carts(batch_size=1000):
+    """Remove lines untouched for CART_TTL seconds. Returns the number removed."""
+    before = timezone.now() - timedelta(seconds=get_cart_ttl())
+    return get_cart_store().expire(before, batch_size=batch_size)
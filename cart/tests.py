@@ -1,7 +1,388 @@
 """
 Cart Tests
-Tests for session-based cart functionality.
+Tests for cart functionality, the cart stores and the stock holds it places.
 """
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+from io import StringIO
+from unittest import mock
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from orders.checkout import InsufficientStock, place_order
+from orders.models import Order
+from products.models import Category, Product
+from .cart import MAX_QUANTITY, Cart, merge_carts, user_cart_key
+from .holds import StockUnavailable, available_to_sell, expire_holds
+from .models import CartLine, StockHold
+from .stores import MemoryCartStore, expire_carts, get_cart_store
 
 # Create your tests here.
+
+class CartSnapshotTest(TestCase):
+    """Cart pages load their product rows once per request, or from the cache."""
+
+    def setUp(self):
+        cat = Category.objects.create(name='Tools', slug='tools')
+        self.products = [
+            Product.objects.create(
+                category=cat, name=f'Tool {i}', slug=f'tool-{i}', price=Decimal('5.00') + i,
+                stock=10, available=True, is_online=True,
+            )
+            for i in range(3)
+        ]
+        for product in self.products:
+            self.client.post(reverse('cart:cart_add', args=[product.id]), {'quantity': 2})
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def _product_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [q['sql'] for q in queries if 'FROM "products_product"' in q['sql']], response
+
+    def test_cart_page_loads_products_once(self):
+        queries, response = self._product_queries(reverse('cart:cart_detail'))
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('"description"', queries[0])
+        self.assertContains(response, 'Tool 2')
+        self.assertContains(response, 'Total: £36.00')
+
+    def test_iteration_reuses_snapshot_without_touching_session(self):
+        cart = Cart(mock.Mock(session=self.client.session, spec=['session']))
+        # Reading the lines from the store is the first query.
+        with self.assertNumQueries(2):
+            first = list(cart)
+            self.assertEqual(list(cart), first)
+            self.assertEqual(cart.get_total_price(), Decimal('36.00'))
+        first[0]['extra'] = 'form'
+        self.assertEqual(next(iter(cart))['extra'], 'form')
+        self.assertNotIn('extra', next(iter(cart.cart.values())))
+        self.assertFalse(cart.session.modified)
+
+    @override_settings(CART_PRODUCT_CACHE_TIMEOUT=30)
+    def test_cached_snapshots_skip_product_table(self):
+        self._product_queries(reverse('cart:cart_detail'))
+        queries, response = self._product_queries(reverse('cart:cart_detail'))
+        self.assertEqual(queries, [])
+        self.assertContains(response, self.products[0].get_absolute_url())
+        # Saving a product drops its snapshot.
+        self.products[0].name = 'Renamed'
+        self.products[0].save()
+        queries, response = self._product_queries(reverse('cart:cart_detail'))
+        self.assertEqual(len(queries), 1)
+        self.assertContains(response, 'Renamed')
+
+    def test_clear_empties_shared_cart(self):
+        request = mock.Mock(session=self.client.session, spec=['session'])
+        cart = Cart.for_request(request)
+        self.assertIs(Cart.for_request(request), cart)
+        cart.clear()
+        self.assertEqual((len(cart), list(cart)), (0, []))
+
+
+class CartStoreTest(TestCase):
+    """Cart lines live in the cart store, written one line at a time."""
+
+    def setUp(self):
+        cat = Category.objects.create(name='Tools', slug='tools')
+        self.drill, self.saw = (
+            Product.objects.create(
+                category=cat, name=name, slug=name.lower(), price=Decimal('10.00'), stock=10,
+                available=True, is_online=True,
+            )
+            for name in ('Drill', 'Saw')
+        )
+
+    def _session(self):
+        return import_module(settings.SESSION_ENGINE).SessionStore()
+
+    def test_add_is_one_upsert_without_session_write(self):
+        cart = Cart(mock.Mock(session=self._session(), spec=['session']))
+        cart.add(self.drill)
+        cart.session.modified = False
+        with CaptureQueriesContext(connection) as queries:
+            cart.add(self.drill, quantity=2)
+            cart.add(self.saw)
+        writes = [q['sql'] for q in queries if 'cart_cartline' in q['sql']]
+        self.assertEqual(len(writes), 2)
+        self.assertTrue(all(sql.startswith('INSERT') and 'ON CONFLICT' in sql for sql in writes))
+        self.assertFalse(cart.session.modified)
+        line = CartLine.objects.get(product=self.drill)
+        self.assertEqual((line.quantity, line.price, line.cart_key), (3, Decimal('10.00'), cart.token))
+
+    def test_cart_is_read_back_from_the_store(self):
+        session = self._session()
+        cart = Cart(mock.Mock(session=session, spec=['session']))
+        cart.add(self.drill, quantity=2)
+        cart.add(self.saw)
+        Product.objects.filter(pk=self.drill.pk).update(price=Decimal('99.00'))
+        again = Cart(mock.Mock(session=session, spec=['session']))
+        self.assertEqual(len(again), 3)
+        self.assertEqual(again.get_total_price(), Decimal('30.00'))
+        again.remove(self.saw)
+        again.clear()
+        self.assertFalse(CartLine.objects.exists())
+        self.assertEqual(len(Cart(mock.Mock(session=session, spec=['session']))), 0)
+
+    def test_anonymous_pages_do_not_create_sessions(self):
+        response = self.client.get(reverse('cart:cart_detail'))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+
+    def test_session_cart_is_moved_into_the_store(self):
+        session = self._session()
+        session[settings.CART_SESSION_ID] = {str(self.drill.id): {'quantity': 2, 'price': '7.50'}}
+        cart = Cart(mock.Mock(session=session, spec=['session']))
+        self.assertNotIn(settings.CART_SESSION_ID, session)
+        self.assertEqual(cart.get_total_price(), Decimal('15.00'))
+        self.assertEqual(CartLine.objects.get().cart_key, cart.token)
+
+    def test_expire_carts_sweeps_untouched_lines(self):
+        old, recent = Cart(mock.Mock(session=self._session(), spec=['session'])), Cart(mock.Mock(session=self._session(), spec=['session']))
+        old.add(self.drill)
+        old.add(self.saw)
+        recent.add(self.drill)
+        CartLine.objects.filter(cart_key=old.token).update(touched=timezone.now() - timedelta(days=31))
+        out = StringIO()
+        call_command('expire_carts', '--batch-size', '1', stdout=out)
+        self.assertIn('expired 2 cart line(s)', out.getvalue())
+        self.assertEqual(list(CartLine.objects.values_list('cart_key', flat=True)), [recent.token])
+
+    def test_reading_refreshes_stale_touched(self):
+        cart = Cart(mock.Mock(session=self._session(), spec=['session']))
+        cart.add(self.drill)
+        CartLine.objects.update(touched=timezone.now() - timedelta(days=2))
+        self.assertEqual(len(Cart(mock.Mock(session=cart.session, spec=['session']))), 1)
+        self.assertGreater(CartLine.objects.get().touched, timezone.now() - timedelta(minutes=1))
+
+    @override_settings(CART_STORE='cart.stores.MemoryCartStore')
+    def test_memory_store(self):
+        self.assertIsInstance(get_cart_store(), MemoryCartStore)
+        session = self._session()
+        cart = Cart(mock.Mock(session=session, spec=['session']))
+        cart.add(self.drill, quantity=2)
+        cart.add(self.saw)
+        self.assertFalse(CartLine.objects.exists())
+        self.assertEqual(Cart(mock.Mock(session=session, spec=['session'])).get_total_price(), Decimal('30.00'))
+        self.assertEqual(expire_carts(), 0)
+        cart.remove(self.saw)
+        self.assertEqual(len(Cart(mock.Mock(session=session, spec=['session']))), 2)
+
+    def test_memory_store_evicts_least_recently_used(self):
+        store = MemoryCartStore(max_carts=2)
+        for key in ('a', 'b'):
+            store.set_line(key, 1, 1, Decimal('1.00'))
+        store.load('a')
+        store.set_line('c', 1, 2, Decimal('1.00'))
+        self.assertEqual(store.load('b'), {})
+        self.assertEqual(store.load('a'), {'1': {'quantity': 1, 'price': Decimal('1.00')}})
+        self.assertEqual(store.expire(timezone.now() + timedelta(seconds=1)), 2)
+
+
+class CartMergeTest(TestCase):
+    """Logging in merges the guest cart into the user's persisted cart."""
+
+    def setUp(self):
+        cat = Category.objects.create(name='Tools', slug='tools')
+        self.products = [
+            Product.objects.create(
+                category=cat, name=f'Tool {i}', slug=f'tool-{i}', price=Decimal('5.00'), stock=50,
+                available=True, is_online=True,
+            )
+            for i in range(3)
+        ]
+        self.user = User.objects.create_user(username='alice', password='testpass123')
+
+    def _cart(self, user=None):
+        session = import_module(settings.SESSION_ENGINE).SessionStore()
+        if user is None:
+            return Cart(mock.Mock(session=session, spec=['session']))
+        return Cart(mock.Mock(session=session, user=user, spec=['session', 'user']))
+
+    def test_login_merges_guest_cart(self):
+        drill, saw, hammer = self.products
+        owned = self._cart(self.user)
+        owned.add(drill, quantity=15)
+        owned.add(saw)
+        for product, quantity in ((drill, 10), (hammer, 2)):
+            self.client.post(reverse('cart:cart_add', args=[product.id]), {'quantity': quantity})
+        guest_key = self.client.session['cart_hold_key']
+
+        self.client.post(reverse('accounts:login'), {'username': 'alice', 'password': 'testpass123'})
+
+        self.assertNotIn('cart_hold_key', self.client.session)
+        lines = dict(CartLine.objects.values_list('product_id', 'quantity'))
+        self.assertEqual(lines, {drill.id: MAX_QUANTITY, saw.id: 1, hammer.id: 2})
+        self.assertFalse(CartLine.objects.exclude(cart_key=user_cart_key(self.user)).exists())
+        # One hold per product, for the merged quantity.
+        self.assertEqual(
+            sorted(StockHold.objects.values_list('product_id', 'cart_key', 'quantity')),
+            [(drill.id, user_cart_key(self.user), MAX_QUANTITY), (saw.id, user_cart_key(self.user), 1),
+             (hammer.id, user_cart_key(self.user), 2)],
+        )
+        self.assertFalse(StockHold.objects.filter(cart_key=guest_key).exists())
+        # The cart follows the user to another device.
+        self.assertEqual(len(self._cart(self.user)), MAX_QUANTITY + 3)
+        response = self.client.get(reverse('cart:cart_detail'))
+        self.assertContains(response, 'Tool 2')
+
+    def test_merge_query_count_does_not_grow_with_cart_size(self):
+        guest = self._cart()
+        guest.add(self.products[0])
+        with CaptureQueriesContext(connection) as small:
+            merge_carts(guest.token, user_cart_key(self.user))
+        guest = self._cart()
+        for product in self.products:
+            guest.add(product, quantity=3)
+        with CaptureQueriesContext(connection) as large:
+            self.assertEqual(merge_carts(guest.token, user_cart_key(self.user)), 3)
+        self.assertEqual(len(large), len(small))
+        self.assertEqual(len([q for q in large if 'FROM "products_product"' in q['sql']]), 1)
+
+    def test_merge_skips_unavailable_products(self):
+        guest = self._cart()
+        guest.add(self.products[0])
+        guest.add(self.products[1])
+        Product.objects.filter(pk=self.products[1].pk).update(available=False)
+        self.assertEqual(merge_carts(guest.token, user_cart_key(self.user)), 1)
+        self.assertEqual(list(CartLine.objects.values_list('product_id', flat=True)), [self.products[0].id])
+
+    def test_merge_is_limited_to_available_stock(self):
+        drill, saw, _hammer = self.products
+        guest, owned = self._cart(), self._cart(self.user)
+        guest.add(drill, quantity=2)
+        guest.add(saw)
+        owned.add(drill, quantity=3)
+        owned.add(saw, quantity=2)
+        self._cart().add(drill, quantity=45)
+        self._cart().add(saw, quantity=47)
+        Product.objects.filter(pk=saw.pk).update(stock=49)
+
+        self.assertEqual(merge_carts(guest.token, user_cart_key(self.user)), 1)
+        # 50 drills less the other cart's 45; the saw line is not reduced.
+        holds = StockHold.objects.filter(cart_key=user_cart_key(self.user))
+        self.assertEqual(dict(holds.values_list('product_id', 'quantity')), {drill.id: 5, saw.id: 2})
+        self.assertEqual(len(self._cart(self.user)), 7)
+        self.assertFalse(StockHold.objects.filter(cart_key=guest.token).exists())
+
+    def test_api_login_merges_guest_cart(self):
+        api = APIClient()
+        api.post('/api/cart/add/', {'product_id': self.products[0].id, 'quantity': 4})
+        token = api.post('/api/auth/login/', {'username': 'alice', 'password': 'testpass123'}).data['token']
+        device = APIClient()
+        device.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        self.assertEqual(device.get('/api/cart/').data['total_items'], 4)
+
+
+class StockHoldTest(TestCase):
+    """Adding to the cart holds stock for a limited time."""
+
+    def setUp(self):
+        cat = Category.objects.create(name='Tools', slug='tools')
+        self.drill = Product.objects.create(
+            category=cat, name='Drill', slug='drill', price=Decimal('10.00'), stock=5, available=True, is_online=True,
+        )
+
+    def _cart(self):
+        return Cart(mock.Mock(session=import_module(settings.SESSION_ENGINE).SessionStore(), spec=['session']))
+
+    def _order(self):
+        return Order(first_name='John', last_name='Doe', email='john@example.com',
+                     address='123 Main St', postal_code='AB1 2CD', city='London')
+
+    def _available(self):
+        return available_to_sell([self.drill.pk])[self.drill.pk]
+
+    def test_holds_reduce_available_to_sell(self):
+        first, second = self._cart(), self._cart()
+        first.add(self.drill, quantity=2)
+        first.add(self.drill, quantity=1)
+        self.assertEqual(self._available(), 2)
+        with self.assertRaises(StockUnavailable) as raised:
+            second.add(self.drill, quantity=3)
+        self.assertEqual(raised.exception.available, 2)
+        self.assertEqual(len(second), 0)
+        second.add(self.drill, quantity=2)
+        self.assertEqual(self._available(), 0)
+
+    def test_update_and_remove_adjust_hold(self):
+        cart = self._cart()
+        cart.add(self.drill, quantity=4)
+        cart.add(self.drill, quantity=1, update_quantity=True)
+        self.assertEqual(StockHold.objects.get().quantity, 1)
+        cart.remove(self.drill)
+        self.assertFalse(StockHold.objects.exists())
+        self.assertEqual(self._available(), 5)
+
+    def test_adding_renews_every_hold_of_the_cart(self):
+        saw = Product.objects.create(
+            category=self.drill.category, name='Saw', slug='saw', price=Decimal('5.00'), stock=5,
+            available=True, is_online=True,
+        )
+        cart = self._cart()
+        cart.add(self.drill, quantity=2)
+        StockHold.objects.update(expires=timezone.now() + timedelta(seconds=5))
+        cart.add(saw)
+        cart.add(saw, quantity=3, update_quantity=True)
+        holds = StockHold.objects.order_by('product_id')
+        self.assertEqual(list(holds.values_list('quantity', flat=True)), [2, 3])
+        self.assertEqual(len({hold.expires for hold in holds}), 1)
+        self.assertGreater(holds[0].expires, timezone.now() + timedelta(minutes=10))
+
+    def test_expired_holds_do_not_count_and_are_swept(self):
+        self._cart().add(self.drill, quantity=5)
+        StockHold.objects.update(expires=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self._available(), 5)
+        self._cart().add(self.drill, quantity=5)
+        self.assertEqual(expire_holds(batch_size=1), 1)
+        self.assertEqual(StockHold.objects.count(), 1)
+        out = StringIO()
+        call_command('expire_stock_holds', stdout=out)
+        self.assertIn('expired 0 stock hold(s)', out.getvalue())
+
+    @override_settings(CART_HOLD_SECONDS=60)
+    def test_hold_lifetime_setting(self):
+        self._cart().add(self.drill)
+        remaining = StockHold.objects.get().expires - timezone.now()
+        self.assertTrue(timedelta(seconds=55) < remaining <= timedelta(seconds=60))
+
+    def test_checkout_converts_holds(self):
+        cart = self._cart()
+        cart.add(self.drill, quantity=3)
+        order = place_order(self._order(), cart)
+        self.assertEqual(order.items.get().quantity, 3)
+        self.assertFalse(StockHold.objects.exists())
+        self.drill.refresh_from_db()
+        self.assertEqual(self.drill.stock, 2)
+
+    def test_checkout_respects_other_carts_holds(self):
+        holder, buyer = self._cart(), self._cart()
+        holder.add(self.drill, quantity=3)
+        buyer.add(self.drill, quantity=2)
+        Product.objects.filter(pk=self.drill.pk).update(stock=4)
+        with self.assertRaises(InsufficientStock):
+            place_order(self._order(), buyer)
+        self.assertEqual(Order.objects.count(), 0)
+        buyer.clear()
+        place_order(self._order(), holder)
+        self.drill.refresh_from_db()
+        self.assertEqual(self.drill.stock, 1)
+
+    def test_views_report_unavailable_stock(self):
+        Product.objects.filter(pk=self.drill.pk).update(stock=1)
+        response = self.client.post(reverse('cart:cart_add', args=[self.drill.id]), {'quantity': 2}, follow=True)
+        self.assertContains(response, 'only 1 of')
+        api = APIClient()
+        response = api.post('/api/cart/add/', {'product_id': self.drill.id, 'quantity': 2})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['available'], 1)
@@ -1,6 +1,7 @@
 """
 Cart URL Configuration
-Routes for viewing, adding to, and removing from the shopping cart.
+Routes for viewing, adding to, and removing from the shopping cart, and
+the JSON summary behind the header badge.
 """
 from django.urls import path
 from . import views
@@ -9,6 +10,7 @@ app_name = 'cart'
 
 urlpatterns = [
     path('', views.cart_detail, name='cart_detail'),
+    path('summary/', views.cart_summary, name='cart_summary'),
     path('add/<int:product_id>/', views.cart_add, name='cart_add'),
     path('remove/<int:product_id>/', views.cart_remove, name='cart_remove'),
 ]
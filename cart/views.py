@@ -1,37 +1,74 @@
 """
 Cart Views
-Function-based views for adding/removing products and displaying
-the cart detail page.
+Function-based views for adding/removing products, displaying the cart
+detail page, and the JSON cart summary behind the header badge.
 """
+from django.contrib import messages
+from django.http import JsonResponse
+from django.middleware.csrf import get_token
+from django.utils.cache import add_never_cache_headers
 from django.shortcuts import render, redirect, get_object_or_404
-from django.views.decorators.http import require_POST
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import require_GET, require_http_methods, require_POST
 from products.models import Product
 from .cart import Cart
 from .forms import CartAddProductForm
+from .holds import StockUnavailable
 
 # Create your views here.
 
-@require_POST
+@never_cache
+@require_http_methods(['GET', 'POST'])
 def cart_add(request, product_id):
-    cart = Cart(request)
     product = get_object_or_404(Product, id=product_id)
+    if request.method == 'GET':
+        # Fallback for the cached product pages: their add-to-cart form is
+        # submitted here by GET until the cart summary script supplies a
+        # CSRF token, so this renders the same form with one.
+        form = CartAddProductForm(initial={
+            'quantity': request.GET.get('quantity', 1), 'update': request.GET.get('update', False),
+        })
+        return render(request, 'cart/add.html', {'product': product, 'form': form})
+    cart = Cart.for_request(request)
     form = CartAddProductForm(request.POST)
     if form.is_valid():
         cd = form.cleaned_data
-        cart.add(product=product, quantity=cd['quantity'], update_quantity=cd['update'])
+        try:
+            cart.add(product=product, quantity=cd['quantity'], update_quantity=cd['update'])
+        except StockUnavailable as exc:
+            messages.error(
+                request,
+                f'Sorry, only {exc.available} of "{product.name}" available right now.',
+            )
     return redirect('cart:cart_detail')
 
 
 @require_POST
 def cart_remove(request, product_id):
-    cart = Cart(request)
+    cart = Cart.for_request(request)
     product = get_object_or_404(Product, id=product_id)
     cart.remove(product)
     return redirect('cart:cart_detail')
 
 
 def cart_detail(request):
-    cart = Cart(request)
+    cart = Cart.for_request(request)
     for item in cart:
         item['update_quantity_form'] = CartAddProductForm(initial={'quantity': item['quantity'], 'update': True})
     return render(request, 'cart/detail.html', {'cart': cart})
+
+
+@require_GET
+def cart_summary(request):
+    """
+    Item count and total for the header badge, and a CSRF token for the
+    forms on cached pages (which cannot carry a per-visitor token).
+    """
+    cart = Cart.for_request(request)
+    response = JsonResponse({
+        'count': len(cart),
+        'total': f'{cart.get_total_price():.2f}',
+        'csrf_token': get_token(request),
+    })
+    add_never_cache_headers(response)
+    return response
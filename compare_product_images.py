@@ -7,6 +7,9 @@ Run extract_product_images.py first to generate the list file.
 
 import os
 
+from products.images import is_variant
+from xyz_store.storage import is_hashed_copy
+
 def compare_images():
     """Compare actual images with the stored list"""
     
@@ -33,7 +36,7 @@ def compare_images():
     try:
         files = os.listdir(media_path)
         image_extensions = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
-        current_images = set([f for f in files if f.lower().endswith(image_extensions)])
+        current_images = set([f for f in files if f.lower().endswith(image_extensions) and not is_variant(f) and not is_hashed_copy(f)])
         
         print(f"Found {len(current_images)} images in media folder")
         
@@ -6,6 +6,9 @@ Scans the media/products/ folder and saves all image filenames
 
 import os
 
+from products.images import is_variant
+from xyz_store.storage import is_hashed_copy
+
 def extract_image_names():
     """Extract all product image filenames and save to file"""
     
@@ -28,7 +31,8 @@ def extract_image_names():
         
         # Filter for image files (jpg, jpeg, png, gif, webp)
         image_extensions = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
-        image_files = [f for f in files if f.lower().endswith(image_extensions)]
+        # Skip generated resized variants (e.g. drill-320w.webp)
+        image_files = [f for f in files if f.lower().endswith(image_extensions) and not is_variant(f) and not is_hashed_copy(f)]
         
         # Sort alphabetically
         image_files.sort()
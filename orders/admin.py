@@ -1,10 +1,15 @@
 """
 Orders Admin
 Admin configuration for Order and OrderItem models with inline items,
-status editing, payment info, user details, and date hierarchy.
+status editing, payment info, user details, date hierarchy, and a bulk
+"mark as paid" action.
 """
 from django.contrib import admin
+from django.db import transaction
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, Value, When
+from products.models import DashboardStatistics
 from .models import Order, OrderItem
+from .sales import create_sales_for_orders
 
 # Register your models here.
 
@@ -28,9 +33,11 @@ class OrderAdmin(admin.ModelAdmin):
     search_fields = ['first_name', 'last_name', 'email', 'address', 'postal_code', 'city', 'payment_id']
     inlines = [OrderItemInline]
     readonly_fields = ['created', 'updated', 'get_total_cost', 'payment_id']
+    list_select_related = ['user']
     list_per_page = 25
     date_hierarchy = 'created'
     list_editable = ['status']
+    actions = ['mark_paid']
     
     fieldsets = (
         ('Customer Information', {
@@ -55,8 +62,23 @@ class OrderAdmin(admin.ModelAdmin):
     get_user_info.admin_order_field = 'user'
     
     def get_total_cost(self, obj):
-        return f"£{obj.get_total_cost()}"
+        return f"£{obj.total_cost:.2f}"
     get_total_cost.short_description = 'Total Cost'
+    get_total_cost.admin_order_field = 'total_cost'
+    
+    def mark_paid(self, request, queryset):
+        """Mark the selected unpaid orders as paid and record their sales in bulk"""
+        order_ids = list(queryset.filter(paid=False).values_list('id', flat=True))
+        with transaction.atomic():
+            Order.objects.filter(id__in=order_ids).update(
+                paid=True,
+                status=Case(When(status='pending', then=Value('processing')), default=F('status')),
+            )
+            # update() sends no signals: write the sales and flag the dashboard here.
+            sales = create_sales_for_orders(order_ids)
+            DashboardStatistics.mark_stale()
+        self.message_user(request, f'{len(order_ids)} order(s) marked as paid, {len(sales)} sale(s) recorded.')
+    mark_paid.short_description = '✓ Mark selected orders as PAID'
     
     def get_queryset(self, request):
         """
@@ -77,8 +99,18 @@ class OrderItemAdmin(admin.ModelAdmin):
     list_filter = ['order__created', 'product__category']
     search_fields = ['product__name', 'order__email', 'order__first_name', 'order__last_name']
     raw_id_fields = ['order', 'product']
+    list_select_related = ['order', 'product']
     list_per_page = 50
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            cost=ExpressionWrapper(
+                F('price') * F('quantity'),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            )
+        )
+    
     def get_cost(self, obj):
-        return f"£{obj.get_cost()}"
+        return f"£{obj.cost:.2f}"
     get_cost.short_description = 'Total Cost'
+    get_cost.admin_order_field = 'cost'
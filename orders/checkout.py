@@ -0,0 +1,192 @@
+"""
+Checkout
+Shared write path for turning a cart into an order, used by the checkout
+view and the API. The cart is read once, the order is saved with its
+total and line count, all OrderItems are written with one bulk_create,
+the stock taken is appended to the inventory ledger with another, and
+the cart's stock holds are released in the same transaction (they become
+the order's items).
+
+Stock is reserved optimistically, without row locks (select_for_update
+is a no-op on SQLite): one conditional UPDATE decrements every line only
+where enough stock is left once other carts' live holds are set aside
+(stock - held >= quantity), and the order is rolled back unless it
+touched one row per line. The UPDATE is the transaction's first
+statement, so SQLite takes its write lock up front and waits on the busy
+timeout instead of failing a read-to-write upgrade; "database is locked"
+errors that still get through are retried with backoff. The catalog
+version is bumped once the order is committed, outside the retry, and at
+most once per CATALOG_STOCK_BUMP_INTERVAL seconds: a sale within that
+long of the last bump is postponed to the end of the interval (see
+CatalogVersion.bump), so catalog pages may show stock counts up to that
+much out of date, while adding to the cart still checks live stock.
+"""
+import random
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+from django.db.models import Case, F, Value, When
+
+from cart.holds import available_to_sell, held_units, release_holds
+from products.inventory import record_movements
+from products.models import CatalogVersion, DashboardStatistics, InventoryMovement, Product
+from .models import OrderItem
+
+# Attempts per checkout before a "database is locked" error is raised.
+DEFAULT_MAX_ATTEMPTS = 5
+# First retry delay in seconds; doubled per attempt, with jitter.
+DEFAULT_RETRY_DELAY = 0.05
+# Checkouts bump the catalog version at most this often (seconds).
+DEFAULT_STOCK_BUMP_INTERVAL = 60
+
+
+class InsufficientStock(Exception):
+    """Raised when a cart item's quantity exceeds available product stock."""
+
+    def __init__(self, product_name):
+        self.product_name = product_name
+        super().__init__(product_name)
+
+
+class ProductUnavailable(Exception):
+    """Raised when cart lines refer to products deleted since they were added."""
+
+    def __init__(self, product_ids):
+        self.product_ids = product_ids
+        super().__init__(product_ids)
+
+
+class StockChanged(Exception):
+    """The conditional stock UPDATE missed a line that looked fillable; retried."""
+
+
+def cart_lines(cart):
+    """{product_id: (quantity, price)} from the cart's session data, without queries."""
+    return {
+        int(product_id): (item['quantity'], Decimal(item['price']))
+        for product_id, item in cart.cart.items()
+    }
+
+
+def find_shortfall(lines, hold_key=None):
+    """
+    Name of the first line that stock, less other carts' live holds,
+    cannot fill, or None. Raises ProductUnavailable if any line's product
+    no longer exists. Read outside the write transaction, so it takes no
+    lock.
+    """
+    available = available_to_sell(lines, exclude_key=hold_key)
+    missing = [product_id for product_id in lines if product_id not in available]
+    if missing:
+        raise ProductUnavailable(missing)
+    for product_id, (quantity, _price) in lines.items():
+        if available[product_id] < quantity:
+            return Product.objects.values_list('name', flat=True).get(pk=product_id)
+    return None
+
+
+def reserve_stock(lines, hold_key=None):
+    """
+    Decrement stock for every line in one statement:
+    UPDATE ... SET stock = stock - CASE id ... END
+    WHERE id IN (...) AND stock - <other carts' live holds> >= CASE id ... END.
+    Returns True if every line was reserved.
+    """
+    quantities = Case(
+        *(When(id=product_id, then=Value(quantity)) for product_id, (quantity, _price) in lines.items()),
+        default=Value(0),
+    )
+    updated = Product.objects.filter(
+        id__in=list(lines), stock__gte=quantities + held_units(exclude_key=hold_key)
+    ).update(stock=F('stock') - quantities)
+    return updated == len(lines)
+
+
+def _write_order(order, lines, hold_key):
+    with transaction.atomic():
+        if not reserve_stock(lines, hold_key):
+            # Another checkout took the stock since find_shortfall(); undo the
+            # lines that were reserved and let the caller look again.
+            raise StockChanged()
+        # Stored here: bulk_create bypasses the OrderItem signals.
+        order.total_cost = sum(price * quantity for quantity, price in lines.values())
+        order.item_count = len(lines)
+        order.save()
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product_id=product_id, price=price, quantity=quantity)
+            for product_id, (quantity, price) in lines.items()
+        ])
+        record_movements(
+            [(product_id, -quantity) for product_id, (quantity, _price) in lines.items()],
+            InventoryMovement.REASON_SALE,
+            reference=f'order {order.pk}',
+        )
+        if hold_key:
+            release_holds(hold_key)
+        # Likewise the dashboard signals (place_order bumps the catalog version).
+        DashboardStatistics.mark_stale()
+
+
+def bump_catalog_version():
+    """Record a checkout's stock change in the catalog version, rate-limited."""
+    CatalogVersion.bump(
+        min_interval=getattr(settings, 'CATALOG_STOCK_BUMP_INTERVAL', DEFAULT_STOCK_BUMP_INTERVAL),
+    )
+
+
+def _is_locked(exc):
+    message = str(exc)
+    return 'locked' in message or 'busy' in message
+
+
+def place_order(order, cart, max_attempts=None, retry_delay=None):
+    """
+    Save the unsaved `order` with one OrderItem per cart line and take the
+    quantities out of stock, all in one transaction. Raises
+    InsufficientStock (and writes nothing) if any line cannot be filled,
+    or ProductUnavailable if any line's product has been deleted.
+    Returns the saved order; the caller clears the cart.
+    """
+    if max_attempts is None:
+        max_attempts = getattr(settings, 'CHECKOUT_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+    if retry_delay is None:
+        retry_delay = getattr(settings, 'CHECKOUT_RETRY_DELAY', DEFAULT_RETRY_DELAY)
+    # Inside an outer transaction a failed statement cannot be retried.
+    if connection.in_atomic_block:
+        max_attempts = 1
+
+    lines = cart_lines(cart)
+    hold_key = cart.hold_key
+    for attempt in range(1, max_attempts + 1):
+        shortfall = find_shortfall(lines, hold_key)
+        if shortfall:
+            raise InsufficientStock(shortfall)
+        try:
+            _write_order(order, lines, hold_key)
+        except StockChanged:
+            pass
+        except OperationalError as exc:
+            if not _is_locked(exc) or attempt == max_attempts:
+                raise
+            time.sleep(retry_delay * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+        else:
+            # Outside the retry: the order is committed, so a failed bump
+            # (say, "database is locked") is logged rather than raised, and
+            # never places it again.
+            transaction.on_commit(bump_catalog_version, robust=True)
+            return order
+        # The rolled-back attempt may have assigned a primary key.
+        order.pk = None
+        order._state.adding = True
+
+    # Every attempt lost the stock race; report the line that ran out, or
+    # the scarcest if they have all been restocked since.
+    shortfall = find_shortfall(lines, hold_key) or (
+        Product.objects.filter(id__in=list(lines)).order_by('stock').values_list('name', flat=True).first()
+    )
+    if shortfall is None:
+        # Deleted after find_shortfall() saw them.
+        raise ProductUnavailable(list(lines))
+    raise InsufficientStock(shortfall)
@@ -0,0 +1,19 @@
+# Generated by Django 6.0.7 on 2026-10-17 19:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_order_payment_id_order_payment_method_order_status'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-created'], name='orders_orde_user_id_710475_idx'),
+        ),
+    ]
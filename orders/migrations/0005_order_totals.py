@@ -0,0 +1,44 @@
+# Generated by Django 6.0.7 on 2026-10-17 20:10
+
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Round
+
+
+def store_order_totals(apps, schema_editor):
+    """Backfill the totals of existing orders with one UPDATE."""
+    Order = apps.get_model('orders', 'Order')
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    items = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order')
+    Order.objects.update(
+        total_cost=Round(Coalesce(
+            Subquery(items.annotate(total=Sum(F('price') * F('quantity'))).values('total'),
+                     output_field=DecimalField(max_digits=12, decimal_places=2)),
+            Value(0, output_field=DecimalField(max_digits=12, decimal_places=2)),
+        ), 2),
+        item_count=Coalesce(
+            Subquery(items.annotate(n=Count('id')).values('n'), output_field=IntegerField()),
+            Value(0),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_order_user_created_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0, help_text='Number of order lines'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='total_cost',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Sum of price x quantity over the items', max_digits=12),
+        ),
+        migrations.RunPython(store_order_totals, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,11 @@
 """
 Orders Models
 Order and OrderItem models for customer orders with payment method,
-status tracking, and cost calculation.
+status tracking, and cost calculation. The order total and line count are
+stored on Order so order lists need no per-order item scans.
 """
 from django.db import models
+from django.db.models import Count, F, Sum
 from django.contrib.auth.models import User
 from products.models import Product
 
@@ -38,15 +40,46 @@ class Order(models.Model):
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHOD_CHOICES, default='card')
     payment_id = models.CharField(max_length=250, blank=True, null=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    total_cost = models.DecimalField(max_digits=12, decimal_places=2, default=0, help_text='Sum of price x quantity over the items')
+    item_count = models.PositiveIntegerField(default=0, help_text='Number of order lines')
     
     class Meta:
         ordering = ('-created',)
+        indexes = [
+            models.Index(fields=['user', '-created']),
+        ]
     
     def __str__(self):
         return f'Order {self.id}'
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored paid flag so the sales signal only acts on
+        # the unpaid -> paid transition.
+        loaded = dict(zip(field_names, values))
+        if 'paid' in loaded:
+            instance._loaded_paid = loaded['paid']
+        return instance
+    
     def get_total_cost(self):
-        return sum(item.get_cost() for item in self.items.all())
+        """Stored total; an order without items totals 0, as the item sum did"""
+        return self.total_cost if self.item_count else 0
+    
+    def refresh_totals(self):
+        """Recompute total_cost and item_count from the items and store them"""
+        totals = self.items.aggregate(
+            total_cost=Sum(
+                F('price') * F('quantity'),
+                output_field=models.DecimalField(max_digits=12, decimal_places=2),
+                default=0,
+            ),
+            item_count=Count('id'),
+        )
+        # update() rather than save(): no Order signals, no other fields.
+        Order.objects.filter(pk=self.pk).update(**totals)
+        self.total_cost = totals['total_cost']
+        self.item_count = totals['item_count']
 
 
 class OrderItem(models.Model):
@@ -0,0 +1,45 @@
+"""
+Order Sales
+Materializes Sale records for paid orders: order items are loaded with
+their products in one query and the Sale rows are written with a single
+bulk_create, then added to the daily sales rollups. Used by the
+unpaid -> paid signal and the admin "mark as paid" action.
+"""
+from django.db import transaction
+
+from products.models import Sale
+from products.reports import record_sales
+from .models import OrderItem
+
+# Keeps IN (...) lists under SQLite's bound-parameter limit.
+CHUNK_SIZE = 500
+
+
+@transaction.atomic
+def create_sales_for_orders(order_ids, batch_size=1000):
+    """
+    Create one Sale per order item for the given (paid) orders, skipping
+    orders that already have sales. Returns the list of Sale rows created.
+    """
+    order_ids = list(order_ids)
+    sales = []
+    for start in range(0, len(order_ids), CHUNK_SIZE):
+        chunk = order_ids[start:start + CHUNK_SIZE]
+        done = set(Sale.objects.filter(order_id__in=chunk).order_by().values_list('order_id', flat=True).distinct())
+        items = OrderItem.objects.filter(
+            order_id__in=[order_id for order_id in chunk if order_id not in done]
+        ).select_related('product').order_by('order_id', 'id')
+        sales.extend(
+            Sale(
+                order_id=item.order_id,
+                category_id=item.product.category_id,
+                item=item.product,
+                sold_price=item.price,
+                quantity=item.quantity,
+            )
+            for item in items
+        )
+    Sale.objects.bulk_create(sales, batch_size=batch_size)
+    # bulk_create bypasses the Sale signals that maintain the rollups.
+    record_sales(sales)
+    return sales
@@ -1,30 +1,53 @@
 """
 Orders Signals
 Automatically creates Sale records for each OrderItem when an order
-is marked as paid. Prevents duplicate sale entries.
+goes from unpaid to paid (in bulk, see orders/sales.py). Prevents
+duplicate sale entries.
+Keeps the total and line count stored on Order in step when items are
+added, edited or deleted outside checkout (admin inlines, scripts).
+Marks the admin DashboardStatistics snapshot stale when orders or their
+items change.
 """
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
-from .models import Order
-from products.models import Sale
+from .models import Order, OrderItem
+from products.models import DashboardStatistics
+from .sales import create_sales_for_orders
 
 
 @receiver(post_save, sender=Order)
-def create_sales_from_order(sender, instance, created, **kwargs):
+def create_sales_from_order(sender, instance, created, update_fields=None, raw=False, **kwargs):
     """
-    Automatically create Sale records when an order is marked as paid
+    Create Sale records when an order goes from unpaid to paid.
+    Order.from_db remembers the loaded paid flag, so saves of orders that
+    were already paid (status edits, etc.) cost no queries here.
     """
-    if instance.paid and not created:
-        # Check if sales already exist for this order to avoid duplicates
-        existing_sales = Sale.objects.filter(order=instance).exists()
-        
-        if not existing_sales:
-            # Create a Sale record for each item in the order
-            for item in instance.items.all():
-                Sale.objects.create(
-                    order=instance,
-                    category=item.product.category,
-                    item=item.product,
-                    sold_price=item.price,
-                    quantity=item.quantity
-                )
+    if raw or created or not instance.paid:
+        return
+    if update_fields is not None and 'paid' not in update_fields:
+        return
+    if getattr(instance, '_loaded_paid', False):
+        return
+    create_sales_for_orders([instance.pk])
+    instance._loaded_paid = True
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def update_order_totals(sender, instance, raw=False, **kwargs):
+    """Recompute the stored totals of the item's order"""
+    if raw:
+        return
+    # Refresh the caller's Order instance when there is one, so a later
+    # order.save() does not write back stale totals.
+    order = instance.order if OrderItem.order.is_cached(instance) else Order(pk=instance.order_id)
+    order.refresh_totals()
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def invalidate_dashboard_statistics(sender, **kwargs):
+    """Flag the dashboard snapshot for recomputation"""
+    DashboardStatistics.mark_stale()
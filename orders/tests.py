@@ -3,10 +3,19 @@ Orders Tests
 Tests for order creation, payment flow, and order management.
 """
 from decimal import Decimal
-from django.test import TestCase
+from importlib import import_module
+from io import StringIO
+from unittest import mock
+from django.conf import settings
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.contrib.auth.models import User
-from products.models import Category, Product
+from products.models import Category, Product, Sale, SalesDailyRollup
+from cart.cart import Cart
+from orders.checkout import InsufficientStock, ProductUnavailable, place_order, reserve_stock
 from orders.models import Order, OrderItem
 
 
@@ -38,6 +47,8 @@ class OrderCreateViewTest(TestCase):
         self.assertEqual(self.product.stock, 7)
         self.assertEqual(Order.objects.count(), 1)
         self.assertEqual(OrderItem.objects.count(), 1)
+        sale = self.product.inventory_movements.latest('id')
+        self.assertEqual((sale.delta, sale.reason, sale.reference), (-3, 'sale', f'order {Order.objects.get().pk}'))
 
     def test_order_create_links_authenticated_user(self):
         user = User.objects.create_user(username='buyer', password='pass12345')
@@ -50,9 +61,11 @@ class OrderCreateViewTest(TestCase):
     def test_order_create_insufficient_stock_no_order(self):
         low = Product.objects.create(
             category=self.cat, name='Rare', slug='rare',
-            price=Decimal('5.00'), stock=1, available=True, is_online=True,
+            price=Decimal('5.00'), stock=5, available=True, is_online=True,
         )
         self._add_to_cart(low, 5)
+        # The held units are sold off before checkout (e.g. by an admin edit).
+        Product.objects.filter(pk=low.pk).update(stock=1)
         response = self.client.post(reverse('orders:order_create'), self.order_data, follow=True)
         self.assertEqual(Order.objects.count(), 0)
         low.refresh_from_db()
@@ -60,6 +73,24 @@ class OrderCreateViewTest(TestCase):
         # User is redirected back to the cart.
         self.assertRedirects(response, reverse('cart:cart_detail'))
 
+    # The database store's lines go with the product; the memory store's stay.
+    @override_settings(CART_STORE='cart.stores.MemoryCartStore')
+    def test_order_create_drops_deleted_products(self):
+        gone = Product.objects.create(
+            category=self.cat, name='Gone', slug='gone',
+            price=Decimal('5.00'), stock=5, available=True, is_online=True,
+        )
+        self._add_to_cart(self.product, 1)
+        self._add_to_cart(gone, 2)
+        gone.delete()
+        response = self.client.post(reverse('orders:order_create'), self.order_data, follow=True)
+        self.assertRedirects(response, reverse('cart:cart_detail'))
+        self.assertContains(response, 'no longer available')
+        self.assertEqual(Order.objects.count(), 0)
+        # The shopper can check out what is left.
+        self.client.post(reverse('orders:order_create'), self.order_data)
+        self.assertEqual(list(Order.objects.get().items.values_list('product_id', 'quantity')), [(self.product.id, 1)])
+
     def test_order_create_exact_stock_succeeds(self):
         exact = Product.objects.create(
             category=self.cat, name='Exact', slug='exact',
@@ -71,6 +102,33 @@ class OrderCreateViewTest(TestCase):
         self.assertEqual(exact.stock, 0)
         self.assertEqual(Order.objects.count(), 1)
 
+    def test_order_create_multi_line_cart_in_constant_queries(self):
+        products = [
+            Product.objects.create(
+                category=self.cat, name=f'Bit {i}', slug=f'bit-{i}',
+                price=Decimal('2.00') + i, stock=20, available=True, is_online=True,
+            )
+            for i in range(8)
+        ]
+        counts = []
+        for lines in (products[:2], products[2:]):
+            for quantity, product in enumerate(lines, start=1):
+                self._add_to_cart(product, quantity)
+            with CaptureQueriesContext(connection) as queries:
+                self.client.post(reverse('orders:order_create'), self.order_data)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+        order = Order.objects.first()
+        self.assertEqual((order.total_cost, order.item_count), (Decimal('154.00'), 6))
+        self.assertEqual(
+            sorted(order.items.values_list('product_id', 'price', 'quantity')),
+            [(product.id, product.price, quantity) for quantity, product in enumerate(products[2:], start=1)],
+        )
+        self.assertEqual(
+            list(Product.objects.filter(pk__in=[p.pk for p in products]).order_by('id').values_list('stock', flat=True)),
+            [19, 18, 19, 18, 17, 16, 15, 14],
+        )
+
 
 class PaymentViewTest(TestCase):
     """Tests for the payment simulation flow (orders:payment)."""
@@ -105,3 +163,249 @@ class PaymentViewTest(TestCase):
         response = self.client.get(reverse('orders:payment_done', args=[self.order.id]))
         self.assertEqual(response.status_code, 404)
 
+
+
+class OrderAdminTest(TestCase):
+    """Order admin changelists annotate totals instead of querying per row."""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('boss', 'boss@example.com', 'pass123'))
+        self.cat = Category.objects.create(name='Tools', slug='tools')
+        self.product = Product.objects.create(
+            category=self.cat, name='Drill', slug='drill',
+            price=Decimal('10.00'), stock=100, available=True, is_online=True,
+        )
+
+    def _add_orders(self, count):
+        for _ in range(count):
+            user = User.objects.create_user(username=f'buyer{User.objects.count()}', password='pass12345')
+            order = Order.objects.create(
+                user=user, first_name='John', last_name='Doe', email='john@example.com',
+                address='123 Main St', postal_code='AB1 2CD', city='London',
+            )
+            for quantity in range(1, Order.objects.count() + 1):
+                OrderItem.objects.create(order=order, product=self.product, price=Decimal('10.00'), quantity=quantity)
+
+    def _assert_constant_queries(self, url):
+        self._add_orders(2)
+        with CaptureQueriesContext(connection) as few:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self._add_orders(8)
+        with CaptureQueriesContext(connection) as many:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(len(few), len(many))
+
+    def test_order_changelist_query_count(self):
+        self._assert_constant_queries('/admin/orders/order/')
+
+    def test_order_item_changelist_query_count(self):
+        self._assert_constant_queries('/admin/orders/orderitem/')
+
+    def test_orders_sort_by_total_cost(self):
+        self._add_orders(3)
+        changelist = self.client.get('/admin/orders/order/', {'o': '-7'}).context['cl']
+        self.assertEqual([o.total_cost for o in changelist.result_list], [Decimal('60.00'), Decimal('30.00'), Decimal('10.00')])
+        order = changelist.result_list[0]
+        self.assertContains(self.client.get(f'/admin/orders/order/{order.id}/change/'), '£60.00')
+
+
+class OrderTotalsTest(TestCase):
+    """total_cost / item_count are stored on Order and kept in step with its items."""
+
+    def setUp(self):
+        self.cat = Category.objects.create(name='Tools', slug='tools')
+        self.product = Product.objects.create(
+            category=self.cat, name='Drill', slug='drill',
+            price=Decimal('10.00'), stock=100, available=True, is_online=True,
+        )
+        self.order = Order.objects.create(
+            first_name='John', last_name='Doe', email='john@example.com',
+            address='123 Main St', postal_code='AB1 2CD', city='London',
+        )
+
+    def _stored(self):
+        return Order.objects.values_list('total_cost', 'item_count').get(pk=self.order.pk)
+
+    def test_item_edits_update_stored_totals(self):
+        item = OrderItem.objects.create(order=self.order, product=self.product, price=Decimal('10.00'), quantity=2)
+        OrderItem.objects.create(order=self.order, product=self.product, price=Decimal('2.50'), quantity=1)
+        self.assertEqual(self._stored(), (Decimal('22.50'), 2))
+        # The caller's instance is refreshed, so saving it keeps the totals.
+        self.assertEqual(self.order.get_total_cost(), Decimal('22.50'))
+        self.order.paid = True
+        self.order.save()
+        item.quantity = 3
+        item.save()
+        self.assertEqual(self._stored(), (Decimal('32.50'), 2))
+        item.delete()
+        self.assertEqual(self._stored(), (Decimal('2.50'), 1))
+
+    def test_verify_command_reports_and_fixes(self):
+        OrderItem.objects.create(order=self.order, product=self.product, price=Decimal('10.00'), quantity=2)
+        OrderItem.objects.filter(order=self.order).update(quantity=5)
+        out = StringIO()
+        call_command('verify_order_totals', stdout=out)
+        self.assertIn(f'Order {self.order.pk}: stored £20.00 / 1 line(s), items £50.00 / 1 line(s)', out.getvalue())
+        self.assertEqual(self._stored(), (Decimal('20.00'), 1))
+        call_command('verify_order_totals', fix=True, stdout=StringIO())
+        self.assertEqual(self._stored(), (Decimal('50.00'), 1))
+        # Float rounding in SQLite's SUM() is not reported as drift.
+        OrderItem.objects.create(order=self.order, product=self.product, price=Decimal('0.10'), quantity=3)
+        OrderItem.objects.create(order=self.order, product=self.product, price=Decimal('19.99'), quantity=7)
+        out = StringIO()
+        call_command('verify_order_totals', stdout=out)
+        self.assertIn('all match', out.getvalue())
+
+
+class OrderSalesTest(TestCase):
+    """Sale rows are written in bulk on the unpaid -> paid transition."""
+
+    def setUp(self):
+        self.cat = Category.objects.create(name='Tools', slug='tools')
+        self.products = [
+            Product.objects.create(
+                category=self.cat, name=f'Tool {i}', slug=f'tool-{i}',
+                price=Decimal('10.00'), stock=100, available=True, is_online=True,
+            )
+            for i in range(6)
+        ]
+
+    def _order(self, lines):
+        order = Order.objects.create(
+            first_name='John', last_name='Doe', email='john@example.com',
+            address='123 Main St', postal_code='AB1 2CD', city='London',
+        )
+        for product in self.products[:lines]:
+            OrderItem.objects.create(order=order, product=product, price=Decimal('10.00'), quantity=2)
+        return Order.objects.get(pk=order.pk)
+
+    def _pay(self, order):
+        """Pay the order; returns the number of queries outside the per-product rollup UPDATEs."""
+        order.paid = True
+        with CaptureQueriesContext(connection) as queries:
+            order.save()
+        return sum(not q['sql'].startswith('UPDATE "products_salesdailyrollup"') for q in queries.captured_queries)
+
+    def test_paying_creates_sales_in_constant_queries(self):
+        small, large = self._order(1), self._order(6)
+        self.assertEqual(self._pay(small), self._pay(large))
+        self.assertEqual(Sale.objects.filter(order=large).count(), 6)
+        self.assertEqual(SalesDailyRollup.objects.get(product=self.products[0]).units, 4)
+
+    def test_saving_a_paid_order_does_not_touch_sales(self):
+        order = self._order(2)
+        self._pay(order)
+        order = Order.objects.get(pk=order.pk)
+        order.status = 'shipped'
+        with CaptureQueriesContext(connection) as queries:
+            order.save()
+        self.assertFalse(any('products_sale' in q['sql'] for q in queries.captured_queries))
+        self.assertEqual(Sale.objects.filter(order=order).count(), 2)
+
+    def test_no_duplicate_sales_for_unloaded_instances(self):
+        order = self._order(2)
+        self._pay(order)
+        detached = Order.objects.defer('paid').get(pk=order.pk)
+        detached.paid = True
+        detached.save()
+        self.assertEqual(Sale.objects.filter(order=order).count(), 2)
+
+    def test_admin_mark_paid_action(self):
+        self.client.force_login(User.objects.create_superuser('boss', 'boss@example.com', 'pass123'))
+        orders = [self._order(3) for _ in range(3)]
+        already_paid = orders[0]
+        self._pay(already_paid)
+        response = self.client.post('/admin/orders/order/', {
+            'action': 'mark_paid',
+            '_selected_action': [order.pk for order in orders],
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Order.objects.filter(paid=True, status='processing').count(), 2)
+        self.assertEqual(Sale.objects.count(), 9)
+        self.assertEqual(SalesDailyRollup.objects.get(product=self.products[0]).sales, 3)
+
+
+class CheckoutStockTest(TransactionTestCase):
+    """place_order reserves stock with a conditional UPDATE and retries lock errors."""
+
+    def setUp(self):
+        cat = Category.objects.create(name='Tools', slug='tools')
+        self.drill = Product.objects.create(
+            category=cat, name='Drill', slug='drill', price=Decimal('10.00'), stock=5, available=True, is_online=True,
+        )
+        self.saw = Product.objects.create(
+            category=cat, name='Saw', slug='saw', price=Decimal('20.00'), stock=1, available=True, is_online=True,
+        )
+
+    def _cart(self, *lines):
+        request = mock.Mock(session=import_module(settings.SESSION_ENGINE).SessionStore(), spec=['session'])
+        cart = Cart(request)
+        for product, quantity in lines:
+            cart.add(product, quantity=quantity)
+        return cart
+
+    def _order(self):
+        return Order(first_name='John', last_name='Doe', email='john@example.com',
+                     address='123 Main St', postal_code='AB1 2CD', city='London')
+
+    def _stock(self):
+        return list(Product.objects.order_by('id').values_list('stock', flat=True))
+
+    def test_conditional_update_rolls_back_every_line(self):
+        cart = self._cart((self.drill, 2), (self.saw, 1))
+        # Another checkout takes the last saw after the stock check passed.
+        with mock.patch('orders.checkout.find_shortfall', side_effect=[None, None, None, 'Saw']):
+            Product.objects.filter(pk=self.saw.pk).update(stock=0)
+            with self.assertRaises(InsufficientStock) as raised:
+                place_order(self._order(), cart, retry_delay=0)
+        self.assertEqual(raised.exception.product_name, 'Saw')
+        self.assertEqual(self._stock(), [5, 0])
+        self.assertEqual(Order.objects.count(), 0)
+        self.assertEqual(OrderItem.objects.count(), 0)
+
+    def test_products_deleted_during_checkout_are_reported(self):
+        cart = self._cart((self.drill, 2), (self.saw, 1))
+        with mock.patch('orders.checkout.find_shortfall', return_value=None):
+            Product.objects.all().delete()
+            with self.assertRaises(ProductUnavailable) as raised:
+                place_order(self._order(), cart, retry_delay=0)
+        self.assertEqual(raised.exception.product_ids, [self.drill.pk, self.saw.pk])
+        self.assertEqual(Order.objects.count(), 0)
+
+    def test_database_locked_is_retried(self):
+        calls = []
+
+        def flaky(lines, hold_key=None):
+            calls.append(lines)
+            if len(calls) < 3:
+                raise OperationalError('database is locked')
+            return reserve_stock(lines, hold_key)
+
+        with mock.patch('orders.checkout.reserve_stock', side_effect=flaky):
+            order = place_order(self._order(), self._cart((self.drill, 2), (self.saw, 1)), retry_delay=0)
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(self._stock(), [3, 0])
+        self.assertEqual(list(Order.objects.values_list('pk', flat=True)), [order.pk])
+        self.assertEqual(order.items.count(), 2)
+
+    def test_retries_are_bounded(self):
+        locked = OperationalError('database is locked')
+        with mock.patch('orders.checkout.reserve_stock', side_effect=locked) as reserve:
+            with self.assertRaises(OperationalError):
+                place_order(self._order(), self._cart((self.drill, 1)), max_attempts=3, retry_delay=0)
+        self.assertEqual(reserve.call_count, 3)
+        self.assertEqual(self._stock(), [5, 1])
+
+    def test_failed_catalog_bump_does_not_repeat_the_order(self):
+        calls = []
+
+        def bump(**kwargs):
+            calls.append(kwargs)
+            raise OperationalError('database is locked')
+
+        with mock.patch('products.models.CatalogVersion.bump', bump):
+            with self.assertLogs('django.db.backends.base', 'ERROR'):
+                order = place_order(self._order(), self._cart((self.drill, 2)), retry_delay=0)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(list(Order.objects.values_list('pk', flat=True)), [order.pk])
+        self.assertEqual(self._stock(), [3, 1])
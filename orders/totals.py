@@ -0,0 +1,52 @@
+"""
+Order Totals
+Verification of the total_cost / item_count stored on Order. Checkout sets
+them in its transaction and the OrderItem signals keep them in step with
+later item edits; this module recomputes them from the items for every
+order in one query (correlated subqueries, no per-order scans), lists the
+orders that disagree and rewrites them with bulk_update.
+"""
+from django.db.models import Count, DecimalField, F, IntegerField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Round
+
+from .models import Order, OrderItem
+
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+
+
+def with_item_totals(queryset=None):
+    """Annotate orders with `items_total` and `items_count` computed from their items."""
+    queryset = Order.objects.all() if queryset is None else queryset
+    items = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order')
+    return queryset.annotate(
+        # Rounded to pence: SQLite sums decimals as floating point.
+        items_total=Round(Coalesce(
+            Subquery(items.annotate(total=Sum(F('price') * F('quantity'))).values('total'), output_field=MONEY),
+            Value(0, output_field=MONEY),
+        ), 2, output_field=MONEY),
+        items_count=Coalesce(
+            Subquery(items.annotate(n=Count('id')).values('n'), output_field=IntegerField()),
+            Value(0),
+        ),
+    )
+
+
+def find_mismatches(queryset=None, chunk_size=2000):
+    """
+    Orders whose stored totals differ from their items:
+    [(order_id, total_cost, items_total, item_count, items_count), ...].
+    """
+    rows = with_item_totals(queryset).filter(
+        ~Q(total_cost=F('items_total')) | ~Q(item_count=F('items_count'))
+    ).order_by('id').values_list('id', 'total_cost', 'items_total', 'item_count', 'items_count')
+    return list(rows.iterator(chunk_size=chunk_size))
+
+
+def fix_totals(mismatches, batch_size=500):
+    """Store the recomputed totals for `mismatches` with bulk_update. Returns the count."""
+    orders = [
+        Order(id=order_id, total_cost=items_total, item_count=items_count)
+        for order_id, _total_cost, items_total, _item_count, items_count in mismatches
+    ]
+    Order.objects.bulk_update(orders, ['total_cost', 'item_count'], batch_size=batch_size)
+    return len(orders)
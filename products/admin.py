@@ -1,13 +1,25 @@
 """
 Products Admin
 Admin configuration for Category, Product, Sale, ProductPriceHistory,
-and ProductReview with image previews, margin displays, inline history/reviews,
+ProductReview and the read-only inventory ledger with image previews, margin displays, inline history/reviews,
 and bulk online/warehouse actions.
 """
 from django.contrib import admin
+from django.contrib.admin import helpers
+from django.core.files.storage import default_storage
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, FloatField
+from django.db.models.functions import NullIf
+from django.template.response import TemplateResponse
 from django.utils.html import format_html
 from django.utils.safestring import mark_safe
-from .models import Category, Product, Sale, ProductPriceHistory, ProductReview
+from .forms import RepriceForm
+from .images import variant_name
+from .models import (
+    Category, DashboardStatistics, InventoryMovement, InventorySnapshot, Product, Sale, ProductPriceHistory,
+    ProductReview,
+)
+from .pricing import apply_repricing, describe_skipped, plan_repricing
+from .reports import sales_summary
 
 # Register your models here.
 
@@ -18,9 +30,14 @@ class CategoryAdmin(admin.ModelAdmin):
     prepopulated_fields = {'slug': ('name',)}
     search_fields = ['name']
     
+    def get_queryset(self, request):
+        # One grouped query instead of a COUNT per row
+        return super().get_queryset(request).annotate(num_products=Count('products'))
+    
     def product_count(self, obj):
-        return obj.products.count()
+        return obj.num_products
     product_count.short_description = 'Number of Products'
+    product_count.admin_order_field = 'num_products'
     
     def changelist_view(self, request, extra_context=None):
         """Add total product count to the context"""
@@ -91,10 +108,13 @@ class ProductAdmin(admin.ModelAdmin):
     list_editable = ['name', 'category', 'cost_price', 'price', 'stock']
     prepopulated_fields = {'slug': ('name',)}
     search_fields = ['name', 'description']
+    list_select_related = ['category', 'rating_summary']
     list_per_page = 20
     date_hierarchy = 'created'
     ordering = ['-created']
-    actions = ['make_online', 'make_warehouse']
+    actions = ['make_online', 'make_warehouse', 'reprice']
+    # Rows listed on the reprice preview page
+    reprice_preview_rows = 200
     inlines = [ProductPriceHistoryInline, ProductReviewInline]
     
     class Media:
@@ -119,9 +139,42 @@ class ProductAdmin(admin.ModelAdmin):
         }),
     )
     
+    def get_queryset(self, request):
+        """Annotate profit, margin and average rating so the columns can be sorted"""
+        return super().get_queryset(request).annotate(
+            profit_value=ExpressionWrapper(
+                F('price') - F('cost_price'),
+                output_field=DecimalField(max_digits=10, decimal_places=2),
+            ),
+            margin_value=ExpressionWrapper(
+                (F('price') - F('cost_price')) * 100.0 / NullIf(F('cost_price'), 0),
+                output_field=FloatField(),
+            ),
+            average_rating_value=ExpressionWrapper(
+                F('rating_summary__rating_sum') * 1.0 / NullIf(F('rating_summary__rating_count'), 0),
+                output_field=FloatField(),
+            ),
+        )
+    
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        formfield = super().formfield_for_foreignkey(db_field, request, **kwargs)
+        if db_field.name == 'category' and request is not None:
+            # list_editable renders one category <select> per row; load the
+            # choices once per request instead of once per row.
+            cached = getattr(request, '_category_choices', None)
+            if cached is None:
+                cached = request._category_choices = list(formfield.choices)
+            formfield.choices = cached
+        return formfield
+    
     def image_preview(self, obj):
         if obj.image:
-            return format_html('<img src="{}" style="width: 50px; height: 50px; object-fit: cover; border-radius: 5px;" />', obj.image.url)
+            # Smallest generated variant when available, else the original
+            if obj.image_widths:
+                url = default_storage.url(variant_name(obj.image.name, obj.image_widths[0]))
+            else:
+                url = obj.image.url
+            return format_html('<img src="{}" style="width: 50px; height: 50px; object-fit: cover; border-radius: 5px;" />', url)
         return mark_safe('<span style="color: #999;">No Image</span>')
     image_preview.short_description = 'Image'
     
@@ -141,7 +194,7 @@ class ProductAdmin(admin.ModelAdmin):
             color, profit_formatted
         )
     profit_display.short_description = 'Profit'
-    profit_display.admin_order_field = 'price'
+    profit_display.admin_order_field = 'profit_value'
     
     def margin_display(self, obj):
         """Display margin percentage"""
@@ -161,10 +214,10 @@ class ProductAdmin(admin.ModelAdmin):
             color, margin_formatted
         )
     margin_display.short_description = 'Margin %'
-    margin_display.admin_order_field = 'price'
+    margin_display.admin_order_field = 'margin_value'
     
     def rating_display(self, obj):
-        """Display average rating with stars"""
+        """Display average rating with stars (read from the stored summary)"""
         avg_rating = obj.get_average_rating()
         count = obj.get_rating_count()
         
@@ -188,21 +241,60 @@ class ProductAdmin(admin.ModelAdmin):
             color, stars, f'{avg_rating:.1f}', count
         )
     rating_display.short_description = 'Rating'
+    rating_display.admin_order_field = 'average_rating_value'
     
     def make_online(self, request, queryset):
         """Move selected products from warehouse to online store"""
         updated = queryset.update(is_online=True)
+        DashboardStatistics.mark_stale()
         self.message_user(request, f'{updated} product(s) successfully moved to online store.')
     make_online.short_description = '✓ Move selected products ONLINE (visible to customers)'
     
     def make_warehouse(self, request, queryset):
         """Move selected products from online store to warehouse"""
         updated = queryset.update(is_online=False)
+        DashboardStatistics.mark_stale()
         self.message_user(request, f'{updated} product(s) successfully moved to warehouse (hidden from customers).')
     make_warehouse.short_description = '📦 Move selected products to WAREHOUSE (not visible)'
     
+    def reprice(self, request, queryset):
+        """Preview, then apply, a percentage or target-margin rule to the selected products"""
+        form = RepriceForm(request.POST if 'rule' in request.POST else None)
+        changes = skipped = rule = None
+        if form.is_valid():
+            rule = form.get_rule()
+            changes, skipped = plan_repricing(queryset, rule)
+            if 'apply' in request.POST:
+                updated = apply_repricing(
+                    changes,
+                    changed_by=request.user,
+                    reason=form.cleaned_data['reason'] or f'Repriced: {rule}',
+                )
+                self.message_user(request, f'{updated} product(s) repriced ({rule}).')
+                return None
+        preview = changes[:self.reprice_preview_rows] if changes else []
+        return TemplateResponse(request, 'admin/products/product/reprice.html', {
+            **self.admin_site.each_context(request),
+            'title': 'Reprice products',
+            'opts': self.model._meta,
+            'form': form,
+            'rule': rule,
+            'changes': changes,
+            'skipped': skipped,
+            'skipped_summary': describe_skipped(skipped) if skipped else '',
+            'preview': preview,
+            'hidden_count': len(changes) - len(preview) if changes else 0,
+            'product_count': queryset.count(),
+            'select_across': request.POST.get('select_across', '0'),
+            'selected': request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+        })
+    reprice.short_description = '£ Reprice selected products (%% or target margin)'
+    
     def save_model(self, request, obj, form, change):
         """Custom save to add any additional logic"""
+        # Shown on the inventory movement a stock edit records
+        obj._stock_reference = f'admin: {request.user.get_username()}'
         super().save_model(request, obj, form, change)
 
 
@@ -210,6 +302,7 @@ class ProductAdmin(admin.ModelAdmin):
 class SaleAdmin(admin.ModelAdmin):
     list_display = ['date', 'order', 'category', 'item', 'quantity', 'sold_price_display', 'total_amount_display']
     list_filter = ['date', 'category']
+    list_select_related = ['order', 'category', 'item']
     search_fields = ['item__name', 'order__id']
     date_hierarchy = 'date'
     ordering = ['-date']
@@ -221,60 +314,27 @@ class SaleAdmin(admin.ModelAdmin):
     sold_price_display.short_description = 'Unit Price'
     sold_price_display.admin_order_field = 'sold_price'
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            total_amount=ExpressionWrapper(
+                F('sold_price') * F('quantity'),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            )
+        )
+    
     def total_amount_display(self, obj):
         """Display total amount"""
-        return f'£{obj.get_total_amount():.2f}'
+        return f'£{obj.total_amount:.2f}'
     total_amount_display.short_description = 'Total Amount'
+    total_amount_display.admin_order_field = 'total_amount'
     
     def changelist_view(self, request, extra_context=None):
-        """Add sales statistics to the changelist view"""
-        from django.db.models import Sum, Count
-        from django.utils import timezone
-        from datetime import timedelta
-        
+        """Add sales statistics (read from the daily rollups) to the changelist view"""
         extra_context = extra_context or {}
         
-        # Get current date
-        now = timezone.now()
-        today = now.date()
-        
-        # Calculate date ranges
-        week_ago = now - timedelta(days=7)
-        month_ago = now - timedelta(days=30)
-        year_ago = now - timedelta(days=365)
-        
-        # Today's sales
-        today_sales = Sale.objects.filter(date__date=today).aggregate(
-            total=Sum('sold_price'),
-            count=Count('id')
-        )
-        
-        # This week's sales
-        week_sales = Sale.objects.filter(date__gte=week_ago).aggregate(
-            total=Sum('sold_price'),
-            count=Count('id')
-        )
-        
-        # This month's sales
-        month_sales = Sale.objects.filter(date__gte=month_ago).aggregate(
-            total=Sum('sold_price'),
-            count=Count('id')
-        )
-        
-        # This year's sales
-        year_sales = Sale.objects.filter(date__gte=year_ago).aggregate(
-            total=Sum('sold_price'),
-            count=Count('id')
-        )
-        
-        extra_context['today_sales'] = today_sales['total'] or 0
-        extra_context['today_count'] = today_sales['count'] or 0
-        extra_context['week_sales'] = week_sales['total'] or 0
-        extra_context['week_count'] = week_sales['count'] or 0
-        extra_context['month_sales'] = month_sales['total'] or 0
-        extra_context['month_count'] = month_sales['count'] or 0
-        extra_context['year_sales'] = year_sales['total'] or 0
-        extra_context['year_count'] = year_sales['count'] or 0
+        for name, totals in sales_summary().items():
+            extra_context[f'{name}_sales'] = totals['revenue']
+            extra_context[f'{name}_count'] = totals['count']
         
         return super().changelist_view(request, extra_context=extra_context)
 
@@ -283,6 +343,7 @@ class SaleAdmin(admin.ModelAdmin):
 class ProductPriceHistoryAdmin(admin.ModelAdmin):
     list_display = ['product', 'cost_price', 'selling_price', 'margin_display', 'profit_display', 'changed_by', 'changed_at', 'reason']
     list_filter = ['changed_at', 'product__category']
+    list_select_related = ['product', 'changed_by']
     search_fields = ['product__name', 'reason', 'changed_by__username']
     date_hierarchy = 'changed_at'
     ordering = ['-changed_at']
@@ -325,10 +386,43 @@ class ProductPriceHistoryAdmin(admin.ModelAdmin):
     profit_display.short_description = 'Profit'
 
 
+@admin.register(InventoryMovement)
+class InventoryMovementAdmin(admin.ModelAdmin):
+    list_display = ['created', 'product', 'delta', 'reason', 'reference']
+    list_filter = ['reason', 'created']
+    list_select_related = ['product']
+    search_fields = ['product__name', 'reference']
+    date_hierarchy = 'created'
+    ordering = ['-id']
+    readonly_fields = ['product', 'delta', 'reason', 'reference', 'created']
+    
+    def has_add_permission(self, request):
+        """The ledger is append-only: rows come from stock changes, not the admin"""
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(InventorySnapshot)
+class InventorySnapshotAdmin(admin.ModelAdmin):
+    list_display = ['taken', 'product', 'stock', 'last_movement_id']
+    list_select_related = ['product']
+    search_fields = ['product__name']
+    date_hierarchy = 'taken'
+    ordering = ['-taken']
+    readonly_fields = ['product', 'stock', 'last_movement_id', 'taken']
+    
+    def has_add_permission(self, request):
+        """Snapshots are taken by the snapshot_inventory command"""
+        return False
+
+
 @admin.register(ProductReview)
 class ProductReviewAdmin(admin.ModelAdmin):
     list_display = ['product_link', 'user', 'star_display', 'title_display', 'verified_purchase', 'created']
     list_filter = ['rating', 'verified_purchase', 'created']
+    list_select_related = ['product', 'user']
     search_fields = ['product__name', 'user__username', 'title', 'comment']
     date_hierarchy = 'created'
     ordering = ['-created']
@@ -0,0 +1,284 @@
+"""
+Catalog Import/Export
+Streaming CSV / JSON Lines readers and writers for the product catalog,
+and a chunked importer that upserts products by slug with bulk_create /
+bulk_update, writes price history and inventory movements in bulk and
+keeps the search index in step. Used by the import_catalog and
+export_catalog management commands.
+"""
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+
+from .inventory import record_movements
+from .models import CatalogVersion, Category, DashboardStatistics, InventoryMovement, Product, ProductPriceHistory
+from .search import get_search_backend
+
+CATALOG_FIELDS = [
+    'slug', 'name', 'category_slug', 'category_name', 'description',
+    'cost_price', 'price', 'stock', 'available', 'is_online', 'image',
+]
+
+# Product columns an import may change on an existing row.
+UPDATE_FIELDS = [
+    'name', 'category', 'description', 'cost_price', 'price',
+    'stock', 'available', 'is_online', 'image', 'updated',
+]
+
+FORMATS = ('csv', 'jsonl')
+
+
+class CatalogRowError(ValueError):
+    """Raised for a catalog row that cannot be converted to a Product."""
+
+
+def detect_format(path, default='csv'):
+    """Guess the catalog format from a file name."""
+    if path and path.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    if path and path.endswith('.csv'):
+        return 'csv'
+    return default
+
+
+# ---------------------------------------------------------------------------
+# Export
+# ---------------------------------------------------------------------------
+
+def iter_catalog_rows(queryset=None, chunk_size=2000):
+    """Yield one dict per product, streamed from the database with iterator()."""
+    queryset = Product.objects.all() if queryset is None else queryset
+    rows = queryset.order_by('id').values(
+        'slug', 'name', 'description', 'cost_price', 'price', 'stock',
+        'available', 'is_online', 'image',
+        'category__slug', 'category__name',
+    )
+    for row in rows.iterator(chunk_size=chunk_size):
+        row['category_slug'] = row.pop('category__slug')
+        row['category_name'] = row.pop('category__name')
+        row['cost_price'] = str(row['cost_price'])
+        row['price'] = str(row['price'])
+        yield row
+
+
+def write_catalog(rows, stream, fmt):
+    """Write catalog rows to a text stream. Returns the number written."""
+    count = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=CATALOG_FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    else:
+        for row in rows:
+            stream.write(json.dumps({field: row[field] for field in CATALOG_FIELDS}, ensure_ascii=False) + '\n')
+            count += 1
+    return count
+
+
+# ---------------------------------------------------------------------------
+# Import
+# ---------------------------------------------------------------------------
+
+def read_catalog(stream, fmt):
+    """Yield (line_number, row dict) pairs from a CSV or JSON Lines stream."""
+    if fmt == 'csv':
+        for line_number, row in enumerate(csv.DictReader(stream), start=2):
+            yield line_number, row
+    else:
+        for line_number, line in enumerate(stream, start=1):
+            if line.strip():
+                try:
+                    yield line_number, json.loads(line)
+                except json.JSONDecodeError as exc:
+                    yield line_number, CatalogRowError(f'invalid JSON: {exc.msg}')
+
+
+def _decimal(value, field):
+    try:
+        number = Decimal(str(value))
+        if not number.is_finite():
+            raise InvalidOperation
+        number = number.quantize(Decimal('0.01'))
+    except (InvalidOperation, TypeError):
+        raise CatalogRowError(f'{field} must be a decimal, got {value!r}')
+    if number < 0:
+        raise CatalogRowError(f'{field} must not be negative')
+    return number
+
+
+def _text(row, field):
+    value = row.get(field)
+    if value is None:
+        return ''
+    if not isinstance(value, str):
+        raise CatalogRowError(f'{field} must be a string, got {value!r}')
+    return value.strip()
+
+
+def _bool(value, default):
+    if value in (None, ''):
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _int(value, field):
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise CatalogRowError(f'{field} must be an integer, got {value!r}')
+    if number < 0:
+        raise CatalogRowError(f'{field} must not be negative')
+    return number
+
+
+def clean_row(row):
+    """Validate and convert a raw catalog row to Product field values."""
+    if isinstance(row, CatalogRowError):
+        raise row
+    if not isinstance(row, dict):
+        raise CatalogRowError(f'expected an object, got {type(row).__name__}')
+    slug = _text(row, 'slug')
+    name = _text(row, 'name')
+    category_slug = _text(row, 'category_slug')
+    if not slug or not name or not category_slug:
+        raise CatalogRowError('slug, name and category_slug are required')
+    return {
+        'slug': slug,
+        'name': name,
+        'category_slug': category_slug,
+        'category_name': _text(row, 'category_name') or category_slug.replace('-', ' ').title(),
+        'description': row.get('description') or '',
+        'cost_price': _decimal(row.get('cost_price') or '0', 'cost_price'),
+        'price': _decimal(row.get('price'), 'price'),
+        'stock': _int(row.get('stock') or 0, 'stock'),
+        'available': _bool(row.get('available'), True),
+        'is_online': _bool(row.get('is_online'), False),
+        'image': row.get('image') or '',
+    }
+
+
+class CatalogImporter:
+    """
+    Upsert products keyed on slug in chunks, one transaction per chunk.
+
+    Each chunk costs a handful of queries regardless of its size: one
+    SELECT of existing products by slug, one bulk_create, one bulk_update
+    and one bulk_create of ProductPriceHistory.
+    """
+
+    def __init__(self, batch_size=1000, changed_by=None, progress=None):
+        self.batch_size = batch_size
+        self.changed_by = changed_by
+        self.progress = progress
+        self.categories = {}
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.errors = []
+
+    def run(self, rows):
+        """Import an iterable of (line_number, row) pairs."""
+        chunk = []
+        for line_number, row in rows:
+            try:
+                chunk.append(clean_row(row))
+            except CatalogRowError as exc:
+                self.errors.append((line_number, str(exc)))
+                continue
+            if len(chunk) >= self.batch_size:
+                self.import_chunk(chunk)
+                chunk = []
+        if chunk:
+            self.import_chunk(chunk)
+        return self
+
+    @transaction.atomic
+    def import_chunk(self, rows):
+        # Last row wins when a slug repeats inside one chunk.
+        rows = list({row['slug']: row for row in rows}.values())
+        self._resolve_categories(rows)
+
+        existing = {}
+        for product in Product.objects.filter(slug__in=[row['slug'] for row in rows]).order_by('id'):
+            existing.setdefault(product.slug, product)
+
+        now = timezone.now()
+        to_create, to_update, history, stock_deltas = [], [], [], []
+        for row in rows:
+            values = self._product_values(row)
+            product = existing.get(row['slug'])
+            if product is None:
+                product = Product(slug=row['slug'], **values)
+                to_create.append(product)
+                continue
+            changed = [field for field, value in values.items() if getattr(product, field) != value]
+            if not changed:
+                self.unchanged += 1
+                continue
+            price_changed = 'price' in changed or 'cost_price' in changed
+            if 'stock' in changed:
+                stock_deltas.append((product.pk, values['stock'] - product.stock))
+            for field in changed:
+                setattr(product, field, values[field])
+            product.updated = now
+            to_update.append(product)
+            if price_changed:
+                history.append(self._history(product, 'Price updated (catalog import)'))
+
+        Product.objects.bulk_create(to_create, batch_size=self.batch_size)
+        Product.objects.bulk_update(to_update, UPDATE_FIELDS, batch_size=self.batch_size)
+        history.extend(self._history(product, 'Initial price set') for product in to_create)
+        ProductPriceHistory.objects.bulk_create(history, batch_size=self.batch_size)
+        stock_deltas.extend((product.pk, product.stock) for product in to_create)
+        record_movements(
+            stock_deltas, InventoryMovement.REASON_IMPORT, reference='catalog import', batch_size=self.batch_size,
+        )
+        # bulk_create/bulk_update bypass the Product signals.
+        get_search_backend().index_products(to_create + to_update)
+        DashboardStatistics.mark_stale()
+        CatalogVersion.bump()
+
+        self.created += len(to_create)
+        self.updated += len(to_update)
+        if self.progress:
+            self.progress(self)
+
+    def _resolve_categories(self, rows):
+        missing = {row['category_slug']: row['category_name'] for row in rows if row['category_slug'] not in self.categories}
+        if not missing:
+            return
+        Category.objects.bulk_create(
+            [Category(slug=slug, name=name) for slug, name in missing.items()],
+            ignore_conflicts=True,
+        )
+        for category in Category.objects.filter(slug__in=missing):
+            self.categories[category.slug] = category
+
+    def _product_values(self, row):
+        return {
+            'name': row['name'],
+            'category_id': self.categories[row['category_slug']].pk,
+            'description': row['description'],
+            'cost_price': row['cost_price'],
+            'price': row['price'],
+            'stock': row['stock'],
+            'available': row['available'],
+            'is_online': row['is_online'],
+            'image': row['image'],
+        }
+
+    def _history(self, product, reason):
+        return ProductPriceHistory(
+            product=product,
+            cost_price=product.cost_price,
+            selling_price=product.price,
+            changed_by=self.changed_by,
+            reason=reason,
+        )
@@ -0,0 +1,21 @@
+"""
+Products Forms
+RepriceForm for the admin "Reprice selected products" action: a
+percentage or target-margin rule with an optional price ending.
+"""
+from django import forms
+
+from .pricing import PriceRule
+
+
+class RepriceForm(forms.Form):
+    rule = forms.ChoiceField(choices=PriceRule.KINDS)
+    value = forms.DecimalField(max_digits=6, decimal_places=2, help_text='e.g. 5 for +5%, -10 for -10%, 40 for a 40% margin')
+    ending = forms.DecimalField(
+        max_digits=3, decimal_places=2, min_value=0, max_value=0.99, required=False,
+        help_text='Optional: round prices up to this ending, e.g. 0.99',
+    )
+    reason = forms.CharField(max_length=200, required=False, help_text='Stored in the price history')
+
+    def get_rule(self):
+        return PriceRule(self.cleaned_data['rule'], self.cleaned_data['value'], self.cleaned_data['ending'])
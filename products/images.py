@@ -0,0 +1,159 @@
+"""
+Product Image Variants
+Generates fixed-width resized copies (original format + WebP) of product
+images next to the originals, e.g. products/drill.jpg ->
+products/drill-320w.jpg and products/drill-320w.webp, and builds srcset
+strings from them. Variants are regenerated only when missing or older
+than the original (mtime). Images are never upscaled: configured widths
+at or beyond the original's give one variant at its own width. The widths
+written are recorded on the product (Product.image_widths), so srcsets
+are built without touching storage.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+# Variant widths in pixels.
+DEFAULT_WIDTHS = (320, 640, 1024)
+JPEG_QUALITY = 82
+WEBP_QUALITY = 80
+
+
+def get_widths():
+    return tuple(getattr(settings, 'PRODUCT_IMAGE_WIDTHS', DEFAULT_WIDTHS))
+
+
+def variant_name(name, width, fmt=None):
+    """Storage name of a variant: 'products/a.jpg' -> 'products/a-320w.jpg' / '.webp'."""
+    stem, ext = os.path.splitext(name)
+    return f'{stem}-{width}w{"." + fmt if fmt else ext.lower()}'
+
+
+def is_variant(name):
+    """True for file names produced by variant_name()."""
+    stem = os.path.splitext(os.path.basename(name))[0]
+    head, _, tail = stem.rpartition('-')
+    return bool(head) and tail.endswith('w') and tail[:-1].isdigit()
+
+
+def variant_paths(path, widths):
+    """Filesystem paths of every variant of the original at `path`."""
+    paths = []
+    for width in widths:
+        paths.append(variant_name(path, width))
+        paths.append(variant_name(path, width, 'webp'))
+    return paths
+
+
+def is_stale(path, widths):
+    """True if any variant is missing or older than the original."""
+    try:
+        original_mtime = os.path.getmtime(path)
+    except OSError:
+        return False
+    for variant in variant_paths(path, widths):
+        try:
+            if os.path.getmtime(variant) < original_mtime:
+                return True
+        except OSError:
+            return True
+    return False
+
+
+def variant_widths(image_width, widths):
+    """Widths of the variants of an image `image_width` pixels wide, ascending."""
+    return sorted({min(width, image_width) for width in widths})
+
+
+def generate_variants(path, widths, force=False):
+    """
+    Write resized original-format and WebP variants for the image at
+    `path`. Plain paths in, so it can run in a worker process; returns
+    (files written, widths of its variants).
+    """
+    from PIL import Image
+
+    written = 0
+    with Image.open(path) as image:
+        # Image.open reads only the header; the pixels are loaded if needed.
+        widths = variant_widths(image.width, widths)
+        if not force and not is_stale(path, widths):
+            return 0, widths
+        image.load()
+        fmt = image.format or 'JPEG'
+        for width in widths:
+            height = max(1, round(image.height * width / image.width))
+            resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+            if fmt == 'JPEG' and resized.mode not in ('RGB', 'L'):
+                resized = resized.convert('RGB')
+            resized.save(variant_name(path, width), fmt, quality=JPEG_QUALITY, optimize=True)
+            resized.save(variant_name(path, width, 'webp'), 'WEBP', quality=WEBP_QUALITY, method=4)
+            written += 2
+    return written, widths
+
+
+def generate_variants_in_pool(paths, widths=None, workers=None, force=False):
+    """
+    Generate variants for many originals across a process pool.
+    Yields (path, written, variant widths, error) as each image completes.
+    """
+    widths = widths or get_widths()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {path: pool.submit(generate_variants, path, widths, force) for path in paths}
+        for path, future in futures.items():
+            try:
+                yield path, *future.result(), None
+            except Exception as exc:  # a corrupt image must not stop the batch
+                yield path, 0, [], exc
+
+
+def update_variant_manifest(name, widths):
+    """
+    Bring the media manifest entries (and hashed copies) of the variants of
+    the stored image `name` up to date, as they are written outside the
+    storage API.
+    """
+    update_manifest = getattr(default_storage, 'update_manifest', None)
+    if update_manifest is not None:
+        update_manifest(variant_paths(name, widths))
+
+
+def ensure_variants(image_field):
+    """
+    Generate variants for one uploaded image in-process if missing or
+    stale, and record their widths on its product.
+    """
+    if not image_field:
+        return 0
+    try:
+        path = image_field.path
+    except NotImplementedError:  # non-filesystem storage
+        return 0
+    product = image_field.instance
+    if product.image_widths and not is_stale(path, product.image_widths):
+        return 0
+    written, widths = generate_variants(path, get_widths())
+    if written:
+        update_variant_manifest(image_field.name, widths)
+    if widths != product.image_widths:
+        product.image_widths = widths
+        type(product).objects.filter(pk=product.pk).update(image_widths=widths)
+    return written
+
+
+def build_srcset(image_field, fmt=None, request=None):
+    """
+    srcset string ("url 320w, url 640w") for the variants recorded on the
+    image's product, or '' if none have been generated yet.
+    """
+    if not image_field:
+        return ''
+    candidates = []
+    for width in getattr(image_field.instance, 'image_widths', None) or ():
+        url = default_storage.url(variant_name(image_field.name, width, fmt))
+        if request is not None:
+            url = request.build_absolute_uri(url)
+        candidates.append(f'{url} {width}w')
+    return ', '.join(candidates)
@@ -0,0 +1,118 @@
+"""
+Inventory Ledger
+Appends InventoryMovement rows in bulk and reads stock levels back from
+the ledger. A past stock level is the product's latest InventorySnapshot
+taken before that time plus the movements recorded after the snapshot,
+a short tail scan on the (product, id) index instead of a replay of the
+whole history. Product.stock stays the fast current value;
+reconcile_stock() reports products where the two disagree.
+"""
+from django.db.models import F, IntegerField, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import InventoryMovement, InventorySnapshot, Product
+
+# Keeps IN (...) lists under SQLite's bound-parameter limit.
+CHUNK_SIZE = 500
+
+
+def record_movements(deltas, reason, reference='', batch_size=500):
+    """
+    Append one movement per (product_id, delta) pair, or per item of a
+    {product_id: delta} dict, with a single bulk_create. Zero deltas are
+    skipped. Returns the movements written.
+    """
+    if isinstance(deltas, dict):
+        deltas = deltas.items()
+    now = timezone.now()
+    movements = [
+        InventoryMovement(product_id=product_id, delta=delta, reason=reason, reference=reference, created=now)
+        for product_id, delta in deltas if delta
+    ]
+    InventoryMovement.objects.bulk_create(movements, batch_size=batch_size)
+    return movements
+
+
+def _sum_of(queryset):
+    total = queryset.order_by().values('product').annotate(units=Sum('delta')).values('units')
+    return Coalesce(Subquery(total, output_field=IntegerField()), Value(0))
+
+
+def with_ledger_stock(queryset=None, when=None):
+    """
+    Annotate products with `ledger_stock`, their stock as of `when` (default
+    now) according to the ledger, in one query.
+    """
+    queryset = Product.objects.all() if queryset is None else queryset
+    snapshots = InventorySnapshot.objects.filter(product=OuterRef('pk')).order_by('-last_movement_id')
+    movements = InventoryMovement.objects.filter(product=OuterRef('pk'))
+    if when is not None:
+        snapshots = snapshots.filter(taken__lte=when)
+        movements = movements.filter(created__lte=when)
+    queryset = queryset.annotate(
+        snapshot_stock=Coalesce(Subquery(snapshots.values('stock')[:1]), Value(0)),
+        snapshot_movement_id=Coalesce(Subquery(snapshots.values('last_movement_id')[:1]), Value(0)),
+    )
+    return queryset.annotate(
+        ledger_stock=F('snapshot_stock') + _sum_of(movements.filter(id__gt=OuterRef('snapshot_movement_id')))
+    )
+
+
+def stock_at(when, product_ids=None):
+    """{product_id: stock} as of `when`, from snapshots plus the ledger tail."""
+    queryset = Product.objects.all() if product_ids is None else Product.objects.filter(id__in=list(product_ids))
+    return dict(with_ledger_stock(queryset, when).values_list('id', 'ledger_stock'))
+
+
+def take_snapshots(batch_size=500):
+    """
+    Snapshot every product whose stock moved since the last run: its
+    previous snapshot plus the movements since, summed per product in one
+    grouped query. Returns the number of snapshots written.
+    """
+    high = InventoryMovement.objects.aggregate(high=Max('id'))['high']
+    since = InventorySnapshot.objects.aggregate(since=Max('last_movement_id'))['since'] or 0
+    if high is None or high <= since:
+        return 0
+    moved = dict(
+        InventoryMovement.objects.filter(id__gt=since, id__lte=high)
+        .order_by().values('product').annotate(units=Sum('delta')).values_list('product', 'units')
+    )
+
+    product_ids = list(moved)
+    now = timezone.now()
+    snapshots = []
+    for start in range(0, len(product_ids), CHUNK_SIZE):
+        chunk = product_ids[start:start + CHUNK_SIZE]
+        previous = InventorySnapshot.objects.filter(product=OuterRef('pk')).order_by('-last_movement_id')
+        rows = Product.objects.filter(id__in=chunk).annotate(
+            previous_stock=Coalesce(Subquery(previous.values('stock')[:1]), Value(0)),
+        ).values_list('id', 'previous_stock')
+        snapshots.extend(
+            InventorySnapshot(product_id=product_id, stock=stock + moved[product_id], last_movement_id=high, taken=now)
+            for product_id, stock in rows
+        )
+    InventorySnapshot.objects.bulk_create(snapshots, batch_size=batch_size)
+    return len(snapshots)
+
+
+def reconcile_stock(product_ids=None):
+    """
+    Products whose ledger total differs from Product.stock:
+    [(product_id, name, ledger_stock, stock), ...].
+    """
+    queryset = Product.objects.all() if product_ids is None else Product.objects.filter(id__in=list(product_ids))
+    return list(
+        with_ledger_stock(queryset).exclude(ledger_stock=F('stock'))
+        .order_by('id').values_list('id', 'name', 'ledger_stock', 'stock')
+    )
+
+
+def correct_drift(mismatches):
+    """Record correction movements that bring the ledger back to Product.stock."""
+    return record_movements(
+        [(product_id, stock - ledger_stock) for product_id, _name, ledger_stock, stock in mismatches],
+        InventoryMovement.REASON_CORRECTION,
+        reference='reconcile',
+    )
@@ -0,0 +1,19 @@
+"""
+Management Command: expire_carts
+Deletes cart lines untouched for CART_TTL seconds (default 30 days) from
+the cart store, in batches found through the `touched` index rather than
+a scan of every session. Schedule it daily.
+"""
+from django.core.management.base import BaseCommand
+from cart.stores import expire_carts
+
+
+class Command(BaseCommand):
+    help = 'Delete abandoned cart lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Lines deleted per DELETE (default: 1000)')
+
+    def handle(self, *args, **options):
+        deleted = expire_carts(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Successfully expired {deleted} cart line(s)'))
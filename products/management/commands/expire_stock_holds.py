@@ -0,0 +1,19 @@
+"""
+Management Command: expire_stock_holds
+Deletes cart stock holds whose time limit has passed, in batches. Expired
+holds already stop counting against available stock; sweeping them keeps
+the holds table small. Schedule it every few minutes.
+"""
+from django.core.management.base import BaseCommand
+from cart.holds import expire_holds
+
+
+class Command(BaseCommand):
+    help = 'Delete expired cart stock holds'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Holds deleted per DELETE (default: 1000)')
+
+    def handle(self, *args, **options):
+        deleted = expire_holds(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Successfully expired {deleted} stock hold(s)'))
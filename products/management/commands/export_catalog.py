@@ -0,0 +1,33 @@
+"""
+Management Command: export_catalog
+Streams the product catalog to CSV or JSON Lines, reading products in
+chunks with iterator() so memory stays flat for large catalogs.
+"""
+from django.core.management.base import BaseCommand
+from products.catalog import FORMATS, detect_format, iter_catalog_rows, write_catalog
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Export the product catalog to CSV or JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', nargs='?', default='-', help='Output file (default: stdout)')
+        parser.add_argument('--format', choices=FORMATS, help='Output format (default: from file extension, else csv)')
+        parser.add_argument('--online-only', action='store_true', help='Only export products visible online')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched per database round trip')
+
+    def handle(self, *args, **options):
+        output = options['output']
+        fmt = options['format'] or detect_format(output)
+        queryset = Product.objects.all()
+        if options['online_only']:
+            queryset = queryset.filter(is_online=True)
+        rows = iter_catalog_rows(queryset, chunk_size=options['chunk_size'])
+
+        if output == '-':
+            count = write_catalog(rows, self.stdout, fmt)
+        else:
+            with open(output, 'w', encoding='utf-8', newline='') as stream:
+                count = write_catalog(rows, stream, fmt)
+        self.stderr.write(self.style.SUCCESS(f'Exported {count} product(s) to {output} ({fmt})'))
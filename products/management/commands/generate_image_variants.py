@@ -0,0 +1,50 @@
+"""
+Management Command: generate_image_variants
+Generates resized JPEG/PNG and WebP variants of every product image
+across a process pool. Only missing or stale variants (older than the
+original) are regenerated unless --force is given. The widths of each
+image's variants are recorded on its products for their srcsets.
+"""
+import os
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from products.images import generate_variants_in_pool, get_widths, update_variant_manifest
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Generate thumbnail and WebP variants for product images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+        parser.add_argument('--force', action='store_true', help='Regenerate variants even if they are up to date')
+
+    def handle(self, *args, **options):
+        recorded = {}
+        for name, widths in Product.objects.exclude(image='').values_list('image', 'image_widths'):
+            recorded.setdefault(name, []).append(widths)
+        names = {default_storage.path(name): name for name in recorded}
+        paths = [path for path in names if os.path.exists(path)]
+        widths = get_widths()
+        self.stdout.write(f'Checking {len(paths)} image(s) for widths {", ".join(map(str, widths))}...')
+
+        generated = failed = 0
+        for path, written, variant_widths, error in generate_variants_in_pool(
+            paths, widths, options['workers'], options['force'],
+        ):
+            if error:
+                failed += 1
+                self.stderr.write(f'  ✗ {os.path.basename(path)}: {error}')
+                continue
+            if written:
+                generated += 1
+                self.stdout.write(f'  ✓ {os.path.basename(path)} ({written} files)')
+                update_variant_manifest(names[path], variant_widths)
+            if any(stored != variant_widths for stored in recorded[names[path]]):
+                Product.objects.filter(image=names[path]).update(image_widths=variant_widths)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'\nGenerated variants for {generated} image(s), '
+            f'{len(paths) - generated - failed} already up to date, {failed} failed'
+        ))
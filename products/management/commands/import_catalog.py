@@ -0,0 +1,53 @@
+"""
+Management Command: import_catalog
+Imports a CSV or JSON Lines product catalog, upserting products by slug
+in batched transactions with bulk_create/bulk_update and bulk-written
+price history. Missing categories are created on the fly.
+"""
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from products.catalog import FORMATS, CatalogImporter, detect_format, read_catalog
+
+
+class Command(BaseCommand):
+    help = 'Import (create or update by slug) products from CSV or JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help="Catalog file, or '-' for stdin")
+        parser.add_argument('--format', choices=FORMATS, help='Input format (default: from file extension, else csv)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per transaction (default: 1000)')
+
+    def handle(self, *args, **options):
+        path = options['input']
+        fmt = options['format'] or detect_format(path)
+        started = time.monotonic()
+
+        def progress(importer):
+            done = importer.created + importer.updated + importer.unchanged
+            rate = done / max(time.monotonic() - started, 1e-6)
+            self.stdout.write(
+                f'  {done} rows  (created {importer.created}, updated {importer.updated})  {rate:,.0f} rows/s'
+            )
+
+        importer = CatalogImporter(batch_size=options['batch_size'], progress=progress)
+        self.stdout.write(f'Importing {fmt} catalog from {path}...')
+        if path == '-':
+            importer.run(read_catalog(sys.stdin, fmt))
+        else:
+            try:
+                with open(path, encoding='utf-8', newline='') as stream:
+                    importer.run(read_catalog(stream, fmt))
+            except FileNotFoundError:
+                raise CommandError(f'File not found: {path}')
+
+        for line_number, error in importer.errors[:20]:
+            self.stderr.write(f'  line {line_number}: {error}')
+        if len(importer.errors) > 20:
+            self.stderr.write(f'  ... and {len(importer.errors) - 20} more invalid row(s)')
+        self.stdout.write(self.style.SUCCESS(
+            f'\nProcessed {importer.created + importer.updated + importer.unchanged} product(s): '
+            f'{importer.created} created, {importer.updated} updated, {importer.unchanged} unchanged, '
+            f'{len(importer.errors)} skipped in {time.monotonic() - started:.1f}s'
+        ))
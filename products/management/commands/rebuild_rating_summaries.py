@@ -0,0 +1,26 @@
+"""
+Management Command: rebuild_rating_summaries
+Recomputes the stored ProductRatingSummary rows (sum, count and star
+histogram) from ProductReview in bulk. Use after raw SQL edits or imports
+that bypass the ProductReview signals.
+"""
+from django.core.management.base import BaseCommand
+from products.models import ProductRatingSummary
+
+
+class Command(BaseCommand):
+    help = 'Rebuild stored product rating aggregates from reviews'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--product', type=int, action='append', dest='product_ids',
+            help='Only rebuild the given product id (may be repeated)',
+        )
+
+    def handle(self, *args, **options):
+        product_ids = options['product_ids']
+        self.stdout.write('Rebuilding product rating summaries...')
+        count = ProductRatingSummary.rebuild(product_ids=product_ids)
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully rebuilt {count} rating summar{"y" if count == 1 else "ies"}')
+        )
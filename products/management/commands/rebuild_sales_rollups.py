@@ -0,0 +1,28 @@
+"""
+Management Command: rebuild_sales_rollups
+Backfills the SalesDailyRollup table from Sale with one grouped query.
+Run once after deploying the rollups, and after imports or raw SQL that
+bypass the Sale signals (--since limits the rebuild to recent days).
+"""
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from products.reports import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild daily sales rollups from the Sale table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', default=None, metavar='YYYY-MM-DD', help='Only rebuild days from this date on')
+
+    def handle(self, *args, **options):
+        start = None
+        if options['since']:
+            try:
+                start = date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError(f'Invalid date: {options["since"]}')
+        self.stdout.write(f'Rebuilding sales rollups{f" since {start}" if start else ""}...')
+        count = rebuild_rollups(start=start)
+        self.stdout.write(self.style.SUCCESS(f'Successfully rebuilt {count} daily rollup row(s)'))
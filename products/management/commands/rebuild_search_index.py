@@ -0,0 +1,17 @@
+"""
+Management Command: rebuild_search_index
+Rebuilds the product full-text search index from the Product table.
+Use after bulk updates that bypass the Product save/delete signals.
+"""
+from django.core.management.base import BaseCommand
+from products.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product full-text search index'
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        self.stdout.write(f'Rebuilding search index with {type(backend).__name__}...')
+        count = backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Successfully indexed {count} product(s)'))
@@ -0,0 +1,24 @@
+"""
+Management Command: refresh_dashboard_stats
+Recomputes the materialized admin dashboard statistics. Signals keep the
+snapshot current for normal saves; schedule this (e.g. every few minutes)
+to pick up bulk writes and to keep dashboard visits from doing the work.
+"""
+from django.core.management.base import BaseCommand
+from products.models import DashboardStatistics
+
+
+class Command(BaseCommand):
+    help = 'Refresh the admin dashboard statistics snapshot'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--if-stale', action='store_true', help='Only refresh when the snapshot is stale or older than DASHBOARD_STATS_MAX_AGE')
+
+    def handle(self, *args, **options):
+        if options['if_stale']:
+            stats = DashboardStatistics.get_current()
+        else:
+            stats = DashboardStatistics.refresh()
+        self.stdout.write(f'  ✓ {stats.total_products} products, {stats.total_orders} orders, {stats.total_users} users')
+        self.stdout.write(f'  ✓ Revenue £{stats.total_revenue:.2f} from {stats.total_items_sold} item(s) sold')
+        self.stdout.write(self.style.SUCCESS(f'\nSuccessfully refreshed dashboard statistics ({stats.refreshed:%Y-%m-%d %H:%M:%S})'))
@@ -0,0 +1,72 @@
+"""
+Management Command: reprice_products
+Applies a repricing rule to whole categories (or the full catalog):
+a percentage adjustment (--percent 5) or a target margin over cost price
+(--margin 40). New prices are written with bulk_update in batches and the
+price history with one bulk_create. --dry-run prints the diff only.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from products.models import Category, Product
+from products.pricing import PriceRule, apply_repricing, describe_skipped, plan_repricing
+
+
+class Command(BaseCommand):
+    help = 'Reprice products by category with a percentage or target-margin rule'
+
+    def add_arguments(self, parser):
+        scope = parser.add_mutually_exclusive_group(required=True)
+        scope.add_argument('--category', action='append', dest='categories', metavar='SLUG', help='Category slug (may be repeated)')
+        scope.add_argument('--all', action='store_true', help='Reprice every product')
+        rule = parser.add_mutually_exclusive_group(required=True)
+        rule.add_argument('--percent', type=str, help='Adjust prices by this percentage, e.g. 5 or -10')
+        rule.add_argument('--margin', type=str, help='Set prices to this margin %% over cost price, e.g. 40')
+        parser.add_argument('--ending', type=str, default=None, help='Round prices up to this ending, e.g. 0.99')
+        parser.add_argument('--reason', default=None, help='Reason stored in the price history')
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows per bulk UPDATE (default: 500)')
+        parser.add_argument('--dry-run', action='store_true', help='Show the price changes without saving them')
+        parser.add_argument('--limit', type=int, default=50, help='Diff rows to print (default: 50, 0 for all)')
+
+    def handle(self, *args, **options):
+        try:
+            if options['percent'] is not None:
+                rule = PriceRule('percent', options['percent'], options['ending'])
+            else:
+                rule = PriceRule('margin', options['margin'], options['ending'])
+        except (ValueError, ArithmeticError) as exc:
+            raise CommandError(f'Invalid rule: {exc}')
+
+        products = Product.objects.all()
+        if options['categories']:
+            categories = list(Category.objects.filter(slug__in=options['categories']))
+            unknown = set(options['categories']) - {category.slug for category in categories}
+            if unknown:
+                raise CommandError(f'Unknown category: {", ".join(sorted(unknown))}')
+            products = products.filter(category__in=categories)
+
+        changes, skipped = plan_repricing(products, rule)
+        self.stdout.write(f'Rule: {rule}')
+        self.print_diff(changes, options['limit'])
+        if skipped:
+            self.stdout.write(self.style.WARNING(f'Skipped {describe_skipped(skipped)}'))
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'\nDry run: {len(changes)} product(s) would be repriced'))
+            return
+        updated = apply_repricing(
+            changes,
+            reason=options['reason'] or f'Repriced: {rule}',
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'\nSuccessfully repriced {updated} product(s)'))
+
+    def print_diff(self, changes, limit):
+        shown = changes if not limit else changes[:limit]
+        for change in shown:
+            margin = f'{change.old_margin}% → {change.new_margin}%' if change.cost_price > 0 else 'n/a'
+            percent = f'{change.change_percentage:+}%' if change.change_percentage is not None else 'new'
+            self.stdout.write(
+                f'  {change.name[:40]:<40} £{change.old_price:>9} → £{change.new_price:>9} '
+                f'({percent})  margin {margin}'
+            )
+        if len(changes) > len(shown):
+            self.stdout.write(f'  ... and {len(changes) - len(shown)} more')
@@ -0,0 +1,35 @@
+"""
+Management Command: snapshot_inventory
+Takes InventorySnapshot rows for every product whose stock moved since the
+last run, so past stock levels are read from a snapshot plus a short tail
+of the ledger. --reconcile compares the ledger with Product.stock and
+--fix records correction movements for any drift (e.g. after raw SQL or
+queryset.update() writes that bypass the ledger). Schedule it nightly.
+"""
+from django.core.management.base import BaseCommand
+from products.inventory import correct_drift, reconcile_stock, take_snapshots
+
+
+class Command(BaseCommand):
+    help = 'Snapshot product stock levels from the inventory ledger'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reconcile', action='store_true', help='Report products whose ledger disagrees with their stock')
+        parser.add_argument('--fix', action='store_true', help='With --reconcile, record correction movements for the drift')
+        parser.add_argument('--batch-size', type=int, default=500, help='Snapshots per bulk INSERT (default: 500)')
+
+    def handle(self, *args, **options):
+        if options['reconcile']:
+            mismatches = reconcile_stock()
+            for product_id, name, ledger_stock, stock in mismatches:
+                self.stdout.write(f'  {product_id:>6} {name[:40]:<40} ledger {ledger_stock:>6}  stock {stock:>6}')
+            if not mismatches:
+                self.stdout.write('✓ Ledger matches product stock')
+            elif options['fix']:
+                correct_drift(mismatches)
+                self.stdout.write(f'✓ Recorded {len(mismatches)} correction movement(s)')
+            else:
+                self.stdout.write(self.style.WARNING(f'{len(mismatches)} product(s) out of step; rerun with --fix to correct'))
+
+        count = take_snapshots(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Successfully took {count} inventory snapshot(s)'))
@@ -0,0 +1,23 @@
+"""
+Management Command: update_media_manifest
+Brings the media content-hash manifest (MEDIA_ROOT/manifest.json) up to
+date. Only files whose size or mtime changed are re-hashed, and entries
+for deleted files are dropped. Run after copying images into media/
+outside the admin, e.g. on deploy.
+"""
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Update the content-hash manifest for uploaded media files'
+
+    def handle(self, *args, **options):
+        if not hasattr(default_storage, 'update_manifest'):
+            raise CommandError(f'{type(default_storage).__name__} does not keep a media manifest')
+        self.stdout.write(f'Scanning {default_storage.location}...')
+        changed = default_storage.update_manifest()
+        total = len(default_storage.load_manifest())
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully updated media manifest: {changed} entr{"y" if changed == 1 else "ies"} changed, {total} file(s) tracked'
+        ))
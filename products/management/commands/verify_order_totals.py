@@ -0,0 +1,37 @@
+"""
+Management Command: verify_order_totals
+Recomputes every order's total cost and line count from its items in one
+query and compares them with the values stored on Order. --fix writes the
+recomputed values back with bulk_update (e.g. after raw SQL, loaddata or
+queryset.update() writes to order items, which bypass the signals).
+"""
+from django.core.management.base import BaseCommand
+from orders.totals import find_mismatches, fix_totals
+
+
+class Command(BaseCommand):
+    help = 'Check the stored order totals and item counts against the order items'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Store the recomputed totals for mismatched orders')
+        parser.add_argument('--batch-size', type=int, default=500, help='Orders per bulk UPDATE (default: 500)')
+        parser.add_argument('--limit', type=int, default=50, help='Mismatches to print (default: 50, 0 for all)')
+
+    def handle(self, *args, **options):
+        mismatches = find_mismatches()
+        shown = mismatches if not options['limit'] else mismatches[:options['limit']]
+        for order_id, total_cost, items_total, item_count, items_count in shown:
+            self.stdout.write(
+                f'  Order {order_id}: stored £{total_cost:.2f} / {item_count} line(s), '
+                f'items £{items_total:.2f} / {items_count} line(s)'
+            )
+        if len(mismatches) > len(shown):
+            self.stdout.write(f'  ... and {len(mismatches) - len(shown)} more')
+
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS('Successfully verified order totals: all match'))
+        elif options['fix']:
+            fixed = fix_totals(mismatches, batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Successfully fixed {fixed} order total(s)'))
+        else:
+            self.stdout.write(self.style.WARNING(f'{len(mismatches)} order(s) out of step; rerun with --fix to correct'))
@@ -0,0 +1,48 @@
+# Generated by Django 6.0.7 on 2026-10-17 18:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def build_rating_summaries(apps, schema_editor):
+    """Backfill summaries for reviews that existed before this migration."""
+    ProductReview = apps.get_model('products', 'ProductReview')
+    ProductRatingSummary = apps.get_model('products', 'ProductRatingSummary')
+    rows = ProductReview.objects.order_by().values('product_id', 'rating').annotate(n=Count('id'))
+    summaries = {}
+    for row in rows:
+        summary = summaries.setdefault(row['product_id'], ProductRatingSummary(product_id=row['product_id']))
+        summary.rating_sum += row['rating'] * row['n']
+        summary.rating_count += row['n']
+        star = f"stars_{row['rating']}"
+        setattr(summary, star, getattr(summary, star) + row['n'])
+    ProductRatingSummary.objects.bulk_create(summaries.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_alter_product_image'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductRatingSummary',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating_summary', serialize=False, to='products.product')),
+                ('rating_sum', models.PositiveIntegerField(default=0)),
+                ('rating_count', models.PositiveIntegerField(default=0)),
+                ('stars_1', models.PositiveIntegerField(default=0)),
+                ('stars_2', models.PositiveIntegerField(default=0)),
+                ('stars_3', models.PositiveIntegerField(default=0)),
+                ('stars_4', models.PositiveIntegerField(default=0)),
+                ('stars_5', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Product Rating Summary',
+                'verbose_name_plural': 'Product Rating Summaries',
+            },
+        ),
+        migrations.RunPython(build_rating_summaries, migrations.RunPython.noop),
+    ]
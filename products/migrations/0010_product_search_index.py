@@ -0,0 +1,34 @@
+# Generated by Django 6.0.7 on 2026-10-17 18:40
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    """Create and populate the FTS5 product index (SQLite only)."""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS products_product_fts USING fts5("
+        "name, description, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    schema_editor.execute(
+        'INSERT INTO products_product_fts (rowid, name, description) '
+        'SELECT id, name, description FROM products_product'
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS products_product_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_productratingsummary'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 6.0.7 on 2026-10-17 18:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_product_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CoPurchaseRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_sale_id', models.PositiveIntegerField(default=0)),
+                ('orders', models.PositiveIntegerField(default=0, help_text='Paid orders folded in by this run')),
+                ('pairs', models.PositiveIntegerField(default=0, help_text='Product pairs whose count changed')),
+                ('full', models.BooleanField(default=False, help_text='Rebuilt from all paid orders')),
+                ('finished', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Co-Purchase Run',
+                'verbose_name_plural': 'Co-Purchase Runs',
+                'ordering': ('-id',),
+                'get_latest_by': 'id',
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductCoPurchase',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('product_a', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.product')),
+                ('product_b', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.product')),
+            ],
+            options={
+                'verbose_name': 'Product Co-Purchase',
+                'verbose_name_plural': 'Product Co-Purchases',
+                'indexes': [models.Index(fields=['product_b'], name='products_pr_product_317b8b_idx')],
+                'unique_together': {('product_a', 'product_b')},
+            },
+        ),
+        migrations.CreateModel(
+            name='RelatedProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.PositiveIntegerField(help_text='Paid orders containing both products')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_entries', to='products.product')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_from', to='products.product')),
+            ],
+            options={
+                'verbose_name': 'Related Product',
+                'verbose_name_plural': 'Related Products',
+                'ordering': ('product', 'rank'),
+                'unique_together': {('product', 'rank')},
+            },
+        ),
+    ]
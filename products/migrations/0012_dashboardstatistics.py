@@ -0,0 +1,39 @@
+# Generated by Django 6.0.7 on 2026-10-17 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_copurchase'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardStatistics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_products', models.PositiveIntegerField(default=0)),
+                ('products_online', models.PositiveIntegerField(default=0)),
+                ('products_warehouse', models.PositiveIntegerField(default=0)),
+                ('available_products', models.PositiveIntegerField(default=0)),
+                ('out_of_stock', models.PositiveIntegerField(default=0)),
+                ('low_stock', models.PositiveIntegerField(default=0)),
+                ('total_categories', models.PositiveIntegerField(default=0)),
+                ('total_users', models.PositiveIntegerField(default=0)),
+                ('registered_customers', models.PositiveIntegerField(default=0)),
+                ('total_orders', models.PositiveIntegerField(default=0)),
+                ('paid_orders', models.PositiveIntegerField(default=0)),
+                ('pending_orders', models.PositiveIntegerField(default=0)),
+                ('total_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_items_sold', models.PositiveIntegerField(default=0)),
+                ('stale', models.BooleanField(default=True)),
+                ('refreshed', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Dashboard Statistics',
+                'verbose_name_plural': 'Dashboard Statistics',
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 6.0.7 on 2026-10-17 19:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0012_dashboardstatistics'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='sale',
+            name='date',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.CreateModel(
+            name='SalesDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('cost', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('sales', models.PositiveIntegerField(default=0, help_text='Number of Sale rows rolled up')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_rollups', to='products.category')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_rollups', to='products.product')),
+            ],
+            options={
+                'verbose_name': 'Sales Daily Rollup',
+                'verbose_name_plural': 'Sales Daily Rollups',
+                'ordering': ('-date',),
+                'unique_together': {('date', 'category', 'product')},
+            },
+        ),
+    ]
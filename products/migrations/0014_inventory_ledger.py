@@ -0,0 +1,63 @@
+# Generated by Django 6.0.7 on 2026-10-17 19:55
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def record_opening_balances(apps, schema_editor):
+    """Start the ledger with each existing product's current stock."""
+    Product = apps.get_model('products', 'Product')
+    InventoryMovement = apps.get_model('products', 'InventoryMovement')
+    InventoryMovement.objects.bulk_create(
+        (
+            InventoryMovement(product_id=product_id, delta=stock, reason='opening')
+            for product_id, stock in Product.objects.filter(stock__gt=0).values_list('id', 'stock').iterator()
+        ),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0013_salesdailyrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('delta', models.IntegerField(help_text='Units added (positive) or removed (negative)')),
+                ('reason', models.CharField(choices=[('opening', 'Opening balance'), ('initial', 'Initial stock'), ('sale', 'Sale'), ('adjustment', 'Manual adjustment'), ('import', 'Catalog import'), ('correction', 'Reconciliation correction')], max_length=20)),
+                ('reference', models.CharField(blank=True, help_text='What caused the movement, e.g. "order 42"', max_length=100)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inventory_movements', to='products.product')),
+            ],
+            options={
+                'verbose_name': 'Inventory Movement',
+                'verbose_name_plural': 'Inventory Movements',
+                'ordering': ('-id',),
+                'indexes': [models.Index(fields=['product', 'id'], name='products_in_product_5ca663_idx'), models.Index(fields=['created'], name='products_in_created_9957e1_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='InventorySnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stock', models.IntegerField()),
+                ('last_movement_id', models.PositiveBigIntegerField(help_text='Highest ledger row included in this snapshot')),
+                ('taken', models.DateTimeField(default=django.utils.timezone.now)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inventory_snapshots', to='products.product')),
+            ],
+            options={
+                'verbose_name': 'Inventory Snapshot',
+                'verbose_name_plural': 'Inventory Snapshots',
+                'ordering': ('-taken',),
+                'get_latest_by': 'taken',
+                'indexes': [models.Index(fields=['product', 'last_movement_id'], name='products_in_product_bf7943_idx'), models.Index(fields=['last_movement_id'], name='products_in_last_mo_c63b36_idx')],
+            },
+        ),
+        migrations.RunPython(record_opening_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0.7 on 2026-10-17 20:30
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def create_catalog_version(apps, schema_editor):
+    """Create the single CatalogVersion row, so bumps are a plain UPDATE."""
+    CatalogVersion = apps.get_model('products', 'CatalogVersion')
+    CatalogVersion.objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0014_inventory_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=1)),
+                ('changed', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Catalog Version',
+                'verbose_name_plural': 'Catalog Version',
+            },
+        ),
+        migrations.RunPython(create_catalog_version, migrations.RunPython.noop),
+    ]
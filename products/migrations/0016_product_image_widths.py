@@ -0,0 +1,18 @@
+# Generated by Django 6.0.7 on 2026-10-17 20:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0015_catalogversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='image_widths',
+            field=models.JSONField(blank=True, default=list, editable=False, help_text='Widths of the generated image variants'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.7 on 2026-10-17 20:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0016_product_image_widths'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='catalogversion',
+            name='due',
+            field=models.DateTimeField(blank=True, help_text='When a postponed change joins the version', null=True),
+        ),
+    ]
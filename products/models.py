@@ -1,9 +1,19 @@
 """
 Products Models
-Category, Product, ProductReview, Sale, and ProductPriceHistory models
-for the product catalog, ratings, sales tracking, and price audit trail.
+Category, Product, ProductReview, ProductRatingSummary, Sale,
+SalesDailyRollup, ProductPriceHistory, the co-purchase (ProductCoPurchase,
+RelatedProduct, CoPurchaseRun), DashboardStatistics, inventory ledger
+(InventoryMovement, InventorySnapshot) and CatalogVersion models for the
+product catalog, ratings, sales tracking and reporting, price audit
+trail, "frequently bought together" recommendations, the admin dashboard
+snapshot, the stock movement history and catalog change tracking.
 """
-from django.db import models
+from datetime import timedelta
+
+from django.apps import apps
+from django.db import models, transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
 from django.urls import reverse
 from django.conf import settings
 
@@ -30,6 +40,7 @@ class Product(models.Model):
     name = models.CharField(max_length=200, db_index=True)
     slug = models.SlugField(max_length=200, db_index=True)
     image = models.ImageField(upload_to='products/', blank=True)
+    image_widths = models.JSONField(default=list, blank=True, editable=False, help_text='Widths of the generated image variants')
     description = models.TextField(blank=True)
     cost_price = models.DecimalField(max_digits=10, decimal_places=2, default=0.00, help_text='Cost price paid for this item')
     price = models.DecimalField(max_digits=10, decimal_places=2, help_text='Selling price to customers')
@@ -48,6 +59,19 @@ class Product(models.Model):
     def __str__(self):
         return self.name
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored prices so the price-history signal can detect
+        # a change without re-reading the row on save.
+        loaded = dict(zip(field_names, values))
+        if 'price' in loaded and 'cost_price' in loaded:
+            instance._loaded_prices = (loaded['price'], loaded['cost_price'])
+        # Likewise the stored stock, for the inventory ledger signal.
+        if 'stock' in loaded:
+            instance._loaded_stock = loaded['stock']
+        return instance
+    
     def get_absolute_url(self):
         return reverse('products:product_detail', args=[self.id, self.slug])
     
@@ -62,24 +86,35 @@ class Product(models.Model):
         """Calculate profit amount"""
         return self.price - self.cost_price
     
+    def get_rating_summary(self):
+        """
+        Return the stored ProductRatingSummary, or None if the product has
+        never been reviewed. Use select_related('rating_summary') on lists.
+        """
+        return getattr(self, 'rating_summary', None)
+    
     def get_average_rating(self):
-        """Calculate average rating from all reviews"""
-        reviews = self.reviews.all()
-        if reviews.exists():
-            total = sum(review.rating for review in reviews)
-            return round(total / reviews.count(), 1)
-        return 0.0
+        """Average rating read from the stored review aggregates"""
+        summary = self.get_rating_summary()
+        return summary.get_average() if summary else 0.0
     
     def get_rating_count(self):
         """Get total number of ratings"""
-        return self.reviews.count()
+        summary = self.get_rating_summary()
+        return summary.rating_count if summary else 0
     
     def get_rating_distribution(self):
         """Get distribution of ratings (5 stars to 1 star)"""
-        distribution = {5: 0, 4: 0, 3: 0, 2: 0, 1: 0}
-        for review in self.reviews.all():
-            distribution[review.rating] += 1
-        return distribution
+        summary = self.get_rating_summary()
+        if summary:
+            return summary.get_distribution()
+        return {5: 0, 4: 0, 3: 0, 2: 0, 1: 0}
+    
+    def get_related_products(self, limit=4):
+        """Online products most often bought together with this one"""
+        return Product.objects.filter(
+            related_from__product_id=self.id, available=True, is_online=True,
+        ).select_related('category').order_by('related_from__rank')[:limit]
 
 
 class ProductReview(models.Model):
@@ -112,14 +147,106 @@ class ProductReview(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.product.name} ({self.rating} stars)"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what the rating summary currently counts for this review,
+        # so edits can be applied as a delta without re-reading the row.
+        loaded = dict(zip(field_names, values))
+        if 'product_id' in loaded and 'rating' in loaded:
+            instance._loaded_rating = (loaded['product_id'], loaded['rating'])
+        return instance
+    
+    def save(self, *args, **kwargs):
+        # The post_save signal updates ProductRatingSummary; keep both writes
+        # in the same transaction.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+    
     def get_star_display(self):
         """Return star rating as visual representation"""
         return '★' * self.rating + '☆' * (5 - self.rating)
 
 
+class ProductRatingSummary(models.Model):
+    """
+    Denormalized review aggregates for a product (sum, count and 1-5 star
+    histogram). Maintained incrementally by the ProductReview signals and
+    rebuilt in bulk by the rebuild_rating_summaries management command.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='rating_summary')
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    stars_1 = models.PositiveIntegerField(default=0)
+    stars_2 = models.PositiveIntegerField(default=0)
+    stars_3 = models.PositiveIntegerField(default=0)
+    stars_4 = models.PositiveIntegerField(default=0)
+    stars_5 = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        verbose_name = 'Product Rating Summary'
+        verbose_name_plural = 'Product Rating Summaries'
+    
+    def __str__(self):
+        return f"{self.product_id} - {self.get_average()} ({self.rating_count} reviews)"
+    
+    def get_average(self):
+        """Average rating rounded to one decimal place"""
+        if self.rating_count:
+            return round(self.rating_sum / self.rating_count, 1)
+        return 0.0
+    
+    def get_distribution(self):
+        """Get distribution of ratings (5 stars to 1 star)"""
+        return {star: getattr(self, f'stars_{star}') for star in (5, 4, 3, 2, 1)}
+    
+    @classmethod
+    def apply_delta(cls, product_id, rating, sign):
+        """
+        Add (sign=1) or remove (sign=-1) a single rating from a product's
+        summary with one UPDATE, creating the row on first review.
+        """
+        changes = {
+            'rating_sum': F('rating_sum') + sign * rating,
+            'rating_count': F('rating_count') + sign,
+            f'stars_{rating}': F(f'stars_{rating}') + sign,
+        }
+        if cls.objects.filter(product_id=product_id).update(**changes) or sign < 0:
+            return
+        cls.objects.get_or_create(product_id=product_id)
+        cls.objects.filter(product_id=product_id).update(**changes)
+    
+    @classmethod
+    def rebuild(cls, product_ids=None):
+        """
+        Recompute summaries from ProductReview with one grouped query and
+        write them back in bulk. Returns the number of summaries written.
+        """
+        reviews = ProductReview.objects.all()
+        if product_ids is not None:
+            reviews = reviews.filter(product_id__in=product_ids)
+        rows = reviews.order_by().values('product_id', 'rating').annotate(n=Count('id'))
+        
+        summaries = {}
+        for row in rows:
+            summary = summaries.setdefault(row['product_id'], cls(product_id=row['product_id']))
+            summary.rating_sum += row['rating'] * row['n']
+            summary.rating_count += row['n']
+            star = f"stars_{row['rating']}"
+            setattr(summary, star, getattr(summary, star) + row['n'])
+        
+        with transaction.atomic():
+            existing = cls.objects.all()
+            if product_ids is not None:
+                existing = existing.filter(product_id__in=product_ids)
+            existing.delete()
+            cls.objects.bulk_create(summaries.values(), batch_size=500)
+        return len(summaries)
+
+
 class Sale(models.Model):
     order = models.ForeignKey('orders.Order', on_delete=models.CASCADE, related_name='sales', null=True, blank=True)
-    date = models.DateTimeField(auto_now_add=True)
+    date = models.DateTimeField(auto_now_add=True, db_index=True)
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
     item = models.ForeignKey(Product, on_delete=models.CASCADE)
     sold_price = models.DecimalField(max_digits=10, decimal_places=2)
@@ -138,6 +265,32 @@ class Sale(models.Model):
         return self.sold_price * self.quantity
 
 
+class SalesDailyRollup(models.Model):
+    """
+    Sales totals per day, category and product. Kept current from Sale
+    inserts, edits and deletes (see products/reports.py) and rebuilt by the
+    rebuild_sales_rollups command, so sales reports read a table that grows
+    with the catalog and the calendar rather than with order history.
+    Cost is the product's cost_price when the sale was rolled up.
+    """
+    date = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='sales_rollups')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='sales_rollups')
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    cost = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    units = models.PositiveIntegerField(default=0)
+    sales = models.PositiveIntegerField(default=0, help_text='Number of Sale rows rolled up')
+    
+    class Meta:
+        ordering = ('-date',)
+        unique_together = ('date', 'category', 'product')
+        verbose_name = 'Sales Daily Rollup'
+        verbose_name_plural = 'Sales Daily Rollups'
+    
+    def __str__(self):
+        return f"{self.date} {self.product_id}: {self.units} units, £{self.revenue}"
+
+
 class ProductPriceHistory(models.Model):
     """
     Track price changes for products over time
@@ -170,3 +323,298 @@ class ProductPriceHistory(models.Model):
     def get_profit(self):
         """Calculate profit amount at this point in time"""
         return self.selling_price - self.cost_price
+
+
+class ProductCoPurchase(models.Model):
+    """
+    Sparse co-purchase matrix: the number of paid orders that contained
+    both products. One row per unordered pair (product_a_id < product_b_id),
+    folded in incrementally by the build_related_products command.
+    """
+    product_a = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    product_b = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    orders = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ('product_a', 'product_b')
+        indexes = [
+            models.Index(fields=['product_b']),
+        ]
+        verbose_name = 'Product Co-Purchase'
+        verbose_name_plural = 'Product Co-Purchases'
+    
+    def __str__(self):
+        return f"{self.product_a_id} + {self.product_b_id}: {self.orders} orders"
+
+
+class RelatedProduct(models.Model):
+    """
+    Top-N "frequently bought together" neighbours of a product, ranked by
+    co-purchase count (rank 1 is the strongest). Derived from ProductCoPurchase.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='related_entries')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='related_from')
+    rank = models.PositiveSmallIntegerField()
+    score = models.PositiveIntegerField(help_text='Paid orders containing both products')
+    
+    class Meta:
+        ordering = ('product', 'rank')
+        unique_together = ('product', 'rank')
+        verbose_name = 'Related Product'
+        verbose_name_plural = 'Related Products'
+    
+    def __str__(self):
+        return f"{self.product_id} -> {self.related_id} (#{self.rank}, {self.score})"
+
+
+class CoPurchaseRun(models.Model):
+    """
+    One build_related_products run. `last_sale_id` is the watermark: the
+    next incremental run folds in only orders whose Sale rows (written when
+    an order is paid) have a higher id.
+    """
+    last_sale_id = models.PositiveIntegerField(default=0)
+    orders = models.PositiveIntegerField(default=0, help_text='Paid orders folded in by this run')
+    pairs = models.PositiveIntegerField(default=0, help_text='Product pairs whose count changed')
+    full = models.BooleanField(default=False, help_text='Rebuilt from all paid orders')
+    finished = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ('-id',)
+        get_latest_by = 'id'
+        verbose_name = 'Co-Purchase Run'
+        verbose_name_plural = 'Co-Purchase Runs'
+    
+    def __str__(self):
+        return f"Run {self.id}: {self.orders} orders up to sale {self.last_sale_id}"
+
+
+class DashboardStatistics(models.Model):
+    """
+    Single-row snapshot of the admin dashboard figures. Signals on
+    products, categories, orders and users mark it stale; the next
+    dashboard visit (or the refresh_dashboard_stats command) recomputes it
+    with a handful of DB-side aggregates. A snapshot older than
+    DASHBOARD_STATS_MAX_AGE seconds is also refreshed, which covers
+    queryset.update() writes that send no signals.
+    """
+    SINGLETON_ID = 1
+    DEFAULT_MAX_AGE = 300
+    
+    total_products = models.PositiveIntegerField(default=0)
+    products_online = models.PositiveIntegerField(default=0)
+    products_warehouse = models.PositiveIntegerField(default=0)
+    available_products = models.PositiveIntegerField(default=0)
+    out_of_stock = models.PositiveIntegerField(default=0)
+    low_stock = models.PositiveIntegerField(default=0)
+    total_categories = models.PositiveIntegerField(default=0)
+    total_users = models.PositiveIntegerField(default=0)
+    registered_customers = models.PositiveIntegerField(default=0)
+    total_orders = models.PositiveIntegerField(default=0)
+    paid_orders = models.PositiveIntegerField(default=0)
+    pending_orders = models.PositiveIntegerField(default=0)
+    total_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_items_sold = models.PositiveIntegerField(default=0)
+    stale = models.BooleanField(default=True)
+    refreshed = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = 'Dashboard Statistics'
+        verbose_name_plural = 'Dashboard Statistics'
+    
+    def __str__(self):
+        return f"Dashboard statistics ({self.refreshed:%Y-%m-%d %H:%M})" if self.refreshed else "Dashboard statistics"
+    
+    @classmethod
+    def mark_stale(cls):
+        """Flag the snapshot for recomputation (no-op write if already stale)"""
+        cls.objects.filter(pk=cls.SINGLETON_ID, stale=False).update(stale=True)
+    
+    @classmethod
+    def get_current(cls, max_age=None):
+        """Return the snapshot, refreshing it first if stale or too old"""
+        if max_age is None:
+            max_age = getattr(settings, 'DASHBOARD_STATS_MAX_AGE', cls.DEFAULT_MAX_AGE)
+        snapshot = cls.objects.filter(pk=cls.SINGLETON_ID).first()
+        # refreshed is None while another request's first refresh() runs
+        if (snapshot is None or snapshot.stale or snapshot.refreshed is None
+                or snapshot.refreshed < timezone.now() - timedelta(seconds=max_age)):
+            snapshot = cls.refresh()
+        return snapshot
+    
+    @classmethod
+    def refresh(cls):
+        """Recompute every figure with DB-side aggregates and store the row"""
+        Order = apps.get_model('orders', 'Order')
+        OrderItem = apps.get_model('orders', 'OrderItem')
+        User = apps.get_model(settings.AUTH_USER_MODEL)
+        
+        # Clear the flag before reading, so a change made while the
+        # aggregates run marks the new snapshot stale again.
+        snapshot, _ = cls.objects.get_or_create(pk=cls.SINGLETON_ID)
+        cls.objects.filter(pk=cls.SINGLETON_ID).update(stale=False)
+        
+        values = Product.objects.aggregate(
+            total_products=Count('id'),
+            products_online=Count('id', filter=Q(is_online=True)),
+            products_warehouse=Count('id', filter=Q(is_online=False)),
+            available_products=Count('id', filter=Q(available=True)),
+            out_of_stock=Count('id', filter=Q(stock=0)),
+            low_stock=Count('id', filter=Q(stock__lte=10, stock__gt=0)),
+        )
+        values['total_categories'] = Category.objects.count()
+        values.update(User.objects.aggregate(
+            total_users=Count('pk'),
+            registered_customers=Count('pk', filter=Q(is_staff=False)),
+        ))
+        values.update(Order.objects.aggregate(
+            total_orders=Count('id'),
+            paid_orders=Count('id', filter=Q(paid=True)),
+            pending_orders=Count('id', filter=Q(paid=False)),
+        ))
+        values.update(OrderItem.objects.filter(order__paid=True).aggregate(
+            total_revenue=Sum(
+                F('price') * F('quantity'),
+                output_field=models.DecimalField(max_digits=14, decimal_places=2),
+                default=0,
+            ),
+            total_items_sold=Sum('quantity', default=0),
+        ))
+        values['refreshed'] = timezone.now()
+        
+        for field, value in values.items():
+            setattr(snapshot, field, value)
+        snapshot.stale = False
+        snapshot.save(update_fields=list(values))
+        return snapshot
+
+
+class InventoryMovement(models.Model):
+    """
+    Append-only stock ledger: one row per change to a product's stock.
+    Product.stock stays the fast current value; the ledger explains how it
+    got there. Written in bulk by checkout and the catalog import, and by a
+    signal on ordinary Product saves (admin edits, scripts).
+    """
+    REASON_OPENING = 'opening'
+    REASON_INITIAL = 'initial'
+    REASON_SALE = 'sale'
+    REASON_ADJUSTMENT = 'adjustment'
+    REASON_IMPORT = 'import'
+    REASON_CORRECTION = 'correction'
+    REASON_CHOICES = [
+        (REASON_OPENING, 'Opening balance'),
+        (REASON_INITIAL, 'Initial stock'),
+        (REASON_SALE, 'Sale'),
+        (REASON_ADJUSTMENT, 'Manual adjustment'),
+        (REASON_IMPORT, 'Catalog import'),
+        (REASON_CORRECTION, 'Reconciliation correction'),
+    ]
+    
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='inventory_movements')
+    delta = models.IntegerField(help_text='Units added (positive) or removed (negative)')
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES)
+    reference = models.CharField(max_length=100, blank=True, help_text='What caused the movement, e.g. "order 42"')
+    created = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ('-id',)
+        indexes = [
+            models.Index(fields=['product', 'id']),
+            models.Index(fields=['created']),
+        ]
+        verbose_name = 'Inventory Movement'
+        verbose_name_plural = 'Inventory Movements'
+    
+    def __str__(self):
+        return f"{self.product_id}: {self.delta:+} ({self.reason})"
+
+
+class InventorySnapshot(models.Model):
+    """
+    A product's stock as of ledger row `last_movement_id`, taken by the
+    snapshot_inventory command. Stock at a past time is the latest
+    snapshot before it plus the movements after that snapshot, so no
+    query replays the whole ledger.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='inventory_snapshots')
+    stock = models.IntegerField()
+    last_movement_id = models.PositiveBigIntegerField(help_text='Highest ledger row included in this snapshot')
+    taken = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ('-taken',)
+        get_latest_by = 'taken'
+        indexes = [
+            models.Index(fields=['product', 'last_movement_id']),
+            models.Index(fields=['last_movement_id']),
+        ]
+        verbose_name = 'Inventory Snapshot'
+        verbose_name_plural = 'Inventory Snapshots'
+    
+    def __str__(self):
+        return f"{self.product_id}: {self.stock} at {self.taken:%Y-%m-%d %H:%M}"
+
+
+class CatalogVersion(models.Model):
+    """
+    Single-row counter of storefront catalog changes. Signals on products,
+    categories and reviews bump it, as do the bulk writers that bypass them
+    (checkout, repricing, catalog import, related-product builds); checkouts
+    are rate-limited, with changes inside the interval postponed. The
+    catalog page cache and the ETag / Last-Modified headers of the catalog
+    pages and API endpoints are derived from it, so finding out whether
+    anything changed is one primary-key lookup.
+    """
+    SINGLETON_ID = 1
+    
+    version = models.PositiveBigIntegerField(default=1)
+    changed = models.DateTimeField(default=timezone.now)
+    due = models.DateTimeField(null=True, blank=True, help_text='When a postponed change joins the version')
+    
+    class Meta:
+        verbose_name = 'Catalog Version'
+        verbose_name_plural = 'Catalog Version'
+    
+    def __str__(self):
+        return f"Catalog version {self.version} ({self.changed:%Y-%m-%d %H:%M})"
+    
+    @classmethod
+    def current(cls):
+        """(version, changed) of the catalog, folding in a postponed change that is due"""
+        row = cls.objects.filter(pk=cls.SINGLETON_ID).values_list('version', 'changed', 'due').first()
+        if row is None:
+            catalog, _ = cls.objects.get_or_create(pk=cls.SINGLETON_ID)
+            return catalog.version, catalog.changed
+        version, changed, due = row
+        if due is not None and due <= timezone.now():
+            # One request folds it (the due=due filter); the rest re-read.
+            cls.objects.filter(pk=cls.SINGLETON_ID, due=due).update(
+                version=F('version') + 1, changed=due, due=None,
+            )
+            version, changed = cls.objects.filter(pk=cls.SINGLETON_ID).values_list('version', 'changed').get()
+        return version, changed
+    
+    @classmethod
+    def bump(cls, min_interval=0):
+        """
+        Record a catalog change. With `min_interval` (seconds), a change
+        within that long of the last bump is postponed rather than applied:
+        the row is marked due at the end of the interval and current()
+        folds the change into the version then. Only the first postponed
+        change writes; later ones are a read and take no write lock.
+        """
+        now = timezone.now()
+        rows = cls.objects.filter(pk=cls.SINGLETON_ID)
+        if min_interval:
+            interval = timedelta(seconds=min_interval)
+            row = rows.values_list('changed', 'due').first()
+            if row is not None and row[0] > now - interval:
+                changed, due = row
+                if due is None:
+                    rows.filter(due__isnull=True).update(due=changed + interval)
+                return
+            # another worker may have bumped since the read
+            rows = rows.filter(changed__lte=now - interval)
+        if not rows.update(version=F('version') + 1, changed=now, due=None) and not min_interval:
+            cls.objects.get_or_create(pk=cls.SINGLETON_ID)
@@ -0,0 +1,86 @@
+"""
+Catalog Page Cache
+Conditional responses and a per-URL response cache for the storefront
+catalog pages (product list, detail and search), both keyed by
+CatalogVersion. Their HTML is the same for every anonymous visitor (the
+cart badge and the add-to-cart CSRF token are fetched client-side from
+cart:cart_summary), so anonymous GETs carry a strong ETag and
+Last-Modified derived from the catalog version: a matching If-None-Match
+or If-Modified-Since is answered 304 after one primary-key lookup, and
+other requests are served from the cache for CATALOG_PAGE_CACHE_TIMEOUT
+seconds. Logged-in users get fresh, private pages.
+
+Anything that changes the catalog bumps CatalogVersion, which retires
+every cached page and ETag at once. Checkouts are the exception: their
+bumps are rate-limited and a sale inside the interval joins the version
+only at its end (see CatalogVersion.bump). Until then a page rendered
+afresh (say, after its cache entry expired) can show the new stock under
+the old ETag, so the HTML behind one ETag is not fixed: conditional
+requests may get 304s for stock counts up to CATALOG_STOCK_BUMP_INTERVAL
+seconds old, never longer.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from .models import CatalogVersion
+
+PAGE_CACHE_KEY = 'catalog:page:{}'
+
+
+def get_page_cache_timeout():
+    """Seconds catalog pages stay cached; 0 (the default) disables the cache."""
+    return getattr(settings, 'CATALOG_PAGE_CACHE_TIMEOUT', 0)
+
+
+def catalog_etag(request, version, changed, *parts):
+    """Strong ETag of the response to `request` at the given catalog version."""
+    key = '|'.join([str(version), changed.isoformat(), request.get_full_path(), *parts])
+    return f'"{hashlib.md5(key.encode()).hexdigest()}"'
+
+
+def not_modified(request, etag, changed):
+    """A 304 (or 412) response if the request's validators match, else None."""
+    return get_conditional_response(request, etag=etag, last_modified=int(changed.timestamp()))
+
+
+def set_validators(response, etag, changed):
+    response.headers['ETag'] = etag
+    response.headers['Last-Modified'] = http_date(changed.timestamp())
+
+
+def cache_anonymous_page(view):
+    """Serve anonymous GET/HEAD requests for the view conditionally and from the page cache."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or request.user.is_authenticated:
+            response = view(request, *args, **kwargs)
+            patch_cache_control(response, private=True)
+            return response
+
+        version, changed = CatalogVersion.current()
+        etag = catalog_etag(request, version, changed)
+        timeout = get_page_cache_timeout()
+        response = not_modified(request, etag, changed)
+        if response is None:
+            key = PAGE_CACHE_KEY.format(etag.strip('"'))
+            response = cache.get(key) if timeout else None
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                if timeout and not response.cookies:
+                    cache.set(key, response, timeout)
+        set_validators(response, etag, changed)
+        if timeout:
+            patch_cache_control(response, public=True, max_age=timeout)
+        else:
+            # Revalidate every time (cheap with the validators above).
+            patch_cache_control(response, public=True, no_cache=True)
+        patch_vary_headers(response, ('Cookie',))
+        return response
+    return wrapper
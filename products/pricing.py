@@ -0,0 +1,196 @@
+"""
+Product Pricing
+Bulk price updates that bypass the per-save Product signals: new prices
+are written with bulk_update and the matching ProductPriceHistory rows
+with a single bulk_create. Also the repricing rules ("+5%", "40% margin
+over cost") used by the reprice_products command and admin action.
+"""
+from collections import Counter
+from decimal import ROUND_CEILING, ROUND_HALF_UP, Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import CatalogVersion, Product, ProductPriceHistory
+
+PRICE_FIELDS = ['price', 'cost_price', 'updated']
+
+
+def bulk_update_prices(products, changed_by=None, reason='Price updated', batch_size=500):
+    """
+    Save the price / cost_price values already set on `products`.
+
+    Products are compared with the prices they were loaded with (see
+    Product.from_db); unchanged products are skipped. Returns the list of
+    products that changed.
+    """
+    products = list(products)
+    unloaded = [p.pk for p in products if getattr(p, '_loaded_prices', None) is None]
+    if unloaded:
+        stored = {
+            pk: (price, cost_price)
+            for pk, price, cost_price in Product.objects.filter(pk__in=unloaded).values_list('pk', 'price', 'cost_price')
+        }
+        for product in products:
+            if product.pk in stored:
+                product._loaded_prices = stored[product.pk]
+
+    changed = [
+        product for product in products
+        if getattr(product, '_loaded_prices', None) not in (None, (product.price, product.cost_price))
+    ]
+    if not changed:
+        return []
+
+    now = timezone.now()
+    with transaction.atomic():
+        for product in changed:
+            product.updated = now
+        Product.objects.bulk_update(changed, PRICE_FIELDS, batch_size=batch_size)
+        ProductPriceHistory.objects.bulk_create(
+            [
+                ProductPriceHistory(
+                    product=product,
+                    cost_price=product.cost_price,
+                    selling_price=product.price,
+                    changed_by=changed_by,
+                    reason=reason,
+                )
+                for product in changed
+            ],
+            batch_size=batch_size,
+        )
+    # bulk_update bypasses the signal that bumps the catalog version.
+    CatalogVersion.bump()
+    for product in changed:
+        product._loaded_prices = (product.price, product.cost_price)
+    return changed
+
+
+class PriceRule:
+    """
+    A repricing rule applied to (price, cost_price):
+
+    - 'percent': adjust the current price by `value` percent (5 = +5%)
+    - 'margin': set the price to `value` percent over cost_price, the
+      margin shown by Product.get_margin_percentage() (40 = cost * 1.40)
+
+    `ending` optionally rounds prices up to the next x.ending (e.g. 0.99).
+    """
+    KINDS = (
+        ('percent', 'Adjust price by %'),
+        ('margin', 'Target margin % over cost price'),
+    )
+    CENT = Decimal('0.01')
+    # Why a product was skipped, phrased to follow "N product(s)".
+    NO_PRICE = 'without a price to adjust'
+    NO_COST_PRICE = 'without a cost price'
+    BELOW_MINIMUM = 'that the rule would price below £0.01'
+
+    def __init__(self, kind, value, ending=None):
+        if kind not in dict(self.KINDS):
+            raise ValueError(f'Unknown pricing rule {kind!r}')
+        self.kind = kind
+        self.value = Decimal(str(value))
+        self.ending = Decimal(str(ending)) if ending is not None else None
+        if self.ending is not None and not 0 <= self.ending < 1:
+            raise ValueError('Price ending must be between 0 and 0.99')
+
+    def __str__(self):
+        if self.kind == 'percent':
+            text = f'{self.value:+}% on price'
+        else:
+            text = f'{self.value}% margin over cost'
+        if self.ending is not None:
+            text += f', rounded up to x{self.ending:.2f}'.replace('x0.', 'x.')
+        return text
+
+    def apply(self, price, cost_price):
+        """New price, or None if the rule cannot price this product."""
+        return self.evaluate(price, cost_price)[0]
+
+    def evaluate(self, price, cost_price):
+        """
+        (new price, None), or (None, reason) if the rule cannot price this
+        product: NO_PRICE, NO_COST_PRICE or BELOW_MINIMUM.
+        """
+        if self.kind == 'percent':
+            if price <= 0:
+                return None, self.NO_PRICE
+            new_price = price * (1 + self.value / 100)
+        else:
+            if cost_price <= 0:
+                return None, self.NO_COST_PRICE
+            new_price = cost_price * (1 + self.value / 100)
+        if self.ending is not None:
+            whole = (new_price - self.ending).to_integral_value(rounding=ROUND_CEILING)
+            new_price = whole + self.ending
+        new_price = new_price.quantize(self.CENT, rounding=ROUND_HALF_UP)
+        if new_price < self.CENT:
+            return None, self.BELOW_MINIMUM
+        return new_price, None
+
+
+class PriceChange:
+    """One row of a repricing diff."""
+    __slots__ = ('product_id', 'name', 'cost_price', 'old_price', 'new_price')
+
+    def __init__(self, product_id, name, cost_price, old_price, new_price):
+        self.product_id = product_id
+        self.name = name
+        self.cost_price = cost_price
+        self.old_price = old_price
+        self.new_price = new_price
+
+    @property
+    def change_percentage(self):
+        return round((self.new_price - self.old_price) / self.old_price * 100, 1) if self.old_price else None
+
+    @staticmethod
+    def margin(price, cost_price):
+        return round((price - cost_price) / cost_price * 100, 1) if cost_price > 0 else None
+
+    @property
+    def old_margin(self):
+        return self.margin(self.old_price, self.cost_price)
+
+    @property
+    def new_margin(self):
+        return self.margin(self.new_price, self.cost_price)
+
+
+def plan_repricing(queryset, rule):
+    """
+    Compute the repricing diff in one pass over (id, name, price, cost_price)
+    tuples, without loading model instances. Returns (changes, skipped):
+    products whose price would change, and (id, name, reason) for products
+    the rule cannot price (see PriceRule.evaluate).
+    """
+    changes, skipped = [], []
+    rows = queryset.order_by('id').values_list('id', 'name', 'price', 'cost_price')
+    for product_id, name, price, cost_price in rows.iterator(chunk_size=2000):
+        new_price, reason = rule.evaluate(price, cost_price)
+        if new_price is None:
+            skipped.append((product_id, name, reason))
+        elif new_price != price:
+            changes.append(PriceChange(product_id, name, cost_price, price, new_price))
+    return changes, skipped
+
+
+def describe_skipped(skipped):
+    """'2 product(s) without a cost price, 1 product(s) ...' for plan_repricing's skipped list."""
+    counts = Counter(reason for _product_id, _name, reason in skipped)
+    return ', '.join(f'{count} product(s) {reason}' for reason, count in counts.items())
+
+
+def apply_repricing(changes, changed_by=None, reason='Repriced', batch_size=500):
+    """
+    Write a repricing plan: bulk_update in chunks of `batch_size` and one
+    bulk_create of ProductPriceHistory. Returns the number of products updated.
+    """
+    products = []
+    for change in changes:
+        product = Product(id=change.product_id, price=change.new_price, cost_price=change.cost_price)
+        product._loaded_prices = (change.old_price, change.cost_price)
+        products.append(product)
+    return len(bulk_update_prices(products, changed_by=changed_by, reason=reason, batch_size=batch_size))
@@ -0,0 +1,148 @@
+"""
+Co-Purchase Recommendations
+Builds the "frequently bought together" tables from paid OrderItem rows.
+Each order is reduced to its set of product ids and every unordered pair
+in it is counted; the pair counts (a sparse, symmetric co-occurrence
+matrix stored as its upper triangle in ProductCoPurchase) are merged into
+the table, and the top-N neighbours of every product whose counts changed
+are re-ranked into RelatedProduct.
+
+Runs are incremental: CoPurchaseRun stores the highest Sale id seen, and
+Sale rows are written when an order is paid, so the next run folds in only
+orders paid since then. A full run rebuilds from every paid order.
+"""
+from collections import Counter, defaultdict
+from heapq import nlargest
+from itertools import combinations
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Q
+
+from orders.models import Order, OrderItem
+from .models import CatalogVersion, CoPurchaseRun, ProductCoPurchase, RelatedProduct, Sale
+
+# Neighbours kept per product.
+DEFAULT_TOP_N = 20
+# Orders with more distinct products than this are skipped: they add
+# n*(n-1)/2 pairs each and say little about what goes together.
+MAX_BASKET_SIZE = 50
+# Keeps IN (...) lists under SQLite's bound-parameter limit.
+CHUNK_SIZE = 500
+
+
+def get_top_n():
+    return getattr(settings, 'RELATED_PRODUCTS_TOP_N', DEFAULT_TOP_N)
+
+
+def count_pairs(baskets, max_basket_size=MAX_BASKET_SIZE):
+    """
+    Co-occurrence counts for an iterable of product-id sets:
+    {(a, b): orders} with a < b, each order counted once per pair.
+    """
+    pairs = Counter()
+    for basket in baskets:
+        if 1 < len(basket) <= max_basket_size:
+            pairs.update(combinations(sorted(basket), 2))
+    return pairs
+
+
+def _chunks(values, size=CHUNK_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+class CoPurchaseEngine:
+    """Fold paid orders into ProductCoPurchase and re-rank RelatedProduct."""
+
+    def __init__(self, top_n=None, batch_size=1000):
+        self.top_n = top_n or get_top_n()
+        self.batch_size = batch_size
+
+    @transaction.atomic
+    def run(self, full=False):
+        """Run one incremental (or full) pass. Returns the CoPurchaseRun."""
+        last_run = CoPurchaseRun.objects.order_by('-id').first()
+        last_sale_id = 0 if full or last_run is None else last_run.last_sale_id
+        high_sale_id = Sale.objects.aggregate(high=Max('id'))['high'] or 0
+
+        if full or last_run is None:
+            ProductCoPurchase.objects.all().delete()
+            RelatedProduct.objects.all().delete()
+            order_ids = list(Order.objects.filter(paid=True).values_list('id', flat=True))
+            full = True
+        else:
+            order_ids = list(
+                Sale.objects.filter(id__gt=last_sale_id, id__lte=high_sale_id, order__isnull=False)
+                .order_by().values_list('order_id', flat=True).distinct()
+            )
+
+        pairs = count_pairs(self.load_baskets(order_ids).values())
+        self.merge_counts(pairs)
+        self.rank_neighbours({product_id for pair in pairs for product_id in pair})
+        if pairs or full:
+            # Product pages list the related products.
+            CatalogVersion.bump()
+        return CoPurchaseRun.objects.create(
+            last_sale_id=max(high_sale_id, last_sale_id),
+            orders=len(order_ids),
+            pairs=len(pairs),
+            full=full,
+        )
+
+    def load_baskets(self, order_ids):
+        """{order_id: {product_id, ...}} for the given orders."""
+        baskets = defaultdict(set)
+        for chunk in _chunks(order_ids):
+            items = OrderItem.objects.filter(order_id__in=chunk).values_list('order_id', 'product_id')
+            for order_id, product_id in items.iterator():
+                baskets[order_id].add(product_id)
+        return baskets
+
+    def merge_counts(self, pairs):
+        """Add pair counts to ProductCoPurchase with bulk_update / bulk_create."""
+        by_a = defaultdict(list)
+        for a, b in pairs:
+            by_a[a].append(b)
+
+        to_update = []
+        seen = set()
+        for chunk in _chunks(by_a):
+            rows = ProductCoPurchase.objects.filter(product_a_id__in=chunk)
+            for row in rows.only('id', 'product_a_id', 'product_b_id', 'orders').iterator():
+                key = (row.product_a_id, row.product_b_id)
+                if key in pairs:
+                    row.orders += pairs[key]
+                    to_update.append(row)
+                    seen.add(key)
+
+        to_create = [
+            ProductCoPurchase(product_a_id=a, product_b_id=b, orders=count)
+            for (a, b), count in pairs.items() if (a, b) not in seen
+        ]
+        ProductCoPurchase.objects.bulk_update(to_update, ['orders'], batch_size=self.batch_size)
+        ProductCoPurchase.objects.bulk_create(to_create, batch_size=self.batch_size)
+
+    def rank_neighbours(self, product_ids):
+        """Rewrite the top-N RelatedProduct rows of the given products."""
+        neighbours = defaultdict(list)
+        for chunk in _chunks(product_ids):
+            rows = ProductCoPurchase.objects.filter(
+                Q(product_a_id__in=chunk) | Q(product_b_id__in=chunk)
+            ).values_list('product_a_id', 'product_b_id', 'orders')
+            for a, b, count in rows.iterator():
+                neighbours[a].append((count, -b, b))
+                neighbours[b].append((count, -a, a))
+
+        entries = []
+        for product_id in product_ids:
+            # Highest count first; ties go to the lower product id.
+            top = nlargest(self.top_n, set(neighbours.get(product_id, ())))
+            entries.extend(
+                RelatedProduct(product_id=product_id, related_id=related_id, rank=rank, score=count)
+                for rank, (count, _, related_id) in enumerate(top, start=1)
+            )
+        for chunk in _chunks(product_ids):
+            RelatedProduct.objects.filter(product_id__in=chunk).delete()
+        RelatedProduct.objects.bulk_create(entries, batch_size=self.batch_size)
@@ -0,0 +1,170 @@
+"""
+Sales Reports
+Maintains SalesDailyRollup, one row per (day, category, product) holding
+revenue (sold_price * quantity), cost, units and the number of Sale rows,
+and answers the admin sales widgets and /api/reports/sales/ from it.
+
+Sale inserts, edits and deletes are applied as deltas with one UPDATE per
+affected rollup row; rebuild_rollups() recomputes rows from Sale with a
+single grouped query for backfills and repairs. Days are local dates in
+the current time zone.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .models import Product, Sale, SalesDailyRollup
+
+# Report buckets accepted by sales_report() and /api/reports/sales/.
+PERIODS = ('day', 'week', 'month')
+
+# Rolling windows (days, including today) shown above the Sale changelist.
+SUMMARY_WINDOWS = {'today': 1, 'week': 7, 'month': 30, 'year': 365}
+
+MONEY = models.DecimalField(max_digits=12, decimal_places=2)
+
+
+def record_sales(sales, sign=1):
+    """
+    Add (sign=1) or remove (sign=-1) Sale rows from the daily rollups.
+    Sales are grouped by rollup key first; missing rollup rows are created
+    empty in one bulk INSERT and each key then gets one atomic UPDATE.
+    """
+    sales = list(sales)
+    if not sales:
+        return
+    costs = dict(
+        Product.objects.filter(pk__in={sale.item_id for sale in sales}).values_list('pk', 'cost_price')
+    )
+    deltas = defaultdict(lambda: [Decimal('0'), Decimal('0'), 0, 0])
+    for sale in sales:
+        delta = deltas[(timezone.localdate(sale.date), sale.category_id, sale.item_id)]
+        delta[0] += sale.sold_price * sale.quantity
+        delta[1] += costs.get(sale.item_id, Decimal('0')) * sale.quantity
+        delta[2] += sale.quantity
+        delta[3] += 1
+
+    with transaction.atomic():
+        if sign > 0:
+            _create_missing_rollups(deltas)
+        for (day, category_id, product_id), (revenue, cost, units, count) in deltas.items():
+            SalesDailyRollup.objects.filter(date=day, category_id=category_id, product_id=product_id).update(
+                revenue=F('revenue') + sign * revenue,
+                cost=F('cost') + sign * cost,
+                units=F('units') + sign * units,
+                sales=F('sales') + sign * count,
+            )
+
+
+def _create_missing_rollups(keys):
+    """Insert empty rollup rows for the (day, category_id, product_id) keys that lack one."""
+    days = {day for day, _, _ in keys}
+    product_ids = {product_id for _, _, product_id in keys}
+    existing = set(
+        SalesDailyRollup.objects.filter(date__in=days, product_id__in=product_ids)
+        .values_list('date', 'category_id', 'product_id')
+    )
+    missing = [key for key in keys if key not in existing]
+    if missing:
+        # Conflicts mean a concurrent writer created the row first; the
+        # UPDATE that follows adds to it either way.
+        SalesDailyRollup.objects.bulk_create(
+            [SalesDailyRollup(date=day, category_id=category_id, product_id=product_id) for day, category_id, product_id in missing],
+            ignore_conflicts=True,
+        )
+
+
+def rebuild_rollups(start=None, batch_size=1000):
+    """
+    Recompute rollups from Sale with one grouped query, replacing the rows
+    from `start` (a date) onwards, or all rows. Returns the number written.
+    """
+    sales = Sale.objects.annotate(day=TruncDate('date'))
+    existing = SalesDailyRollup.objects.all()
+    if start is not None:
+        sales = sales.filter(day__gte=start)
+        existing = existing.filter(date__gte=start)
+    rows = sales.order_by().values('day', 'category_id', 'item_id').annotate(
+        revenue_total=Sum(F('sold_price') * F('quantity'), output_field=MONEY),
+        cost_total=Sum(F('item__cost_price') * F('quantity'), output_field=MONEY),
+        units_total=Sum('quantity'),
+        sales_total=Count('id'),
+    )
+    rollups = [
+        SalesDailyRollup(
+            date=row['day'],
+            category_id=row['category_id'],
+            product_id=row['item_id'],
+            revenue=row['revenue_total'],
+            cost=row['cost_total'],
+            units=row['units_total'],
+            sales=row['sales_total'],
+        )
+        for row in rows.iterator()
+    ]
+    with transaction.atomic():
+        existing.delete()
+        SalesDailyRollup.objects.bulk_create(rollups, batch_size=batch_size)
+    return len(rollups)
+
+
+def sales_summary(today=None):
+    """
+    Revenue and sale counts for the rolling SUMMARY_WINDOWS, in one query:
+    {'today': {'revenue': ..., 'count': ...}, 'week': {...}, ...}
+    """
+    today = today or timezone.localdate()
+    aggregates = {}
+    for name, days in SUMMARY_WINDOWS.items():
+        window = Q(date__gt=today - timedelta(days=days), date__lte=today)
+        aggregates[f'{name}_revenue'] = Sum('revenue', filter=window, default=0)
+        aggregates[f'{name}_count'] = Sum('sales', filter=window, default=0)
+    totals = SalesDailyRollup.objects.filter(
+        date__gt=today - timedelta(days=max(SUMMARY_WINDOWS.values()))
+    ).aggregate(**aggregates)
+    return {
+        name: {'revenue': totals[f'{name}_revenue'], 'count': totals[f'{name}_count']}
+        for name in SUMMARY_WINDOWS
+    }
+
+
+def sales_report(period='day', start=None, end=None, category=None, product=None):
+    """
+    Revenue, cost, units and sale counts per day, week (starting Monday) or
+    month between `start` and `end` (inclusive dates), optionally for one
+    category or product. Returns a list of dicts ordered by period.
+    """
+    if period not in PERIODS:
+        raise ValueError(f'Unknown report period {period!r}')
+    rollups = SalesDailyRollup.objects.all()
+    if start is not None:
+        rollups = rollups.filter(date__gte=start)
+    if end is not None:
+        rollups = rollups.filter(date__lte=end)
+    if category is not None:
+        rollups = rollups.filter(category=category)
+    if product is not None:
+        rollups = rollups.filter(product=product)
+
+    bucket = {'day': F('date'), 'week': TruncWeek('date'), 'month': TruncMonth('date')}[period]
+    rows = rollups.order_by().annotate(period=bucket).values('period').annotate(
+        revenue_total=Sum('revenue'),
+        cost_total=Sum('cost'),
+        units_total=Sum('units'),
+        sales_total=Sum('sales'),
+    ).order_by('period')
+    return [
+        {
+            'period': row['period'],
+            'revenue': row['revenue_total'],
+            'cost': row['cost_total'],
+            'units': row['units_total'],
+            'sales': row['sales_total'],
+        }
+        for row in rows
+    ]
@@ -0,0 +1,144 @@
+"""
+Product Search
+Pluggable full-text search backends for the product catalog.
+The active backend is chosen by settings.PRODUCT_SEARCH_BACKEND;
+SQLiteFTS5Backend keeps an FTS5 inverted index of product name and
+description in sync via the Product signals and ranks matches with BM25,
+weighting name matches above description matches.
+"""
+import re
+from abc import ABC, abstractmethod
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+DEFAULT_SEARCH_BACKEND = 'products.search.IcontainsSearchBackend'
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(query):
+    """Split a user query into lower-cased word tokens."""
+    return [token.lower() for token in TOKEN_RE.findall(query or '')]
+
+
+class BaseSearchBackend(ABC):
+    """
+    Interface for product search backends.
+
+    search() narrows a Product queryset to the matches for a query and
+    annotates it with `search_rank` (lower is more relevant), ordered by it.
+    The index hooks are no-ops for backends that query the table directly.
+    """
+
+    @abstractmethod
+    def search(self, queryset, query):
+        """Matches for `query` in `queryset`, best first, with `search_rank`."""
+
+    def index_products(self, products):
+        """Add or refresh the given products in the index."""
+
+    def remove_products(self, product_ids):
+        """Drop the given product ids from the index."""
+
+    def rebuild(self):
+        """Rebuild the whole index from the Product table."""
+        return 0
+
+
+class IcontainsSearchBackend(BaseSearchBackend):
+    """
+    Index-free fallback for databases without FTS5: every word must appear
+    in the name or description, and name matches rank first.
+    """
+
+    def search(self, queryset, query):
+        tokens = tokenize(query)
+        if not tokens:
+            return queryset.none()
+        match = Q()
+        name_match = Q()
+        for token in tokens:
+            match &= Q(name__icontains=token) | Q(description__icontains=token)
+            name_match &= Q(name__icontains=token)
+        return queryset.filter(match).annotate(
+            search_rank=Case(
+                When(name_match, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField(),
+            )
+        ).order_by('search_rank', 'name')
+
+
+class SQLiteFTS5Backend(BaseSearchBackend):
+    """
+    SQLite FTS5 inverted index on (name, description), keyed by product id.
+    The virtual table is created by products migration 0010.
+    """
+    table = 'products_product_fts'
+    # bm25() column weights: (name, description)
+    weights = (10.0, 1.0)
+    batch_size = 500
+
+    def build_match_expression(self, query):
+        """Quote each token and prefix-match it; FTS5 ANDs the terms."""
+        return ' '.join(f'"{token}"*' for token in tokenize(query))
+
+    def search(self, queryset, query):
+        expression = self.build_match_expression(query)
+        if not expression:
+            return queryset.none()
+        table = self.table
+        matches = RawSQL(f'SELECT rowid FROM {table} WHERE {table} MATCH %s', (expression,))
+        rank = RawSQL(
+            f'SELECT bm25({table}, %s, %s) FROM {table} '
+            f'WHERE {table} MATCH %s AND rowid = {queryset.model._meta.db_table}.id',
+            (*self.weights, expression),
+        )
+        return queryset.filter(id__in=matches).annotate(search_rank=rank).order_by('search_rank', 'name')
+
+    def index_products(self, products):
+        rows = [(p.pk, p.name, p.description) for p in products]
+        with connection.cursor() as cursor:
+            for start in range(0, len(rows), self.batch_size):
+                cursor.executemany(
+                    f'INSERT OR REPLACE INTO {self.table} (rowid, name, description) VALUES (%s, %s, %s)',
+                    rows[start:start + self.batch_size],
+                )
+
+    def remove_products(self, product_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {self.table} WHERE rowid = %s',
+                [(pk,) for pk in product_ids],
+            )
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, name, description) '
+                f'SELECT id, name, description FROM products_product'
+            )
+            cursor.execute(f"INSERT INTO {self.table} ({self.table}) VALUES ('optimize')")
+            cursor.execute(f'SELECT COUNT(*) FROM {self.table}')
+            return cursor.fetchone()[0]
+
+
+@lru_cache(maxsize=None)
+def get_search_backend():
+    """Return the configured search backend instance."""
+    path = getattr(settings, 'PRODUCT_SEARCH_BACKEND', DEFAULT_SEARCH_BACKEND)
+    return import_string(path)()
+
+
+@receiver(setting_changed)
+def reset_search_backend(setting, **kwargs):
+    if setting == 'PRODUCT_SEARCH_BACKEND':
+        get_search_backend.cache_clear()
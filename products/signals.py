@@ -2,33 +2,56 @@
 Products Signals
 Automatically tracks price changes via pre_save/post_save on Product.
 Creates ProductPriceHistory records when price or cost_price changes.
+Keeps ProductRatingSummary in step with ProductReview inserts, edits and deletes,
+the product search index in step with Product saves and deletes, and
+generates resized image variants when a product image is uploaded.
+Applies Sale inserts, edits and deletes to the SalesDailyRollup table.
+Records an InventoryMovement when a saved product's stock changes.
+Marks the admin DashboardStatistics snapshot stale when products,
+categories or users change, and bumps the CatalogVersion (behind the
+catalog page cache and ETags) when products, categories or reviews change.
 """
-from django.db.models.signals import post_save, pre_save
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
-from .models import Product, ProductPriceHistory
+from .models import (
+    CatalogVersion, Category, DashboardStatistics, InventoryMovement, Product, ProductPriceHistory,
+    ProductRatingSummary, ProductReview, Sale,
+)
+from .images import ensure_variants
+from .inventory import record_movements
+from .reports import record_sales
+from .search import get_search_backend
 
 
 @receiver(pre_save, sender=Product)
-def track_price_change(sender, instance, **kwargs):
+def track_price_change(sender, instance, update_fields=None, **kwargs):
     """
     Track price changes before saving the product.
-    Only creates a history record if the price or cost_price has changed.
+    Compares against the prices Product.from_db captured when the instance
+    was loaded, so no query is needed; saves that do not write the prices
+    (update_fields without price/cost_price) are skipped entirely.
     """
-    if instance.pk:  # Only for existing products (not new ones)
-        try:
-            old_product = Product.objects.get(pk=instance.pk)
-            # Check if price or cost_price has changed
-            if old_product.price != instance.price or old_product.cost_price != instance.cost_price:
-                # Store the change in a temporary attribute to be saved in post_save
-                instance._price_changed = True
-                instance._old_price = old_product.price
-                instance._old_cost_price = old_product.cost_price
-        except Product.DoesNotExist:
-            pass
+    if instance._state.adding:
+        return
+    if update_fields is not None and not {'price', 'cost_price'} & set(update_fields):
+        return
+    loaded = getattr(instance, '_loaded_prices', None)
+    if loaded is None:
+        # Instance was not loaded from the database (or prices were deferred)
+        loaded = Product.objects.filter(pk=instance.pk).values_list('price', 'cost_price').first()
+        if loaded is None:
+            return
+    old_price, old_cost_price = loaded
+    if old_price != instance.price or old_cost_price != instance.cost_price:
+        # Store the change in a temporary attribute to be saved in post_save
+        instance._price_changed = True
+        instance._old_price = old_price
+        instance._old_cost_price = old_cost_price
 
 
 @receiver(post_save, sender=Product)
-def save_price_history(sender, instance, created, **kwargs):
+def save_price_history(sender, instance, created, update_fields=None, **kwargs):
     """
     Save price history after the product is saved.
     Creates a history record for new products or when prices change.
@@ -53,3 +76,152 @@ def save_price_history(sender, instance, created, **kwargs):
         delattr(instance, '_price_changed')
         delattr(instance, '_old_price')
         delattr(instance, '_old_cost_price')
+    # The saved prices are the baseline for the next save of this instance
+    if update_fields is None or {'price', 'cost_price'} <= set(update_fields):
+        instance._loaded_prices = (instance.price, instance.cost_price)
+    elif update_fields & {'price', 'cost_price'}:
+        instance.__dict__.pop('_loaded_prices', None)
+
+
+@receiver(pre_save, sender=Product)
+def track_stock_change(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    Work out how far a save moves the stock, against the value
+    Product.from_db captured (no query for products loaded normally).
+    """
+    if raw or instance._state.adding:
+        return
+    if update_fields is not None and 'stock' not in update_fields:
+        return
+    loaded = getattr(instance, '_loaded_stock', None)
+    if loaded is None:
+        loaded = Product.objects.filter(pk=instance.pk).values_list('stock', flat=True).first()
+        if loaded is None:
+            return
+    instance._stock_delta = instance.stock - loaded
+
+
+@receiver(post_save, sender=Product)
+def record_stock_movement(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """
+    Append the save's stock change to the inventory ledger. Callers may set
+    `_stock_reference` on the instance to say who or what changed it.
+    """
+    if raw:
+        return
+    if created:
+        delta, reason = instance.stock, InventoryMovement.REASON_INITIAL
+    else:
+        delta, reason = instance.__dict__.pop('_stock_delta', 0), InventoryMovement.REASON_ADJUSTMENT
+    if delta:
+        record_movements([(instance.pk, delta)], reason, reference=getattr(instance, '_stock_reference', ''))
+    if update_fields is None or 'stock' in update_fields:
+        instance._loaded_stock = instance.stock
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, update_fields=None, **kwargs):
+    """Refresh the product's search index entry when its text may have changed"""
+    if update_fields is not None and not {'name', 'description'} & set(update_fields):
+        return
+    get_search_backend().index_products([instance])
+
+
+@receiver(post_save, sender=Product)
+def generate_image_variants(sender, instance, raw=False, **kwargs):
+    """Create missing or stale thumbnail/WebP variants of an uploaded image"""
+    if not raw:
+        ensure_variants(instance.image)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    """Drop a deleted product from the search index"""
+    get_search_backend().remove_products([instance.pk])
+
+
+@receiver(pre_save, sender=ProductReview)
+def load_previous_rating(sender, instance, **kwargs):
+    """
+    Fall back to reading the stored rating for reviews that were not loaded
+    from the database (from_db normally records it for free).
+    """
+    if instance._state.adding or hasattr(instance, '_loaded_rating'):
+        return
+    instance._loaded_rating = ProductReview.objects.filter(
+        pk=instance.pk
+    ).values_list('product_id', 'rating').first()
+
+
+@receiver(post_save, sender=ProductReview)
+def update_rating_summary(sender, instance, created, raw=False, **kwargs):
+    """
+    Apply the review insert or edit to the product's rating summary.
+    Runs inside ProductReview.save()'s transaction.
+    """
+    if raw:
+        return
+    current = (instance.product_id, instance.rating)
+    previous = None if created else getattr(instance, '_loaded_rating', None)
+    if previous != current:
+        if previous is not None:
+            ProductRatingSummary.apply_delta(previous[0], previous[1], -1)
+        ProductRatingSummary.apply_delta(current[0], current[1], 1)
+    instance._loaded_rating = current
+
+
+@receiver(post_delete, sender=ProductReview)
+def remove_from_rating_summary(sender, instance, **kwargs):
+    """Remove a deleted review from the product's rating summary"""
+    product_id, rating = getattr(instance, '_loaded_rating', None) or (instance.product_id, instance.rating)
+    ProductRatingSummary.apply_delta(product_id, rating, -1)
+
+
+@receiver(pre_save, sender=Sale)
+def load_previous_sale(sender, instance, raw=False, **kwargs):
+    """Remember what the rollups currently count for an edited sale"""
+    if raw or instance._state.adding:
+        return
+    instance._previous_sale = Sale.objects.filter(pk=instance.pk).first()
+
+
+@receiver(post_save, sender=Sale)
+def update_sales_rollup(sender, instance, created, raw=False, **kwargs):
+    """Apply the sale insert or edit to the daily sales rollups"""
+    if raw:
+        return
+    previous = None if created else getattr(instance, '_previous_sale', None)
+    if previous is not None:
+        record_sales([previous], sign=-1)
+    record_sales([instance])
+
+
+@receiver(post_delete, sender=Sale)
+def remove_from_sales_rollup(sender, instance, **kwargs):
+    """Remove a deleted sale from the daily sales rollups"""
+    record_sales([instance], sign=-1)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_dashboard_statistics(sender, update_fields=None, **kwargs):
+    """Flag the dashboard snapshot for recomputation"""
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        # Logins touch every user row and never change the counts
+        return
+    DashboardStatistics.mark_stale()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=ProductReview)
+@receiver(post_delete, sender=ProductReview)
+def bump_catalog_version(sender, **kwargs):
+    """Record a catalog change"""
+    CatalogVersion.bump()
@@ -1,9 +1,11 @@
 """
 Product Template Tags
 Custom template filters for product templates.
-Provides get_item filter for dictionary lookups in templates.
+Provides get_item filter for dictionary lookups in templates and
+image_srcset for responsive product images.
 """
 from django import template
+from products.images import build_srcset
 
 register = template.Library()
 
@@ -13,3 +15,9 @@ def get_item(dictionary, key):
     if dictionary:
         return dictionary.get(int(key), 0)
     return 0
+
+
+@register.filter
+def image_srcset(image, fmt=None):
+    """srcset of generated variants: {{ product.image|image_srcset:"webp" }}"""
+    return build_srcset(image, fmt or None)
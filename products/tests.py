@@ -2,6 +2,1192 @@
 Products Tests
 Tests for product catalog, categories, and search functionality.
 """
-from django.test import TestCase
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
+from django.contrib.auth.models import User
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.storage import default_storage
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from xyz_store.storage import split_hashed_name
+from xyz_store.views import serve_media
+from .catalog import CatalogRowError, clean_row
+from .search import BaseSearchBackend
+from .pricing import PriceRule, apply_repricing, bulk_update_prices, plan_repricing
+from .images import build_srcset, generate_variants, is_stale, is_variant, variant_name
+from orders.models import Order, OrderItem
+from .models import (
+    CatalogVersion, Category, CoPurchaseRun, DashboardStatistics, InventoryMovement, InventorySnapshot, Product,
+    ProductCoPurchase, ProductPriceHistory, ProductRatingSummary, ProductReview, Sale, SalesDailyRollup,
+)
+from .inventory import reconcile_stock, stock_at, take_snapshots
+from .related import CoPurchaseEngine, count_pairs
+from .reports import rebuild_rollups, sales_report, sales_summary
 
-# Create your tests here.
+
+class ProductRatingSummaryTest(TestCase):
+    """Tests for the incrementally maintained review aggregates."""
+
+    def setUp(self):
+        self.cat = Category.objects.create(name='Tools', slug='tools')
+        self.product = Product.objects.create(
+            category=self.cat, name='Hammer', slug='hammer',
+            price=Decimal('19.99'), stock=10, available=True, is_online=True,
+        )
+        self.user1 = User.objects.create_user(username='user1', password='pass123')
+        self.user2 = User.objects.create_user(username='user2', password='pass123')
+
+    def _summary(self):
+        return ProductRatingSummary.objects.get(product=self.product)
+
+    def _fresh_product(self):
+        return Product.objects.select_related('rating_summary').get(pk=self.product.pk)
+
+    def test_no_reviews_defaults(self):
+        product = self._fresh_product()
+        self.assertEqual(product.get_average_rating(), 0.0)
+        self.assertEqual(product.get_rating_count(), 0)
+        self.assertEqual(product.get_rating_distribution(), {5: 0, 4: 0, 3: 0, 2: 0, 1: 0})
+
+    def test_insert_updates_summary(self):
+        ProductReview.objects.create(product=self.product, user=self.user1, rating=5, comment='Great')
+        ProductReview.objects.create(product=self.product, user=self.user2, rating=2, comment='Meh')
+        product = self._fresh_product()
+        self.assertEqual(product.get_rating_count(), 2)
+        self.assertEqual(product.get_average_rating(), 3.5)
+        self.assertEqual(product.get_rating_distribution(), {5: 1, 4: 0, 3: 0, 2: 1, 1: 0})
+
+    def test_edit_moves_rating_between_buckets(self):
+        review = ProductReview.objects.create(product=self.product, user=self.user1, rating=5, comment='Great')
+        review = ProductReview.objects.get(pk=review.pk)
+        review.rating = 1
+        review.save()
+        summary = self._summary()
+        self.assertEqual((summary.rating_sum, summary.rating_count), (1, 1))
+        self.assertEqual((summary.stars_5, summary.stars_1), (0, 1))
+
+    def test_edit_without_rating_change_is_noop(self):
+        review = ProductReview.objects.create(product=self.product, user=self.user1, rating=4, comment='Good')
+        review.title = 'Updated title'
+        review.save()
+        summary = self._summary()
+        self.assertEqual((summary.rating_sum, summary.rating_count, summary.stars_4), (4, 1, 1))
+
+    def test_delete_updates_summary(self):
+        review = ProductReview.objects.create(product=self.product, user=self.user1, rating=3, comment='OK')
+        ProductReview.objects.create(product=self.product, user=self.user2, rating=5, comment='Great')
+        review.delete()
+        summary = self._summary()
+        self.assertEqual((summary.rating_sum, summary.rating_count, summary.stars_3), (5, 1, 0))
+
+    def test_rebuild_command_restores_drifted_summary(self):
+        ProductReview.objects.create(product=self.product, user=self.user1, rating=4, comment='Good')
+        ProductReview.objects.create(product=self.product, user=self.user2, rating=2, comment='Meh')
+        ProductRatingSummary.objects.filter(product=self.product).update(rating_sum=0, rating_count=7)
+        call_command('rebuild_rating_summaries', stdout=StringIO())
+        summary = self._summary()
+        self.assertEqual((summary.rating_sum, summary.rating_count), (6, 2))
+        self.assertEqual((summary.stars_4, summary.stars_2), (1, 1))
+
+    def test_api_list_reads_summary_without_per_row_queries(self):
+        for i in range(5):
+            product = Product.objects.create(
+                category=self.cat, name=f'Tool {i}', slug=f'tool-{i}',
+                price=Decimal('9.99'), stock=5, available=True, is_online=True,
+            )
+            ProductReview.objects.create(product=product, user=self.user1, rating=4, comment='Good')
+        client = APIClient()
+        # Catalog version lookup, COUNT(*) for pagination + one SELECT
+        # joining category and summary
+        with self.assertNumQueries(3):
+            response = client.get('/api/products/')
+        self.assertEqual(response.data['results'][1]['average_rating'], 4.0)
+
+
+class ProductSearchTest(TestCase):
+    """Tests for the FTS5 search backend used by the search page and API."""
+
+    def setUp(self):
+        self.cat = Category.objects.create(name='Tools', slug='tools')
+        self.drill = self._make('Power Drill', 'power-drill', 'Cordless 18V drill driver')
+        self.bits = self._make('Bit Set', 'bit-set', 'Steel bits for any power drill')
+        self.saw = self._make('Hand Saw', 'hand-saw', 'Fine tooth saw')
+
+    def _make(self, name, slug, description, **kwargs):
+        defaults = {'available': True, 'is_online': True}
+        defaults.update(kwargs)
+        return Product.objects.create(
+            category=self.cat, name=name, slug=slug, description=description,
+            price=Decimal('10.00'), stock=5, **defaults,
+        )
+
+    def test_name_match_ranks_above_description_match(self):
+        response = self.client.get('/search/', {'q': 'drill'})
+        self.assertEqual([p.name for p in response.context['products']], ['Power Drill', 'Bit Set'])
+
+    def test_prefix_and_multi_word_matching(self):
+        response = self.client.get('/search/', {'q': 'steel dri'})
+        self.assertEqual([p.name for p in response.context['products']], ['Bit Set'])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.saw.name = 'Tenon Saw'
+        self.saw.save()
+        self.assertEqual(self.client.get('/search/', {'q': 'tenon'}).context['product_count'], 1)
+        self.saw.delete()
+        self.assertEqual(self.client.get('/search/', {'q': 'tenon'}).context['product_count'], 0)
+
+    def test_offline_products_are_excluded(self):
+        self._make('Hidden Drill', 'hidden-drill', '', is_online=False)
+        response = self.client.get('/search/', {'q': 'drill'})
+        self.assertNotIn('Hidden Drill', [p.name for p in response.context['products']])
+
+    def test_api_search_orders_by_relevance(self):
+        response = APIClient().get('/api/products/', {'search': 'drill'})
+        self.assertEqual([p['name'] for p in response.data['results']], ['Power Drill', 'Bit Set'])
+
+    def test_rebuild_command_reindexes_bulk_updates(self):
+        Product.objects.filter(pk=self.saw.pk).update(name='Coping Saw')
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.client.get('/search/', {'q': 'coping'}).context['product_count'], 1)
+
+    def test_backend_must_implement_search(self):
+        class IndexOnly(BaseSearchBackend):
+            def index_products(self, products):
+                pass
+
+        with self.assertRaises(TypeError):
+            IndexOnly()
+
+
+class ProductListViewTest(TestCase):
+    """Tests for the paginated storefront list and cached product cards."""
+
+    def setUp(self):
+        self.cat = Category.objects.create(name='Tools', slug='tools')
+        self.other = Category.objects.create(name='Garden', slug='garden')
+        for i in range(30):
+            Product.objects.create(
+                category=self.cat, name=f'Tool {i:02d}', slug=f'tool-{i}',
+                price=Decimal('10.00'), stock=5, available=True, is_online=True,
+            )
+        self.rake = Product.objects.create(
+            category=self.other, name='Rake', slug='rake',
+            price=Decimal('15.00'), stock=3, available=True, is_online=True,
+        )
+
+    def test_list_is_paginated(self):
+        first = self.client.get('/')
+        self.assertEqual(len(first.context['products']), 24)
+        self.assertEqual(first.context['page_obj'].paginator.count, 31)
+        second = self.client.get('/', {'page': 2})
+        self.assertEqual(len(second.context['products']), 7)
+
+    def test_out_of_range_page_shows_last_page(self):
+        response = self.client.get('/', {'page': 99})
+        self.assertEqual(response.context['page_obj'].number, 2)
+
+    def test_category_page_is_paginated(self):
+        response = self.client.get('/garden/')
+        self.assertEqual([p.name for p in response.context['products']], ['Rake'])
+
+    @override_settings(CATALOG_PAGE_CACHE_TIMEOUT=0)
+    def test_cached_card_refreshes_on_save_and_stock_change(self):
+        self.client.get('/garden/')
+        self.rake.price = Decimal('12.50')
+        self.rake.save()
+        self.assertContains(self.client.get('/garden/'), '£12.50')
+        Product.objects.filter(pk=self.rake.pk).update(stock=0)
+        self.assertContains(self.client.get('/garden/'), 'Out of Stock')
+
+
+class ProductDetailViewTest(TestCase):
+    """Tests for the product detail page's rating summary and review pages."""
+
+    def setUp(self):
+        self.cat = Category.objects.create(name='Tools', slug='tools')
+        self.product = Product.objects.create(
+            category=self.cat, name='Hammer', slug='hammer',
+            price=Decimal('19.99'), stock=10, available=True, is_online=True,
+        )
+        self.url = self.product.get_absolute_url()
+
+    def _add_reviews(self, count, start=0):
+        for i in range(start, start + count):
+            user = User.objects.create_user(username=f'reviewer{i}', password='pass123')
+            ProductReview.objects.create(
+                product=self.product, user=user, rating=(i % 5) + 1, comment=f'Review {i}',
+            )
+
+    def test_rating_summary_in_context(self):
+        self._add_reviews(4)
+        response = self.client.get(self.url)
+        self.assertEqual(response.context['rating_count'], 4)
+        self.assertEqual(response.context['average_rating'], 2.5)
+        self.assertEqual(response.context['rating_distribution'], {5: 0, 4: 1, 3: 1, 2: 1, 1: 1})
+
+    def test_reviews_are_paginated_newest_first(self):
+        self._add_reviews(12)
+        first = self.client.get(self.url)
+        self.assertEqual(len(first.context['reviews']), 10)
+        self.assertEqual(first.context['reviews'][0].comment, 'Review 11')
+        second = self.client.get(self.url, {'page': 2})
+        self.assertEqual([r.comment for r in second.context['reviews']], ['Review 1', 'Review 0'])
+
+    def test_query_count_independent_of_review_count(self):
+        self._add_reviews(3)
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(self.url)
+        self._add_reviews(20, start=3)
+        with CaptureQueriesContext(connection) as many:
+            self.client.get(self.url)
+        self.assertEqual(len(few), len(many))
+
+
+@override_settings(CATALOG_PAGE_CACHE_TIMEOUT=60)
+class CatalogPageCacheTest(TestCase):
+    """Anonymous catalog pages are served from the per-URL page cache."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.cat = Category.objects.create(name='Tools', slug='tools')
+        self.product = Product.objects.create(
+            category=self.cat, name='Hammer', slug='hammer',
+            price=Decimal('19.99'), stock=10, available=True, is_online=True,
+        )
+        self.urls = ['/', '/tools/', self.product.get_absolute_url(), '/search/?q=hammer']
+
+    def test_anonymous_pages_are_cached_behind_one_lookup(self):
+        for url in self.urls:
+            first = self.client.get(url)
+            self.assertEqual(first.status_code, 200)
+            self.assertIn('public', first['Cache-Control'])
+            self.assertIn('max-age=60', first['Cache-Control'])
+            self.assertIn('Cookie', first['Vary'])
+            self.assertFalse(first.cookies)
+            # Only the CatalogVersion lookup.
+            with self.assertNumQueries(1):
+                second = self.client.get(url)
+            self.assertEqual(second.content, first.content)
+            self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_conditional_requests_get_304(self):
+        url = self.product.get_absolute_url()
+        first = self.client.get(url)
+        self.assertTrue(first['ETag'].startswith('"'))
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], first['ETag'])
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get('/', HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+        ProductReview.objects.create(
+            product=self.product, user=User.objects.create_user(username='bob', password='pass123'),
+            rating=5, comment='Great',
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+
+    @override_settings(CATALOG_PAGE_CACHE_TIMEOUT=0)
+    def test_validators_without_page_cache(self):
+        first = self.client.get('/')
+        self.assertIn('no-cache', first['Cache-Control'])
+        self.assertEqual(self.client.get('/', HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+
+    def test_pages_carry_no_per_visitor_data(self):
+        self.client.post(reverse('cart:cart_add', args=[self.product.id]), {'quantity': 2})
+        response = self.client.get(self.product.get_absolute_url())
+        self.assertContains(response, 'data-csrf-token')
+        self.assertContains(response, reverse('cart:cart_summary'))
+        self.assertNotContains(response, '(2)')
+        self.assertNotIn(settings.CSRF_COOKIE_NAME, response.cookies)
+        summary = self.client.get(reverse('cart:cart_summary')).json()
+        self.assertEqual((summary['count'], summary['total']), (2, '39.98'))
+        self.assertTrue(summary['csrf_token'])
+
+    def test_add_to_cart_works_without_the_summary_script(self):
+        client = Client(enforce_csrf_checks=True)
+        page = client.get(self.product.get_absolute_url())
+        self.assertContains(page, 'method="get" data-csrf-form')
+        # What the form submits while it has no token.
+        url = reverse('cart:cart_add', args=[self.product.id])
+        response = client.get(url, {'quantity': 3, 'update': 'False'})
+        self.assertContains(response, '<option value="3" selected>')
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertEqual(client.get(reverse('cart:cart_summary')).json()['count'], 0)
+        token = response.context['csrf_token']
+        client.post(url, {'quantity': 3, 'update': 'False', 'csrfmiddlewaretoken': token})
+        self.assertEqual(client.get(reverse('cart:cart_summary')).json()['count'], 3)
+
+    @override_settings(CATALOG_STOCK_BUMP_INTERVAL=0)
+    def test_product_changes_and_sales_drop_cached_pages(self):
+        url = self.product.get_absolute_url()
+        self.client.get(url)
+        self.product.price = Decimal('24.50')
+        self.product.save()
+        self.assertContains(self.client.get(url), '24.50')
+        bulk_update_prices([Product(pk=self.product.pk, price=Decimal('30.00'), cost_price=Decimal('1.00'))])
+        self.assertContains(self.client.get(url), '30.00')
+        self.client.post(reverse('cart:cart_add', args=[self.product.id]), {'quantity': 3})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('orders:order_create'), {
+                'first_name': 'John', 'last_name': 'Doe', 'email': 'john@example.com',
+                'address': '1 Main St', 'postal_code': 'AB1 2CD', 'city': 'London',
+            })
+        self.assertContains(self.client.get(url), 'In Stock (7 available)')
+
+    @override_settings(CATALOG_STOCK_BUMP_INTERVAL=60)
+    def test_sales_bump_the_version_at_most_once_per_interval(self):
+        url = self.product.get_absolute_url()
+        order = {
+            'first_name': 'John', 'last_name': 'Doe', 'email': 'john@example.com',
+            'address': '1 Main St', 'postal_code': 'AB1 2CD', 'city': 'London',
+        }
+        version, _changed = CatalogVersion.current()
+        self.client.get(url)
+        self.client.post(reverse('cart:cart_add', args=[self.product.id]), {'quantity': 1})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('orders:order_create'), order)
+        # The product was just created: the sale waits for the interval.
+        self.assertEqual(CatalogVersion.current()[0], version)
+        self.assertContains(self.client.get(url), 'In Stock (10 available)')
+        CatalogVersion.objects.update(changed=timezone.now() - timedelta(seconds=61))
+        self.client.post(reverse('cart:cart_add', args=[self.product.id]), {'quantity': 1})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('orders:order_create'), order)
+        self.assertEqual(CatalogVersion.current()[0], version + 1)
+        self.assertContains(self.client.get(url), 'In Stock (8 available)')
+
+    @override_settings(CATALOG_STOCK_BUMP_INTERVAL=60)
+    def test_postponed_sale_changes_the_etag_after_the_interval(self):
+        url = self.product.get_absolute_url()
+        self.product.price = Decimal('24.50')
+        self.product.save()
+        etag = self.client.get(url)['ETag']
+        self.client.post(reverse('cart:cart_add', args=[self.product.id]), {'quantity': 1})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('orders:order_create'), {
+                'first_name': 'John', 'last_name': 'Doe', 'email': 'john@example.com',
+                'address': '1 Main St', 'postal_code': 'AB1 2CD', 'city': 'London',
+            })
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # The interval passes.
+        elapsed = timedelta(seconds=61)
+        CatalogVersion.objects.update(changed=F('changed') - elapsed, due=F('due') - elapsed)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertContains(response, 'In Stock (9 available)')
+        self.assertIsNone(CatalogVersion.objects.get().due)
+
+    def test_logged_in_users_get_fresh_private_pages(self):
+        User.objects.create_user(username='alice', password='testpass123')
+        self.client.get('/')
+        self.client.login(username='alice', password='testpass123')
+        response = self.client.get('/')
+        self.assertIn('private', response['Cache-Control'])
+        self.assertContains(response, 'Hello, alice!')
+
+
+class CatalogImportExportTest(TestCase):
+    """Tests for the import_catalog / export_catalog commands."""
+
+    def setUp(self):
+        self.cat = Category.objects.create(name='Tools', slug='tools')
+        self.hammer = Product.objects.create(
+            category=self.cat, name='Hammer', slug='hammer', description='Claw hammer',
+            cost_price=Decimal('8.00'), price=Decimal('19.99'), stock=10,
+            available=True, is_online=True,
+        )
+
+    def _import(self, content, suffix):
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(handle, 'w', encoding='utf-8') as stream:
+            stream.write(content)
+        self.addCleanup(os.remove, path)
+        call_command('import_catalog', path, batch_size=2, stdout=StringIO(), stderr=StringIO())
+
+    def test_export_jsonl_round_trips(self):
+        out = StringIO()
+        call_command('export_catalog', format='jsonl', stdout=out, stderr=StringIO())
+        Product.objects.all().delete()
+        self._import(out.getvalue(), '.jsonl')
+        product = Product.objects.get(slug='hammer')
+        self.assertEqual((product.name, product.price, product.stock), ('Hammer', Decimal('19.99'), 10))
+        self.assertEqual(product.category, self.cat)
+
+    def test_csv_import_upserts_by_slug(self):
+        self._import(
+            'slug,name,category_slug,category_name,price,cost_price,stock,is_online\n'
+            'hammer,Hammer,tools,,24.99,8.00,4,true\n'
+            'rake,Rake,garden,Garden,15.00,6.00,3,true\n'
+            'hoe,Hoe,garden,Garden,12.00,5.00,2,false\n',
+            '.csv',
+        )
+        self.hammer.refresh_from_db()
+        self.assertEqual((self.hammer.price, self.hammer.stock), (Decimal('24.99'), 4))
+        self.assertEqual(Product.objects.filter(category__slug='garden').count(), 2)
+        self.assertEqual(Product.objects.count(), 3)
+
+    def test_import_writes_price_history_in_bulk(self):
+        self._import(
+            'slug,name,category_slug,price,cost_price,stock\n'
+            'hammer,Hammer,tools,24.99,8.00,10\n'
+            'rake,Rake,garden,15.00,6.00,3\n',
+            '.csv',
+        )
+        self.assertEqual(
+            list(self.hammer.price_history.values_list('selling_price', flat=True)),
+            [Decimal('24.99'), Decimal('19.99')],
+        )
+        rake = Product.objects.get(slug='rake')
+        self.assertEqual(rake.price_history.get().reason, 'Initial price set')
+
+    def test_imported_products_are_searchable(self):
+        self._import('slug,name,category_slug,price\nwheelbarrow,Wheelbarrow,garden,45.00\n', '.csv')
+        Product.objects.filter(slug='wheelbarrow').update(is_online=True)
+        self.assertEqual(self.client.get('/search/', {'q': 'wheelbarrow'}).context['product_count'], 1)
+
+    def test_invalid_rows_are_skipped(self):
+        self._import('slug,name,category_slug,price\nbad,Bad,tools,abc\nok,Ok,tools,1.00\n', '.csv')
+        self.assertFalse(Product.objects.filter(slug='bad').exists())
+        self.assertTrue(Product.objects.filter(slug='ok').exists())
+
+    def test_malformed_json_lines_are_skipped(self):
+        self._import(
+            '["a", "b"]\n"text"\n42\n'
+            '{"slug": 7, "name": "Seven", "category_slug": "tools", "price": "1.00"}\n'
+            '{"slug": "neg", "name": "Neg", "category_slug": "tools", "price": "-1.00"}\n'
+            '{"slug": "nan", "name": "NaN", "category_slug": "tools", "price": "NaN"}\n'
+            '{"slug": "inf", "name": "Inf", "category_slug": "tools", "price": "1.00", "cost_price": "Infinity"}\n'
+            '{"slug": "ok", "name": "Ok", "category_slug": "tools", "price": "1.00"}\n',
+            '.jsonl',
+        )
+        self.assertEqual(sorted(Product.objects.values_list('slug', flat=True)), ['hammer', 'ok'])
+
+    def test_clean_row_reports_bad_values(self):
+        row = {'slug': 'x', 'name': 'X', 'category_slug': 'tools', 'price': '1.00'}
+        for bad, message in (
+            ([row], 'expected an object, got list'),
+            ({**row, 'price': '-0.01'}, 'price must not be negative'),
+            ({**row, 'cost_price': '-5'}, 'cost_price must not be negative'),
+            ({**row, 'price': 'inf'}, 'price must be a decimal'),
+            ({**row, 'name': ['X']}, 'name must be a string'),
+        ):
+            with self.assertRaisesMessage(CatalogRowError, message):
+                clean_row(bad)
+
+
+class ImageVariantTest(TestCase):
+    """Tests for the responsive image variant pipeline."""
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        override = override_settings(MEDIA_ROOT=media_root.name, PRODUCT_IMAGE_WIDTHS=(320, 640))
+        override.enable()
+        self.addCleanup(override.disable)
+        self.cat = Category.objects.create(name='Tools', slug='tools')
+
+    def _upload(self, width=800, height=600):
+        from PIL import Image
+        buffer = BytesIO()
+        Image.new('RGB', (width, height), 'red').save(buffer, 'JPEG')
+        return Product.objects.create(
+            category=self.cat, name='Drill', slug='drill', price=Decimal('10.00'), stock=5,
+            image=SimpleUploadedFile('drill.jpg', buffer.getvalue(), content_type='image/jpeg'),
+        )
+
+    def test_variant_names(self):
+        self.assertEqual(variant_name('products/a.JPG', 320), 'products/a-320w.jpg')
+        self.assertEqual(variant_name('products/a.jpg', 320, 'webp'), 'products/a-320w.webp')
+        self.assertTrue(is_variant('products/a-320w.webp'))
+        self.assertFalse(is_variant('products/a.jpg'))
+        self.assertFalse(is_variant('products/power-drill.jpg'))
+
+    def test_upload_generates_variants(self):
+        from PIL import Image
+        product = self._upload()
+        path = product.image.path
+        with Image.open(variant_name(path, 320)) as image:
+            self.assertEqual(image.size, (320, 240))
+        with Image.open(variant_name(path, 640, 'webp')) as image:
+            self.assertEqual(image.format, 'WEBP')
+        self.assertFalse(is_stale(path, (320, 640)))
+        self.assertEqual(generate_variants(path, (320, 640)), (0, [320, 640]))
+        self.assertEqual(product.image_widths, [320, 640])
+        self.assertEqual(Product.objects.get().image_widths, [320, 640])
+
+    def test_stale_variants_are_regenerated(self):
+        product = self._upload()
+        path = product.image.path
+        stamp = os.path.getmtime(path) + 10
+        os.utime(path, (stamp, stamp))
+        self.assertTrue(is_stale(path, (320, 640)))
+        self.assertEqual(generate_variants(path, (320, 640)), (4, [320, 640]))
+
+    def test_small_images_are_not_upscaled(self):
+        from PIL import Image
+        product = self._upload(width=400, height=300)
+        with Image.open(variant_name(product.image.path, 400)) as image:
+            self.assertEqual(image.size, (400, 300))
+        self.assertFalse(os.path.exists(variant_name(product.image.path, 640)))
+        self.assertEqual(product.image_widths, [320, 400])
+        self.assertRegex(build_srcset(product.image), r' 320w, .*-400w\.[0-9a-f]{12}\.jpg 400w$')
+
+    def test_srcset_in_api_and_card(self):
+        product = self._upload()
+        with mock.patch.object(default_storage, 'exists', side_effect=AssertionError('storage lookup')):
+            srcset = build_srcset(Product.objects.get().image, 'webp')
+        self.assertRegex(srcset, r'-320w\.[0-9a-f]{12}\.webp 320w, .*-640w\.[0-9a-f]{12}\.webp 640w$')
+
+        product.is_online = True
+        product.save()
+        data = APIClient().get(f'/api/products/{product.pk}/').data
+        self.assertIn('http://testserver/media/products/', data['image_srcset']['default'])
+        self.assertIn('640w', data['image_srcset']['webp'])
+        self.assertContains(self.client.get('/'), 'type="image/webp"')
+
+    def test_generate_image_variants_command(self):
+        product = self._upload()
+        os.remove(variant_name(product.image.path, 320))
+        Product.objects.update(image_widths=[])
+        out = StringIO()
+        call_command('generate_image_variants', workers=1, stdout=out)
+        self.assertTrue(os.path.exists(variant_name(product.image.path, 320)))
+        self.assertIn('1 image', out.getvalue())
+        self.assertEqual(Product.objects.get().image_widths, [320, 640])
+
+
+class HashedMediaStorageTest(TestCase):
+    """Tests for content-hashed media URLs and the media manifest."""
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        override = override_settings(MEDIA_ROOT=media_root.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.name = default_storage.save('products/sign.txt', SimpleUploadedFile('sign.txt', b'open'))
+
+    def _replace(self, content):
+        path = default_storage.path(self.name)
+        with open(path, 'wb') as stream:
+            stream.write(content)
+        stamp = os.path.getmtime(path) + 10
+        os.utime(path, (stamp, stamp))
+
+    def _serve(self, url):
+        path = url[len('/media/'):]
+        return serve_media(RequestFactory().get(url), path)
+
+    def test_url_contains_content_hash(self):
+        url = default_storage.url(self.name)
+        name, digest = split_hashed_name(url[len('/media/'):])
+        self.assertEqual(name, self.name)
+        self.assertEqual(digest, default_storage.file_hash(self.name))
+        self.assertTrue(os.path.exists(default_storage.manifest_path))
+        self.assertEqual(default_storage.url('products/missing.jpg'), '/media/products/missing.jpg')
+        # The hashed copy is on disk, for web servers that know nothing of the manifest.
+        with open(os.path.join(settings.MEDIA_ROOT, url[len('/media/'):]), 'rb') as stream:
+            self.assertEqual(stream.read(), b'open')
+
+    def test_url_only_reads_the_manifest(self):
+        old_url = default_storage.url(self.name)
+        self._replace(b'closed')
+        with mock.patch.object(default_storage, 'file_hash', side_effect=AssertionError('hashed on url()')):
+            with mock.patch.object(default_storage, 'save_manifest', side_effect=AssertionError('written on url()')):
+                self.assertEqual(default_storage.url(self.name), old_url)
+
+    def test_changed_file_gets_new_url(self):
+        old_url = default_storage.url(self.name)
+        self._replace(b'closed')
+        default_storage.update_manifest([self.name])
+        new_url = default_storage.url(self.name)
+        self.assertNotEqual(old_url, new_url)
+        # Pages still linking to the old URL get the old content.
+        self.assertEqual(b''.join(self._serve(old_url).streaming_content), b'open')
+        self.assertEqual(b''.join(self._serve(new_url).streaming_content), b'closed')
+
+        os.remove(os.path.join(settings.MEDIA_ROOT, old_url[len('/media/'):]))
+        response = self._serve(old_url)
+        self.assertEqual((response.status_code, response['Location']), (302, new_url))
+
+    def test_manifest_is_reloaded_when_rewritten_elsewhere(self):
+        default_storage.url(self.name)
+        other = type(default_storage)()
+        other.save('products/other.txt', SimpleUploadedFile('other.txt', b'other'))
+        self.assertIn('products/other.txt', default_storage.load_manifest())
+
+    def test_hashed_url_is_served_immutable(self):
+        response = self._serve(default_storage.url(self.name))
+        self.assertEqual(b''.join(response.streaming_content), b'open')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+        self.assertNotIn('immutable', self._serve('/media/products/sign.txt').get('Cache-Control', ''))
+
+    def test_manifest_updates_incrementally(self):
+        self.assertEqual(default_storage.update_manifest(), 0)
+        self._replace(b'closed')
+        default_storage.save('products/new.txt', SimpleUploadedFile('new.txt', b'new'))
+        out = StringIO()
+        call_command('update_media_manifest', stdout=out)
+        self.assertIn('1 entry changed, 2 file(s) tracked', out.getvalue())
+        new_url = default_storage.url('products/new.txt')
+        default_storage.delete('products/new.txt')
+        self.assertNotIn('products/new.txt', default_storage.load_manifest())
+        self.assertFalse(os.path.exists(os.path.join(settings.MEDIA_ROOT, new_url[len('/media/'):])))
+
+
+class RelatedProductsTest(TestCase):
+    """Tests for the co-purchase ("frequently bought together") engine."""
+
+    def setUp(self):
+        self.cat = Category.objects.create(name='Tools', slug='tools')
+        self.hammer, self.nails, self.saw, self.glue = [
+            Product.objects.create(
+                category=self.cat, name=name, slug=name.lower(), price=Decimal('5.00'),
+                stock=100, available=True, is_online=True,
+            )
+            for name in ('Hammer', 'Nails', 'Saw', 'Glue')
+        ]
+
+    def _order(self, *products, paid=True):
+        order = Order.objects.create(
+            first_name='A', last_name='B', email='a@example.com',
+            address='1 Street', postal_code='AB1', city='Town',
+        )
+        for product in products:
+            OrderItem.objects.create(order=order, product=product, price=product.price, quantity=1)
+        if paid:
+            order.paid = True
+            order.save()
+        return order
+
+    def _related(self, product):
+        return list(product.get_related_products(limit=10))
+
+    def test_count_pairs(self):
+        pairs = count_pairs([{3, 1, 2}, {1, 2}, {4}])
+        self.assertEqual(pairs, {(1, 2): 2, (1, 3): 1, (2, 3): 1})
+
+    def test_neighbours_ranked_by_co_purchase_count(self):
+        self._order(self.hammer, self.nails)
+        self._order(self.hammer, self.nails, self.saw)
+        self._order(self.hammer, self.glue, paid=False)
+        CoPurchaseEngine().run()
+        self.assertEqual(self._related(self.hammer), [self.nails, self.saw])
+        self.assertEqual(self._related(self.saw), [self.hammer, self.nails])
+        self.assertEqual(self._related(self.glue), [])
+
+    def test_incremental_run_folds_in_newly_paid_orders(self):
+        self._order(self.hammer, self.saw)
+        pending = self._order(self.hammer, self.nails, paid=False)
+        CoPurchaseEngine().run()
+        self._order(self.hammer, self.nails)
+        pending.paid = True
+        pending.save()
+
+        run = CoPurchaseEngine().run()
+        self.assertEqual((run.orders, run.full), (2, False))
+        pair = ProductCoPurchase.objects.get(product_a=self.hammer, product_b=self.nails)
+        self.assertEqual(pair.orders, 2)
+        self.assertEqual(self._related(self.hammer), [self.nails, self.saw])
+
+        self.assertEqual(CoPurchaseEngine().run().orders, 0)
+        pair.refresh_from_db()
+        self.assertEqual(pair.orders, 2)
+
+    def test_full_rebuild_matches_incremental(self):
+        self._order(self.hammer, self.saw)
+        CoPurchaseEngine().run()
+        self._order(self.hammer, self.saw, self.glue)
+        CoPurchaseEngine().run()
+        incremental = set(ProductCoPurchase.objects.values_list('product_a', 'product_b', 'orders'))
+        out = StringIO()
+        call_command('build_related_products', full=True, stdout=out)
+        self.assertEqual(set(ProductCoPurchase.objects.values_list('product_a', 'product_b', 'orders')), incremental)
+        self.assertTrue(CoPurchaseRun.objects.latest().full)
+
+    def test_api_and_detail_page(self):
+        self._order(self.hammer, self.nails)
+        self._order(self.hammer, self.saw)
+        self._order(self.hammer, self.saw)
+        CoPurchaseEngine().run()
+        self.nails.is_online = False
+        self.nails.save()
+
+        response = APIClient().get(f'/api/products/{self.hammer.id}/related/')
+        self.assertEqual([p['name'] for p in response.data], ['Saw'])
+        response = self.client.get(self.hammer.get_absolute_url())
+        self.assertEqual(list(response.context['related_products']), [self.saw])
+        self.assertContains(response, 'Frequently Bought Together')
+
+
+class PriceHistoryTrackingTest(TestCase):
+    """Tests for price-change tracking and bulk_update_prices."""
+
+    def setUp(self):
+        self.cat = Category.objects.create(name='Tools', slug='tools')
+        for i in range(5):
+            Product.objects.create(
+                category=self.cat, name=f'Product {i}', slug=f'product-{i}',
+                cost_price=Decimal('5.00'), price=Decimal('10.00'), stock=10,
+            )
+        self.product = Product.objects.get(slug='product-0')
+
+    def test_save_does_not_reread_the_row(self):
+        self.product.stock = 3
+        with CaptureQueriesContext(connection) as queries:
+            self.product.save()
+        self.assertFalse([q for q in queries if q['sql'].startswith('SELECT')])
+        self.assertEqual(self.product.price_history.count(), 1)
+
+    def test_price_change_is_recorded_once(self):
+        self.product.price = Decimal('12.00')
+        self.product.save()
+        self.product.save()
+        self.assertEqual(
+            list(self.product.price_history.values_list('selling_price', 'reason')),
+            [(Decimal('12.00'), 'Price updated'), (Decimal('10.00'), 'Initial price set')],
+        )
+
+    def test_unsaved_price_is_not_taken_as_baseline(self):
+        self.product.price = Decimal('12.00')
+        self.product.stock = 1
+        self.product.save(update_fields=['stock'])
+        self.product.save()
+        self.assertEqual(self.product.price_history.first().selling_price, Decimal('12.00'))
+
+    def test_deferred_prices_fall_back_to_query(self):
+        product = Product.objects.defer('price').get(pk=self.product.pk)
+        product.price = Decimal('11.00')
+        product.save()
+        self.assertEqual(self.product.price_history.first().selling_price, Decimal('11.00'))
+
+    def test_bulk_update_prices_writes_history_in_one_insert(self):
+        products = list(Product.objects.all())
+        for product in products[:4]:
+            product.price = Decimal('15.00')
+        with self.assertNumQueries(5):  # SAVEPOINT, UPDATE, INSERT, RELEASE, catalog version
+            changed = bulk_update_prices(products, reason='Repriced')
+        self.assertEqual(len(changed), 4)
+        self.assertEqual(ProductPriceHistory.objects.filter(reason='Repriced').count(), 4)
+        self.assertEqual(Product.objects.filter(price=Decimal('15.00')).count(), 4)
+        self.assertEqual(bulk_update_prices(products), [])
+
+
+class RepricingTest(TestCase):
+    """Tests for repricing rules, the reprice_products command and admin action."""
+
+    def setUp(self):
+        self.tools = Category.objects.create(name='Tools', slug='tools')
+        self.garden = Category.objects.create(name='Garden', slug='garden')
+        self.hammer = Product.objects.create(
+            category=self.tools, name='Hammer', slug='hammer',
+            cost_price=Decimal('10.00'), price=Decimal('20.00'), stock=5,
+        )
+        self.saw = Product.objects.create(
+            category=self.tools, name='Saw', slug='saw',
+            cost_price=Decimal('0.00'), price=Decimal('30.00'), stock=5,
+        )
+        self.rake = Product.objects.create(
+            category=self.garden, name='Rake', slug='rake',
+            cost_price=Decimal('6.00'), price=Decimal('12.00'), stock=5,
+        )
+
+    def _prices(self):
+        return dict(Product.objects.values_list('slug', 'price'))
+
+    def test_rules(self):
+        self.assertEqual(PriceRule('percent', 5).apply(Decimal('20.00'), Decimal('10.00')), Decimal('21.00'))
+        self.assertEqual(PriceRule('percent', -10, '0.99').apply(Decimal('20.00'), Decimal('10.00')), Decimal('18.99'))
+        self.assertEqual(PriceRule('margin', 40).apply(Decimal('20.00'), Decimal('10.00')), Decimal('14.00'))
+        self.assertIsNone(PriceRule('margin', 40).apply(Decimal('20.00'), Decimal('0.00')))
+        self.assertEqual(PriceRule('margin', 40).evaluate(Decimal('20.00'), Decimal('0.00')), (None, PriceRule.NO_COST_PRICE))
+        self.assertEqual(PriceRule('percent', 5).evaluate(Decimal('0.00'), Decimal('10.00')), (None, PriceRule.NO_PRICE))
+        self.assertEqual(PriceRule('percent', -100).evaluate(Decimal('20.00'), Decimal('10.00')), (None, PriceRule.BELOW_MINIMUM))
+        with self.assertRaises(ValueError):
+            PriceRule('markup', 5)
+
+    def test_plan_and_apply_in_bulk(self):
+        changes, skipped = plan_repricing(Product.objects.filter(category=self.tools), PriceRule('margin', 50))
+        self.assertEqual(skipped, [(self.saw.id, 'Saw', PriceRule.NO_COST_PRICE)])
+        self.assertEqual([(c.name, c.old_price, c.new_price) for c in changes], [('Hammer', Decimal('20.00'), Decimal('15.00'))])
+        self.assertEqual((changes[0].old_margin, changes[0].new_margin), (Decimal('100.0'), Decimal('50.0')))
+
+        products = Product.objects.filter(category=self.tools)
+        changes, _ = plan_repricing(products, PriceRule('percent', 10))
+        with self.assertNumQueries(5):  # SAVEPOINT, UPDATE, INSERT, RELEASE, catalog version
+            self.assertEqual(apply_repricing(changes, reason='Tools +10%'), 2)
+        self.assertEqual(self._prices(), {'hammer': Decimal('22.00'), 'saw': Decimal('33.00'), 'rake': Decimal('12.00')})
+        self.assertEqual(ProductPriceHistory.objects.filter(reason='Tools +10%').count(), 2)
+
+    def test_command_dry_run_and_apply(self):
+        out = StringIO()
+        call_command('reprice_products', '--category', 'tools', '--percent', '5', '--dry-run', stdout=out)
+        self.assertIn('Hammer', out.getvalue())
+        self.assertIn('2 product(s) would be repriced', out.getvalue())
+        self.assertEqual(self._prices()['hammer'], Decimal('20.00'))
+
+        out = StringIO()
+        call_command('reprice_products', '--all', '--margin', '100', stdout=out)
+        self.assertIn('Skipped 1 product(s) without a cost price', out.getvalue())
+        self.assertEqual(self._prices(), {'hammer': Decimal('20.00'), 'saw': Decimal('30.00'), 'rake': Decimal('12.00')})
+        call_command('reprice_products', '--all', '--margin=50', stdout=StringIO())
+        self.assertEqual(self._prices(), {'hammer': Decimal('15.00'), 'saw': Decimal('30.00'), 'rake': Decimal('9.00')})
+
+    def test_command_reports_why_products_were_skipped(self):
+        Product.objects.filter(pk=self.rake.pk).update(price=0)
+        out = StringIO()
+        call_command('reprice_products', '--all', '--percent', '-100', '--dry-run', stdout=out)
+        self.assertIn(
+            'Skipped 2 product(s) that the rule would price below £0.01, 1 product(s) without a price to adjust',
+            out.getvalue(),
+        )
+
+    def test_admin_action_previews_then_applies(self):
+        admin_user = User.objects.create_superuser('boss', 'boss@example.com', 'pass123')
+        self.client.force_login(admin_user)
+        data = {'action': 'reprice', 'index': 0, '_selected_action': [self.hammer.id, self.rake.id]}
+
+        response = self.client.post('/admin/products/product/', data)
+        self.assertContains(response, 'Reprice 2 selected products')
+
+        data.update({'rule': 'percent', 'value': '10', 'ending': '', 'reason': '', 'preview': '1'})
+        response = self.client.post('/admin/products/product/', data)
+        self.assertEqual(len(response.context['changes']), 2)
+        self.assertEqual(self._prices()['hammer'], Decimal('20.00'))
+
+        del data['preview']
+        data['apply'] = '1'
+        response = self.client.post('/admin/products/product/', data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self._prices(), {'hammer': Decimal('22.00'), 'saw': Decimal('30.00'), 'rake': Decimal('13.20')})
+        self.assertEqual(self.hammer.price_history.first().changed_by, admin_user)
+
+
+class AdminChangelistQueryTest(TestCase):
+    """Admin changelists run a fixed number of queries however many rows they show."""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('boss', 'boss@example.com', 'pass123'))
+        self.batches = 0
+
+    def _add_rows(self, count):
+        """Add `count` categories, each with a product, review, sale and price change."""
+        for _ in range(count):
+            self.batches += 1
+            i = self.batches
+            category = Category.objects.create(name=f'Category {i}', slug=f'category-{i}')
+            product = Product.objects.create(
+                category=category, name=f'Product {i}', slug=f'product-{i}',
+                cost_price=Decimal('10.00'), price=Decimal(10 + i), stock=5,
+            )
+            user = User.objects.create_user(username=f'customer{i}', password='pass123')
+            ProductReview.objects.create(product=product, user=user, rating=(i % 5) + 1, comment='ok')
+            Sale.objects.create(category=category, item=product, sold_price=product.price, quantity=2)
+
+    def _query_counts(self, url):
+        self._add_rows(2)
+        with CaptureQueriesContext(connection) as few:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self._add_rows(10)
+        with CaptureQueriesContext(connection) as many:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(few), len(many)
+
+    def test_product_changelist(self):
+        few, many = self._query_counts('/admin/products/product/')
+        self.assertEqual(few, many)
+
+    def test_category_changelist(self):
+        few, many = self._query_counts('/admin/products/category/')
+        self.assertEqual(few, many)
+
+    def test_sale_changelist(self):
+        few, many = self._query_counts('/admin/products/sale/')
+        self.assertEqual(few, many)
+
+    def test_review_changelist(self):
+        few, many = self._query_counts('/admin/products/productreview/')
+        self.assertEqual(few, many)
+
+    def test_price_history_changelist(self):
+        few, many = self._query_counts('/admin/products/productpricehistory/')
+        self.assertEqual(few, many)
+
+    def test_product_columns_sort_by_annotations(self):
+        self._add_rows(3)
+        changelist = self.client.get('/admin/products/product/', {'o': '-7'}).context['cl']
+        self.assertEqual([p.name for p in changelist.result_list], ['Product 3', 'Product 2', 'Product 1'])
+        self.assertEqual(changelist.result_list[0].margin_value, 30.0)
+        categories = self.client.get('/admin/products/category/', {'o': '3'}).context['cl'].result_list
+        self.assertEqual([c.num_products for c in categories], [1, 1, 1])
+
+
+class DashboardStatisticsTest(TestCase):
+    """The admin dashboard reads a materialized statistics row kept current by signals."""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser('boss', 'boss@example.com', 'pass123')
+        self.category = Category.objects.create(name='Tools', slug='tools')
+        self.drill = Product.objects.create(
+            category=self.category, name='Drill', slug='drill', price=Decimal('25.50'), stock=0, is_online=True,
+        )
+        self.saw = Product.objects.create(
+            category=self.category, name='Saw', slug='saw', price=Decimal('10.00'), stock=5, is_online=False,
+        )
+
+    def _order(self, paid, *lines):
+        order = Order.objects.create(
+            first_name='A', last_name='B', email='a@example.com',
+            address='1 Street', postal_code='AB1', city='Town',
+        )
+        for product, quantity in lines:
+            OrderItem.objects.create(order=order, product=product, price=product.price, quantity=quantity)
+        if paid:
+            order.paid = True
+            order.save()
+        return order
+
+    def test_refresh_aggregates(self):
+        self._order(True, (self.drill, 2), (self.saw, 1))
+        self._order(False, (self.saw, 4))
+        stats = DashboardStatistics.refresh()
+        self.assertEqual(stats.total_products, 2)
+        self.assertEqual((stats.products_online, stats.products_warehouse), (1, 1))
+        self.assertEqual((stats.out_of_stock, stats.low_stock), (1, 1))
+        self.assertEqual((stats.total_orders, stats.paid_orders, stats.pending_orders), (2, 1, 1))
+        self.assertEqual(stats.total_revenue, Decimal('61.00'))
+        self.assertEqual(stats.total_items_sold, 3)
+        self.assertEqual((stats.total_users, stats.registered_customers), (1, 0))
+        self.assertFalse(stats.stale)
+
+    def test_signals_mark_stale(self):
+        DashboardStatistics.refresh()
+        order = self._order(False, (self.drill, 1))
+        self.assertTrue(DashboardStatistics.objects.get().stale)
+
+        DashboardStatistics.refresh()
+        order.paid = True
+        order.save()
+        self.assertTrue(DashboardStatistics.objects.get().stale)
+        self.assertEqual(DashboardStatistics.get_current().total_revenue, Decimal('25.50'))
+
+        self.saw.delete()
+        self.assertEqual(DashboardStatistics.get_current().total_products, 1)
+
+    def test_dashboard_reads_snapshot(self):
+        self._order(True, (self.drill, 2))
+        self.client.force_login(self.admin)
+        self.client.get('/admin/')
+        with CaptureQueriesContext(connection) as cached:
+            response = self.client.get('/admin/')
+        self.assertContains(response, '£51.00')
+        statistics_queries = [q for q in cached.captured_queries if 'dashboardstatistics' in q['sql']]
+        self.assertEqual(len(statistics_queries), 1)
+        self.assertFalse(any('orders_orderitem' in q['sql'] for q in cached.captured_queries))
+
+    def test_expired_snapshot_is_refreshed(self):
+        DashboardStatistics.refresh()
+        Product.objects.filter(pk=self.saw.pk).update(is_online=True)
+        self.assertEqual(DashboardStatistics.get_current().products_online, 1)
+        self.assertEqual(DashboardStatistics.get_current(max_age=0).products_online, 2)
+
+    def test_row_without_a_refresh_is_refreshed(self):
+        # As left by a refresh() still running its aggregates elsewhere.
+        DashboardStatistics.objects.create(pk=DashboardStatistics.SINGLETON_ID, stale=False)
+        stats = DashboardStatistics.get_current()
+        self.assertEqual(stats.total_products, 2)
+        self.assertIsNotNone(stats.refreshed)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('refresh_dashboard_stats', stdout=out)
+        self.assertIn('2 products', out.getvalue())
+        self.assertFalse(DashboardStatistics.objects.get().stale)
+
+
+class SalesRollupTest(TestCase):
+    """Sale rows are rolled up per day, category and product as they are written."""
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Tools', slug='tools')
+        self.drill = Product.objects.create(
+            category=self.category, name='Drill', slug='drill',
+            cost_price=Decimal('6.00'), price=Decimal('10.00'), stock=50,
+        )
+        self.saw = Product.objects.create(
+            category=self.category, name='Saw', slug='saw',
+            cost_price=Decimal('3.00'), price=Decimal('5.00'), stock=50,
+        )
+
+    def _sale(self, product, quantity, days_ago=0):
+        sale = Sale.objects.create(category=self.category, item=product, sold_price=product.price, quantity=quantity)
+        if days_ago:
+            Sale.objects.filter(pk=sale.pk).update(date=sale.date - timedelta(days=days_ago))
+        return sale
+
+    def _rollup_rows(self):
+        return sorted(SalesDailyRollup.objects.values_list('date', 'product_id', 'revenue', 'cost', 'units', 'sales'))
+
+    def test_sales_are_rolled_up_incrementally(self):
+        self._sale(self.drill, 2)
+        self._sale(self.drill, 1)
+        self._sale(self.saw, 4)
+        rollup = SalesDailyRollup.objects.get(product=self.drill)
+        self.assertEqual((rollup.revenue, rollup.cost, rollup.units, rollup.sales), (Decimal('30.00'), Decimal('18.00'), 3, 2))
+        self.assertEqual(SalesDailyRollup.objects.count(), 2)
+
+    def test_edit_and_delete_adjust_rollup(self):
+        sale = self._sale(self.drill, 2)
+        sale.quantity = 5
+        sale.save()
+        self.assertEqual(SalesDailyRollup.objects.get().units, 5)
+        sale.delete()
+        rollup = SalesDailyRollup.objects.get()
+        self.assertEqual((rollup.revenue, rollup.units, rollup.sales), (Decimal('0.00'), 0, 0))
+
+    def test_paid_order_rolls_up_its_sales(self):
+        order = Order.objects.create(
+            first_name='A', last_name='B', email='a@example.com',
+            address='1 Street', postal_code='AB1', city='Town',
+        )
+        OrderItem.objects.create(order=order, product=self.drill, price=Decimal('9.00'), quantity=3)
+        order.paid = True
+        order.save()
+        self.assertEqual(SalesDailyRollup.objects.get().revenue, Decimal('27.00'))
+
+    def test_rebuild_matches_incremental(self):
+        self._sale(self.drill, 2)
+        self._sale(self.saw, 1, days_ago=3)
+        self._sale(self.saw, 2, days_ago=3)
+        # Back-dated sales were rolled up under today; the rebuild moves them.
+        self.assertEqual(rebuild_rollups(), 2)
+        incremental = self._rollup_rows()
+        self.assertEqual(incremental[0][1:], (self.saw.pk, Decimal('15.00'), Decimal('9.00'), 3, 2))
+        SalesDailyRollup.objects.all().delete()
+        call_command('rebuild_sales_rollups', stdout=StringIO())
+        self.assertEqual(self._rollup_rows(), incremental)
+
+    def test_summary_windows_multiply_quantity(self):
+        self._sale(self.drill, 3)
+        self._sale(self.saw, 2, days_ago=10)
+        self._sale(self.saw, 1, days_ago=100)
+        rebuild_rollups()
+        summary = sales_summary()
+        self.assertEqual(summary['today'], {'revenue': Decimal('30.00'), 'count': 1})
+        self.assertEqual(summary['week']['revenue'], Decimal('30.00'))
+        self.assertEqual(summary['month'], {'revenue': Decimal('40.00'), 'count': 2})
+        self.assertEqual(summary['year'], {'revenue': Decimal('45.00'), 'count': 3})
+
+    def test_report_buckets(self):
+        self._sale(self.drill, 1)
+        self._sale(self.saw, 2, days_ago=40)
+        rebuild_rollups()
+        rows = sales_report('month')
+        self.assertEqual(sum(row['revenue'] for row in rows), Decimal('20.00'))
+        self.assertTrue(all(row['period'].day == 1 for row in rows))
+        self.assertEqual(sales_report('day', product=self.saw)[0]['units'], 2)
+
+    def test_sale_changelist_reads_rollups(self):
+        self._sale(self.drill, 3)
+        self.client.force_login(User.objects.create_superuser('boss', 'boss@example.com', 'pass123'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/admin/products/sale/')
+        self.assertEqual(response.context['today_sales'], Decimal('30.00'))
+        self.assertEqual(response.context['week_count'], 1)
+        self.assertEqual(sum('products_salesdailyrollup' in q['sql'] for q in queries.captured_queries), 1)
+
+
+class InventoryLedgerTest(TestCase):
+    """Stock changes are appended to the inventory ledger and snapshotted."""
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Tools', slug='tools')
+        self.drill = Product.objects.create(
+            category=self.category, name='Drill', slug='drill', price=Decimal('10.00'), stock=10,
+        )
+
+    def _movements(self):
+        return list(self.drill.inventory_movements.order_by('id').values_list('delta', 'reason', 'reference'))
+
+    def test_saves_record_stock_changes(self):
+        product = Product.objects.get(pk=self.drill.pk)
+        product.stock = 7
+        product._stock_reference = 'stock take'
+        product.save()
+        product.price = Decimal('11.00')
+        product.save()
+        product.save(update_fields=['stock'])
+        self.assertEqual(self._movements(), [
+            (10, 'initial', ''),
+            (-3, 'adjustment', 'stock take'),
+        ])
+
+    def test_admin_edit_records_user(self):
+        User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.login(username='admin', password='pw')
+        self.client.post(f'/admin/products/product/{self.drill.pk}/change/', {
+            'name': 'Drill', 'slug': 'drill', 'category': self.category.pk, 'description': '',
+            'cost_price': '0.00', 'price': '10.00', 'stock': 4, 'available': 'on',
+            'price_history-TOTAL_FORMS': 0, 'price_history-INITIAL_FORMS': 0,
+            'reviews-TOTAL_FORMS': 0, 'reviews-INITIAL_FORMS': 0,
+        })
+        self.assertEqual(self._movements()[-1], (-6, 'adjustment', 'admin: admin'))
+
+    def test_import_records_movements_in_bulk(self):
+        handle, path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(handle, 'w', encoding='utf-8') as stream:
+            stream.write('slug,name,category_slug,price,stock\ndrill,Drill,tools,10.00,4\nsaw,Saw,tools,5.00,3\n')
+        self.addCleanup(os.remove, path)
+        call_command('import_catalog', path, stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(self._movements()[-1], (-6, 'import', 'catalog import'))
+        saw = Product.objects.get(slug='saw')
+        self.assertEqual(list(saw.inventory_movements.values_list('delta', flat=True)), [3])
+
+    def test_stock_at_uses_snapshot_plus_tail(self):
+        now = timezone.now()
+        InventoryMovement.objects.update(created=now - timedelta(days=3))
+        self.drill.stock = 7
+        self.drill.save()
+        InventoryMovement.objects.filter(delta=-3).update(created=now - timedelta(days=2))
+        self.assertEqual(take_snapshots(), 1)
+        InventorySnapshot.objects.update(taken=now - timedelta(days=1))
+        self.drill.stock = 12
+        self.drill.save()
+
+        levels = [stock_at(now - timedelta(days=days), [self.drill.pk])[self.drill.pk] for days in (2.5, 1.5, 0.5)]
+        self.assertEqual(levels, [10, 7, 7])
+        # Movements folded into the snapshot are no longer read.
+        snapshot = InventorySnapshot.objects.get()
+        InventoryMovement.objects.filter(id__lte=snapshot.last_movement_id).delete()
+        with self.assertNumQueries(1):
+            self.assertEqual(stock_at(timezone.now()), {self.drill.pk: 12})
+        self.assertEqual(take_snapshots(), 1)
+        self.assertEqual(take_snapshots(), 0)
+        self.assertEqual(InventorySnapshot.objects.latest().stock, 12)
+
+    def test_reconcile_reports_and_fixes_drift(self):
+        Product.objects.filter(pk=self.drill.pk).update(stock=8)
+        self.assertEqual(reconcile_stock(), [(self.drill.pk, 'Drill', 10, 8)])
+        out = StringIO()
+        call_command('snapshot_inventory', reconcile=True, fix=True, stdout=out)
+        self.assertIn('Recorded 1 correction movement(s)', out.getvalue())
+        self.assertEqual(reconcile_stock(), [])
+        self.assertEqual(InventorySnapshot.objects.get().stock, 8)
@@ -1,92 +1,94 @@
 """
 Products Views
 Function-based views for product listing (with category filtering),
-product detail (with reviews and ratings), and product search.
+product detail (with reviews and ratings), and product search. All three
+are served from the catalog page cache for anonymous visitors (see
+pagecache.py).
 """
+from django.core.paginator import Paginator
 from django.shortcuts import render, get_object_or_404
-from django.db.models import Q
 from .models import Category, Product
+from .pagecache import cache_anonymous_page
+from .search import get_search_backend
 from cart.forms import CartAddProductForm
 
+# Products per storefront list/category page
+PRODUCTS_PER_PAGE = 24
+
+# Reviews per page on the product detail page
+REVIEWS_PER_PAGE = 10
+
+# "Frequently bought together" products on the product detail page
+RELATED_PRODUCTS_ON_PAGE = 4
+
 # Create your views here.
 
+@cache_anonymous_page
 def product_list(request, category_slug=None):
     category = None
     categories = Category.objects.all()
-    products = Product.objects.filter(available=True, is_online=True)
+    products = Product.objects.filter(available=True, is_online=True).select_related('category')
     if category_slug:
         category = get_object_or_404(Category, slug=category_slug)
         products = products.filter(category=category)
+    page_obj = Paginator(products, PRODUCTS_PER_PAGE).get_page(request.GET.get('page'))
     return render(request, 'products/product/list.html', {
         'category': category,
         'categories': categories,
-        'products': products
+        'products': page_obj,
+        'page_obj': page_obj,
     })
 
 
+@cache_anonymous_page
 def product_detail(request, id, slug):
-    product = get_object_or_404(Product, id=id, slug=slug, available=True, is_online=True)
+    # One query: product + category + stored rating aggregates.
+    product = get_object_or_404(
+        Product.objects.select_related('category', 'rating_summary'),
+        id=id, slug=slug, available=True, is_online=True,
+    )
     cart_product_form = CartAddProductForm()
     
-    # Get reviews for this product
-    reviews = product.reviews.all()
     average_rating = product.get_average_rating()
     rating_count = product.get_rating_count()
     rating_distribution = product.get_rating_distribution()
     
+    # One page of reviews, newest first, via the (product, -created) index.
+    # The stored rating count stands in for the paginator's COUNT(*).
+    paginator = Paginator(
+        product.reviews.select_related('user').order_by('-created', '-id'),
+        REVIEWS_PER_PAGE,
+    )
+    paginator.count = rating_count
+    reviews = paginator.get_page(request.GET.get('page'))
+    
+    # Precomputed by the build_related_products command.
+    related_products = product.get_related_products(RELATED_PRODUCTS_ON_PAGE)
+    
     return render(request, 'products/product/detail.html', {
         'product': product,
         'cart_product_form': cart_product_form,
         'reviews': reviews,
+        'related_products': related_products,
         'average_rating': average_rating,
         'rating_count': rating_count,
         'rating_distribution': rating_distribution,
     })
 
 
+@cache_anonymous_page
 def product_search(request):
     query = request.GET.get('q', '')
     products = []
     categories = Category.objects.all()
     
     if query:
-        # Search primarily in product name, with weighted relevance
-        # First get products with name matches (higher priority)
-        name_matches = Product.objects.filter(
-            name__icontains=query,
-            available=True,
-            is_online=True
-        )
-        
-        # Then get products with description matches (lower priority)
-        # Split query into words for better matching
-        query_words = query.lower().split()
-        
-        if len(query_words) == 1:
-            # Single word: only search if it's substantial (more than 3 chars)
-            if len(query_words[0]) > 3:
-                desc_matches = Product.objects.filter(
-                    description__icontains=query,
-                    available=True,
-                    is_online=True
-                ).exclude(id__in=name_matches.values_list('id', flat=True))
-            else:
-                desc_matches = Product.objects.none()
-        else:
-            # Multiple words: require at least 2 words to match in description
-            desc_query = Q()
-            for word in query_words:
-                if len(word) > 2:  # Skip very short words
-                    desc_query &= Q(description__icontains=word)
-            
-            desc_matches = Product.objects.filter(
-                desc_query,
-                available=True,
-                is_online=True
-            ).exclude(id__in=name_matches.values_list('id', flat=True))
-        
-        # Combine results: name matches first, then description matches
-        products = list(name_matches) + list(desc_matches)
+        # Ranked by the search backend: name matches weigh more than
+        # description matches (BM25 with the FTS5 backend).
+        products = list(get_search_backend().search(
+            Product.objects.filter(available=True, is_online=True).select_related('category'),
+            query,
+        ))
     
     return render(request, 'products/product/search.html', {
         'query': query,
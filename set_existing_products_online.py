@@ -9,7 +9,7 @@ import django
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'xyz_store.settings')
 django.setup()
 
-from products.models import Product
+from products.models import CatalogVersion, Product
 
 def set_products_online():
     """Set all existing products to online status"""
@@ -18,6 +18,8 @@ def set_products_online():
     
     # Update all products to be online
     updated = Product.objects.all().update(is_online=True)
+    # queryset.update() sends no signals; retire cached catalog pages and ETags
+    CatalogVersion.bump()
     
     print(f"SUCCESS: Set {updated} products to ONLINE status")
     print("=" * 60)
@@ -1,7 +1,8 @@
 """
 Custom Admin Site
 Defines CustomAdminSite with a statistics dashboard showing product counts,
-stock status, order statistics, revenue, and user summaries.
+stock status, order statistics, revenue, and user summaries. The figures
+are read from the materialized DashboardStatistics row.
 """
 from django.contrib import admin
 
@@ -14,27 +15,10 @@ class CustomAdminSite(admin.AdminSite):
         extra_context = extra_context or {}
         
         # Import models here to avoid circular imports
-        from products.models import Product, Category
-        from orders.models import Order, OrderItem
-        from django.contrib.auth.models import User
+        from products.models import DashboardStatistics
         
-        # Gather statistics
-        stats = {
-            'total_products': Product.objects.count(),
-            'products_online': Product.objects.filter(is_online=True).count(),
-            'products_warehouse': Product.objects.filter(is_online=False).count(),
-            'available_products': Product.objects.filter(available=True).count(),
-            'out_of_stock': Product.objects.filter(stock=0).count(),
-            'low_stock': Product.objects.filter(stock__lte=10, stock__gt=0).count(),
-            'total_categories': Category.objects.count(),
-            'total_users': User.objects.count(),
-            'registered_customers': User.objects.filter(is_staff=False).count(),
-            'total_orders': Order.objects.count(),
-            'paid_orders': Order.objects.filter(paid=True).count(),
-            'pending_orders': Order.objects.filter(paid=False).count(),
-            'total_revenue': sum(order.get_total_cost() for order in Order.objects.filter(paid=True)),
-            'total_items_sold': sum(item.quantity for item in OrderItem.objects.filter(order__paid=True)),
-        }
+        # One row, kept current by signals (see DashboardStatistics)
+        stats = DashboardStatistics.get_current()
         
         extra_context['statistics'] = stats
         
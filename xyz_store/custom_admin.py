@@ -19,6 +19,7 @@ class CustomAdminSite(AdminSite):
         from products.models import Product, Category
         from orders.models import Order, OrderItem
         from django.contrib.auth.models import User
+        from django.db.models import Sum
         from decimal import Decimal
         
         # Gather statistics
@@ -33,7 +34,7 @@ class CustomAdminSite(AdminSite):
             'total_orders': Order.objects.count(),
             'paid_orders': Order.objects.filter(paid=True).count(),
             'pending_orders': Order.objects.filter(paid=False).count(),
-            'total_revenue': sum(order.get_total_cost() for order in Order.objects.filter(paid=True)),
+            'total_revenue': Order.objects.filter(paid=True).aggregate(total=Sum('total_cost', default=0))['total'],
             'total_items_sold': sum(item.quantity for item in OrderItem.objects.filter(order__paid=True)),
         }
         
@@ -116,6 +116,30 @@ DATABASES = {
     }
 }
 
+# Cache used for template fragments (product cards). Local memory per process;
+# switch to Redis/Memcached when running several workers.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'xyzshop',
+    }
+}
+
+# Seconds anonymous catalog pages (product list, detail, search) are served
+# from the cache above; product, category and review changes drop them.
+# 0 disables the page cache (see products/pagecache.py).
+CATALOG_PAGE_CACHE_TIMEOUT = 60
+
+# Checkouts bump the catalog version (and so retire cached pages and ETags)
+# at most once per this many seconds; a sale inside the interval is applied
+# at its end, so stock counts on catalog pages lag by at most this long.
+# 0 bumps on every checkout (see orders/checkout.py).
+CATALOG_STOCK_BUMP_INTERVAL = 60
+
+# Product search backend (see products/search.py). The FTS5 index is
+# SQLite-only; use 'products.search.IcontainsSearchBackend' on other databases.
+PRODUCT_SEARCH_BACKEND = 'products.search.SQLiteFTS5Backend'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -163,14 +187,31 @@ WHITENOISE_USE_FINDERS = True
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Uploaded media gets content-hashed URLs (products/drill.3f2a9c1b0d4e.jpg),
+# tracked in MEDIA_ROOT/manifest.json; see xyz_store/storage.py.
+STORAGES = {
+    'default': {
+        'BACKEND': 'xyz_store.storage.HashedMediaStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Cart session settings
+# Carts saved in the session under this key by earlier releases are moved
+# into the cart store on first use.
 CART_SESSION_ID = 'cart'
 
+# Where cart lines live: 'cart.stores.DatabaseCartStore' (CartLine rows) or
+# 'cart.stores.MemoryCartStore' (per-process LRU, for tests and development)
+CART_STORE = 'cart.stores.DatabaseCartStore'
+
 # Django REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
@@ -180,7 +221,8 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    # Page-number pages by default; ?cursor= switches to keyset pagination.
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.KeysetOrPageNumberPagination',
     'PAGE_SIZE': 20,
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
@@ -0,0 +1,192 @@
+"""
+Hashed Media Storage
+FileSystemStorage for uploaded media that records a content hash per file
+in a JSON manifest (MEDIA_ROOT/manifest.json) and puts it in the file's
+URL: products/drill.jpg -> /media/products/drill.3f2a9c1b0d4e.jpg. Like
+ManifestStaticFilesStorage, a copy of the file is written under that
+hashed name, so any web server serving MEDIA_ROOT serves the URLs as is.
+
+A changed image always gets a new URL, so media responses can be cached
+by browsers for a year as immutable; copies under earlier hashes are
+kept for pages that still link to them. Manifest entries remember the
+file's mtime and size; a file is re-hashed only when those change, on
+upload or by update_media_manifest (run it after files are replaced
+outside the storage API; image variants do it themselves). url() only
+reads the manifest, re-loading it when another process has rewritten it.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import FileSystemStorage
+
+# Cache-Control max-age for content-hashed media URLs (one year).
+HASHED_MEDIA_MAX_AGE = 60 * 60 * 24 * 365
+
+HASHED_NAME_RE = re.compile(r'^(?P<stem>.+)\.(?P<hash>[0-9a-f]{12})(?P<ext>\.[^./]+)$')
+
+
+def is_hashed_copy(name):
+    """True for the content-hashed copies HashedMediaStorage writes."""
+    return HASHED_NAME_RE.match(os.path.basename(name)) is not None
+
+
+def split_hashed_name(name):
+    """'products/a.3f2a9c1b0d4e.jpg' -> ('products/a.jpg', '3f2a9c1b0d4e'); (name, None) if unhashed."""
+    match = HASHED_NAME_RE.match(name)
+    if not match:
+        return name, None
+    return match['stem'] + match['ext'], match['hash']
+
+
+class HashedMediaStorage(FileSystemStorage):
+    """
+    Media storage whose url() returns content-hashed names.
+    Files missing from disk fall back to the plain, unhashed URL.
+    """
+    manifest_name = 'manifest.json'
+    manifest_version = 1
+    hash_length = 12
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock = threading.Lock()
+        self._manifest = None
+        # (MEDIA_ROOT, manifest mtime) the loaded manifest was read from
+        self._manifest_source = None
+
+    # Manifest -------------------------------------------------------------
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.location, self.manifest_name)
+
+    def _manifest_stamp(self):
+        try:
+            return self.location, os.stat(self.manifest_path).st_mtime_ns
+        except OSError:
+            return self.location, None
+
+    def load_manifest(self):
+        """{name: [hash, mtime_ns, size]}, re-read only when manifest.json changes."""
+        source = self._manifest_stamp()
+        if self._manifest is None or self._manifest_source != source:
+            try:
+                with open(self.manifest_path, encoding='utf-8') as stream:
+                    data = json.load(stream)
+                files = data['files'] if data.get('version') == self.manifest_version else {}
+            except (OSError, ValueError, KeyError):
+                files = {}
+            self._manifest = files
+            self._manifest_source = source
+        return self._manifest
+
+    def save_manifest(self):
+        """Write the manifest atomically so readers never see a partial file."""
+        os.makedirs(self.location, exist_ok=True)
+        payload = json.dumps({'version': self.manifest_version, 'files': self._manifest}, sort_keys=True)
+        temp_path = f'{self.manifest_path}.{os.getpid()}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as stream:
+            stream.write(payload)
+        os.replace(temp_path, self.manifest_path)
+        self._manifest_source = self._manifest_stamp()
+
+    def file_hash(self, name):
+        digest = hashlib.md5(usedforsecurity=False)
+        with self.open(name, 'rb') as stream:
+            for chunk in stream.chunks():
+                digest.update(chunk)
+        return digest.hexdigest()[:self.hash_length]
+
+    def _refresh_entry(self, manifest, name):
+        """
+        Bring one manifest entry, and the hashed copy it names, up to date.
+        Returns True if it changed.
+        """
+        try:
+            stat = os.stat(self.path(name))
+        except (OSError, SuspiciousFileOperation):
+            entry = manifest.pop(name, None)
+            if entry is None:
+                return False
+            self._remove_copy(name, entry[0])
+            return True
+        entry = manifest.get(name)
+        if entry and entry[1:] == [stat.st_mtime_ns, stat.st_size]:
+            # manifests from before hashed copies were written have none
+            self._write_copy(name, entry[0])
+            return False
+        digest = self.file_hash(name)
+        self._write_copy(name, digest)
+        manifest[name] = [digest, stat.st_mtime_ns, stat.st_size]
+        return True
+
+    def _write_copy(self, name, digest):
+        """Copy the file to its hashed name (via a temp file, so it appears whole)."""
+        target = self.path(self._hashed(name, digest))
+        if os.path.exists(target):
+            return
+        temp_path = f'{target}.{os.getpid()}.tmp'
+        shutil.copyfile(self.path(name), temp_path)
+        os.replace(temp_path, target)
+
+    def _remove_copy(self, name, digest):
+        try:
+            os.remove(self.path(self._hashed(name, digest)))
+        except OSError:
+            pass
+
+    def get_hash(self, name):
+        """Content hash of a stored file as recorded in the manifest, or None."""
+        entry = self.load_manifest().get(name)
+        return entry[0] if entry else None
+
+    def update_manifest(self, names=None):
+        """
+        Refresh manifest entries for `names`, or for every file under
+        MEDIA_ROOT when omitted (dropping entries for deleted files).
+        Returns the number of entries added, changed or removed.
+        """
+        with self._lock:
+            manifest = self.load_manifest()
+            if names is None:
+                names = set(manifest) | set(self._walk())
+            changed = sum(self._refresh_entry(manifest, name) for name in names)
+            if changed:
+                self.save_manifest()
+        return changed
+
+    def _walk(self):
+        for root, _dirs, files in os.walk(self.location):
+            for filename in files:
+                name = os.path.relpath(os.path.join(root, filename), self.location).replace(os.sep, '/')
+                if name != self.manifest_name and not name.endswith('.tmp') and not is_hashed_copy(name):
+                    yield name
+
+    # Storage API ----------------------------------------------------------
+
+    @staticmethod
+    def _hashed(name, digest):
+        stem, ext = os.path.splitext(name)
+        return f'{stem}.{digest}{ext}'
+
+    def hashed_name(self, name):
+        """The hashed name recorded for `name`; `name` itself if it has none. Reads only."""
+        digest = self.get_hash(name)
+        return name if digest is None else self._hashed(name, digest)
+
+    def url(self, name):
+        return super().url(self.hashed_name(name) if name else name)
+
+    def _save(self, name, content):
+        name = super()._save(name, content)
+        self.update_manifest([name])
+        return name
+
+    def delete(self, name):
+        super().delete(name)
+        self.update_manifest([name])
@@ -0,0 +1,33 @@
+"""
+Media Views
+Serves MEDIA_ROOT files by their content-hashed URLs (see storage.py) in
+development. Hashed copies are served with a year-long immutable
+Cache-Control; a hash with no copy on disk redirects to the current URL.
+In production the web server serves MEDIA_ROOT and sends the same
+header for hashed names (see README).
+"""
+import os
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import Http404
+from django.shortcuts import redirect
+from django.utils.cache import patch_cache_control
+from django.views.static import serve
+
+from .storage import HASHED_MEDIA_MAX_AGE, split_hashed_name
+
+
+def serve_media(request, path):
+    """Serve a media file by its plain or content-hashed name."""
+    name, digest = split_hashed_name(path)
+    if digest is None:
+        return serve(request, path, document_root=settings.MEDIA_ROOT)
+    if not os.path.isfile(os.path.join(settings.MEDIA_ROOT, path)):
+        if not default_storage.exists(name):
+            raise Http404('Media file not found')
+        return redirect(default_storage.url(name))
+
+    response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    patch_cache_control(response, public=True, max_age=HASHED_MEDIA_MAX_AGE, immutable=True)
+    return response